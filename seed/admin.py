@@ -2,6 +2,8 @@ from django.contrib import admin
 
 from seed.models import (
     Column,
+    ExtraDataIndex,
+    ExtraDataKeyUsage,
     Property,
     PropertyView,
     PropertyState,
@@ -21,3 +23,24 @@ admin.site.register(TaxLot)
 admin.site.register(TaxLotView)
 admin.site.register(TaxLotState)
 admin.site.register(TaxLotProperty)
+
+
+@admin.register(ExtraDataKeyUsage)
+class ExtraDataKeyUsageAdmin(admin.ModelAdmin):
+    list_display = ('organization', 'table_name', 'key', 'filter_count', 'sort_count', 'last_used')
+    list_filter = ('table_name',)
+    ordering = ('-filter_count',)
+    search_fields = ('key',)
+
+
+@admin.register(ExtraDataIndex)
+class ExtraDataIndexAdmin(admin.ModelAdmin):
+    list_display = ('name', 'organization', 'table_name', 'key', 'index_type', 'created')
+    list_filter = ('table_name', 'index_type')
+    search_fields = ('key', 'name')
+    # The indexes are managed with the manage_extra_data_indexes command, deleting them here also
+    # drops them from the database
+    readonly_fields = ('organization', 'table_name', 'key', 'index_type', 'name', 'created')
+
+    def has_add_permission(self, request):
+        return False
@@ -8,9 +8,7 @@
 from __future__ import absolute_import
 
 import collections
-import copy
 import datetime
-import hashlib
 import operator
 import traceback
 from _csv import Error
@@ -22,8 +20,8 @@ from celery import chord
 from celery import shared_task
 from celery.utils.log import get_task_logger
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
-from django.db.models import Q
+from django.db import DataError, IntegrityError, transaction
+from django.db.models import CharField, Q
 from django.utils import timezone
 from unidecode import unidecode
 
@@ -37,7 +35,6 @@ from seed.decorators import lock_and_track
 from seed.green_button import xml_importer
 from seed.lib.mappings.mapping_data import MappingData
 from seed.lib.mcm import cleaners, mapper, reader
-from seed.lib.mcm.mapper import expand_rows
 from seed.lib.mcm.utils import batch
 from seed.lib.merging import merging
 from seed.lib.superperms.orgs.models import Organization
@@ -65,13 +62,33 @@ from seed.models import TaxLotAuditLog
 from seed.models import TaxLotProperty
 from seed.models.auditlog import AUDIT_IMPORT
 from seed.models.data_quality import DataQualityCheck
+from seed.utils.address import normalize_address_strs
 from seed.utils.buildings import get_source_type
-from seed.utils.cache import set_cache, increment_cache, get_cache, delete_cache, get_cache_raw
+from seed.utils.cache import (
+    set_cache,
+    increment_cache,
+    get_cache,
+    delete_cache,
+    get_cache_raw,
+    set_cache_raw,
+    make_key,
+)
+from seed.utils.hashing import hash_state_object
 
 _log = get_task_logger(__name__)
 
 STR_TO_CLASS = {'TaxLotState': TaxLotState, 'PropertyState': PropertyState}
 
+# The mapping plan is compiled once per import file and shared by the map_row_chunk tasks
+MAPPING_PLAN_CACHE_PREFIX = 'SEED:map_data:PLAN:{0}'
+MAPPING_PLAN_TIMEOUT = 60 * 60 * 24
+
+# Number of unmatched states whose keys are looked up in the database at once
+MATCHING_LOOKUP_BATCH_SIZE = 1000
+
+# Number of rows that each of the raw save tasks will read from the import file and save
+RAW_SAVE_CHUNK_SIZE = 100
+
 
 def get_cache_increment_value(chunk):
     denom = len(chunk) or 1
@@ -110,7 +127,9 @@ def finish_checking(identifier):
     :return:
     """
     prog_key = get_prog_key('check_data', identifier)
-    data_quality_results = get_cache_raw(DataQualityCheck.cache_key(identifier))
+    data_quality_results = DataQualityCheck.retrieve_results(identifier)
+    if data_quality_results is not None:
+        data_quality_results = list(data_quality_results)
     result = {
         'status': 'success',
         'progress': 100,
@@ -177,6 +196,8 @@ def finish_mapping(import_file_id, mark_as_done):
         import_file.mapping_done = True
         import_file.save()
 
+    delete_cache(_get_mapping_plan_key(import_file_id))
+
     finish_import_record(import_file.import_record.pk)
 
     property_state_ids = list(
@@ -268,21 +289,20 @@ def _build_cleaner_2(org):
     return cleaners.Cleaner(ontology)
 
 
-@shared_task
-def map_row_chunk(ids, file_pk, source_type, prog_key, increment, **kwargs):
-    """Does the work of matching a mapping to a source type and saving
+def _get_mapping_plan_key(file_pk):
+    """Return the cache key of the mapping plan of the import file"""
+    return make_key(MAPPING_PLAN_CACHE_PREFIX.format(file_pk))
 
-    :param ids: list of PropertyState IDs to map.
-    :param file_pk: int, the PK for an ImportFile obj.
-    :param source_type: int, represented by either ASSESSED_RAW or PORTFOLIO_RAW.
-    :param prog_key: string, key of the progress key
-    :param increment: double, value by which to increment progress key
+
+def _build_mapping_plan(import_file):
     """
-    import_file = ImportFile.objects.get(pk=file_pk)
-    save_type = PORTFOLIO_BS
-    if source_type == ASSESSED_RAW:
-        save_type = ASSESSED_BS
+    Compile the mapping plan of the import file. The plan holds the column mappings of the
+    organization that apply to the raw columns of the file, the extra data fields, the delimited
+    fields, and the cleaning function of each column.
 
+    :param import_file: ImportFile instance
+    :return: MappingPlan
+    """
     org = Organization.objects.get(pk=import_file.import_record.super_organization.pk)
 
     # get all the table_mappings that exist for the organization
@@ -335,9 +355,6 @@ def map_row_chunk(ids, file_pk, source_type, prog_key, increment, **kwargs):
         delimited_fields = {}
         # field does not exist in mapping list, so ignoring
 
-    # _log.debug("my table mappings are {}".format(table_mappings))
-    # _log.debug("delimited_field that will be expanded and normalized: {}".format(delimited_fields))
-
     # If a single file is being imported into both the tax lot and property table, then add
     # an extra custom mapping for the cross-related data. If the data are not being imported into
     # the property table then make sure to skip this so that superfluous property entries are
@@ -349,55 +366,90 @@ def map_row_chunk(ids, file_pk, source_type, prog_key, increment, **kwargs):
                 'PropertyState', 'lot_number')
     # *** END BREAK OUT ***
 
-    # yes, there are three cascading for loops here. sorry :(
+    # This may be historic, but we need to pull out the extra_data_fields here to pass into
+    # the mapper. apply_columns are extra_data columns (the raw column names)
     md = MappingData()
-
+    extra_data_fields = {}
     for table, mappings in table_mappings.items():
-        if not table:
-            continue
+        extra_data_fields[table] = [k for k, v in mappings.items()
+                                    if not md.find_column(v[0], v[1])]
+
+    return mapper.MappingPlan(table_mappings, extra_data_fields, delimited_fields, map_cleaner)
+
+
+def _get_mapping_plan(import_file):
+    """
+    Return the mapping plan of the import file. The plan is compiled in _map_data and cached for
+    the chunk tasks; if it has expired from the cache then it is compiled again.
+
+    :param import_file: ImportFile instance
+    :return: MappingPlan
+    """
+    plan = get_cache_raw(_get_mapping_plan_key(import_file.pk))
+    if plan is None:
+        plan = _build_mapping_plan(import_file)
+        set_cache_raw(_get_mapping_plan_key(import_file.pk), plan, MAPPING_PLAN_TIMEOUT)
+    return plan
+
+
+def _validate_lengths(states):
+    """
+    Raise a ValidationError if a value of the states is too long for its column. bulk_create does
+    not call full_clean, which would also query the database for the foreign keys of every state.
+
+    :param states: list, PropertyStates or TaxLotStates of the same class
+    """
+    fields = [field for field in states[0]._meta.concrete_fields
+              if isinstance(field, CharField) and field.max_length]
+    for state in states:
+        for field in fields:
+            value = getattr(state, field.attname)
+            if value not in field.empty_values:
+                try:
+                    field.run_validators(field.to_python(value))
+                except ValidationError as e:
+                    raise ValidationError(
+                        u'{}: {}'.format(field.name, u' '.join(e.messages)))
+
+
+@shared_task
+def map_row_chunk(ids, file_pk, source_type, prog_key, increment, **kwargs):
+    """Does the work of matching a mapping to a source type and saving
+
+    :param ids: list of PropertyState IDs to map.
+    :param file_pk: int, the PK for an ImportFile obj.
+    :param source_type: int, represented by either ASSESSED_RAW or PORTFOLIO_RAW.
+    :param prog_key: string, key of the progress key
+    :param increment: double, value by which to increment progress key
+    """
+    import_file = ImportFile.objects.get(pk=file_pk)
+    save_type = PORTFOLIO_BS
+    if source_type == ASSESSED_RAW:
+        save_type = ASSESSED_BS
 
-        # This may be historic, but we need to pull out the extra_data_fields here to pass into
-        # mapper.map_row. apply_columns are extra_data columns (the raw column names)
-        extra_data_fields = []
-        for k, v in mappings.items():
-            if not md.find_column(v[0], v[1]):
-                extra_data_fields.append(k)
-        # _log.debug("extra data fields: {}".format(extra_data_fields))
+    org = import_file.import_record.super_organization
+    plan = _get_mapping_plan(import_file)
+
+    for table in plan.tables:
+        # Hash of an object of the table without any data, used to skip the rows that did not map
+        # onto any of the fields.
+        empty_hash = hash_state_object(STR_TO_CLASS[table](organization=org),
+                                       include_extra_data=False)
 
         # All the data live in the PropertyState.extra_data field when the data are imported
         data = PropertyState.objects.filter(id__in=ids).only('extra_data').iterator()
 
-        # Since we are importing CSV, then each extra_data field will have the same fields. So
-        # save the map_model_obj outside of for loop to pass into the `save_column_names` methods
-        map_model_obj = None
+        # Collect all of the mapped objects of the chunk so that they can be written in bulk
+        mapped_states = []
 
         # Loop over all the rows
         for original_row in data:
 
             # expand the row into multiple rows if needed with the delimited_field replaced with a
             # single value. This minimizes the need to rewrite the downstream code.
-            expand_row = False
-            for k, d in delimited_fields.items():
-                if d['to_table'] == table:
-                    expand_row = True
-            # _log.debug("Expand row is set to {}".format(expand_row))
-
-            delimited_field_list = []
-            for _, v in delimited_fields.items():
-                delimited_field_list.append(v['from_field'])
-
-            # _log.debug("delimited_field_list is set to {}".format(delimited_field_list))
-
             # Weeee... the data are in the extra_data column.
-            for row in expand_rows(original_row.extra_data, delimited_field_list, expand_row):
-                map_model_obj = mapper.map_row(
-                    row,
-                    mappings,
-                    STR_TO_CLASS[table],
-                    extra_data_fields,
-                    cleaner=map_cleaner,
-                    **kwargs
-                )
+            for row in plan.expand_row(original_row.extra_data, table):
+                map_model_obj = plan.map_row(row, table, STR_TO_CLASS[table], **kwargs)
 
                 # save cross related data, that is data that needs to go into the other model's
                 # collection as well.
@@ -405,7 +457,7 @@ def map_row_chunk(ids, file_pk, source_type, prog_key, increment, **kwargs):
                 # Assign some other arguments here
                 map_model_obj.import_file = import_file
                 map_model_obj.source_type = save_type
-                map_model_obj.organization = import_file.import_record.super_organization
+                map_model_obj.organization = org
                 if hasattr(map_model_obj, 'data_state'):
                     map_model_obj.data_state = DATA_STATE_MAPPING
                 if hasattr(map_model_obj, 'clean'):
@@ -416,39 +468,53 @@ def map_row_chunk(ids, file_pk, source_type, prog_key, increment, **kwargs):
                 # sure that the object hasn't already been created.
                 # For example, in the test data the tax lot id is the same for many rows. Make sure
                 # to only create/save the object if it hasn't been created before.
-                if hash_state_object(
-                    map_model_obj,
-                    include_extra_data=False) == hash_state_object(
-                    STR_TO_CLASS[table](organization=map_model_obj.organization),
-                    include_extra_data=False
-                ):
+                if hash_state_object(map_model_obj, include_extra_data=False) == empty_hash:
                     # Skip this object as it has no data...
                     continue
 
-                try:
-                    # There was an error with a field being too long [> 255 chars].
-                    map_model_obj.save()
-
-                    # Create an audit log record for the new map_model_obj that was created.
-
-                    AuditLogClass = PropertyAuditLog if isinstance(
-                        map_model_obj, PropertyState) else TaxLotAuditLog
-                    AuditLogClass.objects.create(organization=org,
-                                                 state=map_model_obj,
-                                                 name='Import Creation',
-                                                 description='Creation from Import file.',
-                                                 import_filename=import_file,
-                                                 record_type=AUDIT_IMPORT)
+                mapped_states.append(map_model_obj)
 
-                except ValidationError as e:
-                    # Could not save the record for some reason, raise an exception
-                    raise Exception(
-                        "Unable to save row the model with row {}:{}".format(type(e),
-                                                                             e.message))
+        if not mapped_states:
+            continue
 
-        # Make sure that we've saved all of the extra_data column names from the first item in list
-        if map_model_obj:
-            Column.save_column_names(map_model_obj)
+        # bulk_create does not call save(), so calculate the normalized address and hash here
+        normalized_addresses = normalize_address_strs(
+            [state.address_line_1 for state in mapped_states])
+        for state, normalized_address in zip(mapped_states, normalized_addresses):
+            state.normalized_address = normalized_address
+            state.hash_object = hash_state_object(state)
+
+        try:
+            _validate_lengths(mapped_states)
+            # the states of the chunk are saved in a single transaction, so none are saved if any
+            # of them fails
+            STR_TO_CLASS[table].objects.bulk_create(mapped_states)
+        except (ValidationError, DataError, IntegrityError) as e:
+            # Could not save the records for some reason, report the error and raise an exception
+            message = u'Unable to save the {} records: {}'.format(
+                table, u' '.join(e.messages) if isinstance(e, ValidationError) else e)
+            set_cache(prog_key, 'error', {
+                'status': 'error',
+                'message': message,
+                'progress_key': prog_key
+            })
+            raise Exception(message)
+
+        # Create an audit log record for each of the new states that were created.
+        AuditLogClass = PropertyAuditLog if table == 'PropertyState' else TaxLotAuditLog
+        AuditLogClass.objects.bulk_create([
+            AuditLogClass(organization=org,
+                          state=state,
+                          name='Import Creation',
+                          description='Creation from Import file.',
+                          import_filename=import_file,
+                          record_type=AUDIT_IMPORT)
+            for state in mapped_states
+        ])
+
+        # Make sure that we've saved all of the extra_data column names of the chunk
+        Column.save_extra_data_column_names(
+            org, table, set(chain.from_iterable(state.extra_data for state in mapped_states)))
 
     increment_cache(prog_key, increment)
 
@@ -486,6 +552,10 @@ def _map_data(import_file_id, mark_as_done):
     }
     source_type = source_type_dict.get(import_file.source_type, ASSESSED_RAW)
 
+    # Compile the mapping plan once for all of the chunks
+    set_cache_raw(_get_mapping_plan_key(import_file_id), _build_mapping_plan(import_file),
+                  MAPPING_PLAN_TIMEOUT)
+
     qs = PropertyState.objects.filter(
         import_file=import_file,
         source_type=source_type,
@@ -592,53 +662,81 @@ def map_data(import_file_id, remap=False, mark_as_done=True):
     return {'status': 'success', 'progress': 100, 'progress_key': prog_key}
 
 
-@shared_task
-def _save_raw_data_chunk(chunk, file_pk, prog_key, increment):
+def _sanitize_raw_row(row):
     """
-    Save the raw data to the database
+    Strip the whitespace surrounding the keys of a raw row and remove any diacritics from the
+    values so that the row can be stored in the extra_data field.
 
-    :param chunk: list, ids to process
-    :param file_pk: ImportFile Primary Key
-    :param prog_key: string, Progress Key to append progress
-    :param increment: Float, Value by which to increment the progress
-    :return: Bool, Always true
+    :param row: dict, raw row from the parser
+    :return: dict, sanitized row
     """
+    new_row = {}
+    for k, v in row.iteritems():
+        # remove extra spaces surrounding keys.
+        key = k.strip()
+        if isinstance(v, unicode):
+            new_row[key] = unidecode(v)
+        elif isinstance(v, (datetime.datetime, datetime.date)):
+            raise TypeError("Datetime class not supported in Extra Data. Needs to be a string.")
+        else:
+            new_row[key] = v
+    return new_row
 
-    import_file = ImportFile.objects.get(pk=file_pk)
+
+def _save_raw_rows(rows, import_file):
+    """
+    Save the raw rows to the database. All of the PropertyStates are built in memory and written
+    with a single multi-row insert.
+
+    :param rows: iterable, raw rows (dicts) from the parser
+    :param import_file: ImportFile instance that the rows belong to
+    :return: int, number of rows saved
+    """
+    super_org = import_file.import_record.super_organization
 
     # Save our "column headers" and sample rows for F/E.
     source_type = get_source_type(import_file)
-    for c in chunk:
-        raw_property = PropertyState(organization=import_file.import_record.super_organization)
-        raw_property.import_file = import_file
-
-        # sanitize c and remove any diacritics
-        new_chunk = {}
-        for k, v in c.iteritems():
-            # remove extra spaces surrounding keys.
-            key = k.strip()
-            if isinstance(v, unicode):
-                new_chunk[key] = unidecode(v)
-            elif isinstance(v, (datetime.datetime, datetime.date)):
-                raise TypeError("Datetime class not supported in Extra Data. Needs to be a string.")
-            else:
-                new_chunk[key] = v
-        raw_property.extra_data = new_chunk
-        raw_property.source_type = source_type
-        raw_property.data_state = DATA_STATE_IMPORT
+    raw_properties = []
+    for c in rows:
+        # The raw data does not have an address_line_1 yet (everything lives in extra_data), so
+        # there is no need to go through PropertyState.save() to normalize the address.
+        raw_property = PropertyState(
+            organization=super_org,
+            import_file=import_file,
+            extra_data=_sanitize_raw_row(c),
+            source_type=source_type,
+            data_state=DATA_STATE_IMPORT,
+        )
+        raw_property.hash_object = hash_state_object(raw_property)
+        raw_properties.append(raw_property)
+
+    PropertyState.objects.bulk_create(raw_properties)
+    return len(raw_properties)
+
 
-        # We require a save to get our PK
-        # We save here to set our initial source PKs.
-        raw_property.save()
+@shared_task
+def _save_raw_data_range(file_pk, start_row, num_rows, prog_key, increment, position=None):
+    """
+    Save a range of rows of the import file to the database. The task re-opens the uploaded file
+    and only reads the rows it was asked to save, so the row data never travel through the broker.
 
-        super_org = import_file.import_record.super_organization
-        raw_property.organization = super_org
+    :param file_pk: ImportFile Primary Key
+    :param start_row: int, index of the first data row (0 is the first row after the header)
+    :param num_rows: int, number of rows to save
+    :param prog_key: string, Progress Key to append progress
+    :param increment: Float, Value by which to increment the progress
+    :param position: position of start_row in the file from MCMParser.chunk_positions, so that
+                     the rows before the range are not read again
+    :return: Bool, Always true
+    """
 
-        raw_property.save()
+    import_file = ImportFile.objects.get(pk=file_pk)
+    # the number of columns was saved by _save_raw_data, the parser does not count them again
+    parser = reader.MCMParser(import_file.local_file, num_columns=import_file.num_columns)
+    _save_raw_rows(parser.rows_in_range(start_row, num_rows, position), import_file)
 
     # Indicate progress
     increment_cache(prog_key, increment)
-    # _log.debug('Returning from _save_raw_data_chunk')
 
     return True
 
@@ -753,17 +851,20 @@ def _save_raw_data(file_pk, *args, **kwargs):
 
         parser = reader.MCMParser(import_file.local_file)
         cache_first_rows(import_file, parser)
-        rows = parser.next()
-        import_file.num_rows = 0
         import_file.num_columns = parser.num_columns()
 
-        chunks = []
-        for batch_chunk in batch(rows, 100):
-            import_file.num_rows += len(batch_chunk)
-            chunks.append(batch_chunk)
-        increment = get_cache_increment_value(chunks)
-        tasks = [_save_raw_data_chunk.s(chunk, file_pk, prog_key, increment)
-                 for chunk in chunks]
+        # Only count the rows and find where the chunks start here. Each chunk task re-opens the
+        # file and reads its own range of rows from there, so that neither the broker nor this
+        # worker has to hold the data of the whole file, and no task reads the whole file.
+        import_file.num_rows, positions = parser.chunk_positions(RAW_SAVE_CHUNK_SIZE)
+        row_ranges = range(0, import_file.num_rows, RAW_SAVE_CHUNK_SIZE)
+        increment = get_cache_increment_value(row_ranges)
+        tasks = [
+            _save_raw_data_range.s(
+                file_pk, start_row, RAW_SAVE_CHUNK_SIZE, prog_key, increment, position
+            )
+            for start_row, position in zip(row_ranges, positions)
+        ]
 
         # _log.debug('Appended all tasks')
         import_file.save()
@@ -904,48 +1005,53 @@ def _find_matches(un_m_address, canonical_buildings_addresses):
     return match_list
 
 
-# TODO: CLEANUP - What are we doing here?
-md = MappingData()
-ALL_COMPARISON_FIELDS = sorted(list(set([field['name'] for field in md.data])))
-# Make sure that the import_file isn't part of the hash, as the import_file filename always has
-# random characters appended to it in the uploads directory
-try:
-    ALL_COMPARISON_FIELDS.remove('import_file')
-except ValueError:
-    pass
-
-
-def hash_state_object(obj, include_extra_data=True):
-    def _get_field_from_obj(field_obj, field):
-        if not hasattr(field_obj, field):
-            return "FOO"  # Return a random value so we can distinguish between this and None.
-        else:
-            return getattr(field_obj, field)
-
-    m = hashlib.md5()
-
-    for f in ALL_COMPARISON_FIELDS:
-        obj_val = _get_field_from_obj(obj, f)
-        m.update(str(f))
-        m.update(str(obj_val))
-        # print "{}: {} -> {}".format(field, obj_val, m.hexdigest())
-
-    if include_extra_data:
-        add_dictionary_repr_to_hash(m, obj.extra_data)
+def get_state_hash(state):
+    """
+    Return the stored hash of the state, falling back to calculating it for states that were
+    saved before the hash was stored (see the populate_state_hashes command).
 
-    return m.hexdigest()
+    :param state: PropertyState or TaxLotState
+    :return: str, hex digest
+    """
+    return state.hash_object or hash_state_object(state)
 
 
-def add_dictionary_repr_to_hash(hash_obj, dict_obj):
-    assert isinstance(dict_obj, dict)
+def find_duplicate_hashes(ObjectViewClass, states, org, cycle):
+    """
+    Return the hashes of the states that already exist, unchanged, in a view of the cycle. The
+    lookup uses the indexed hash column in batches.
+
+    The states of the views that were saved before the hash was stored are hashed here, and
+    their hash is stored so that it is only calculated once (see the populate_state_hashes
+    command).
+
+    :param ObjectViewClass: PropertyView or TaxLotView
+    :param states: list, PropertyStates or TaxLotStates
+    :param org: Organization instance
+    :param cycle: Cycle instance
+    :return: set of hashes
+    """
+    state_hashes = set(map(get_state_hash, states))
+    duplicate_hashes = set()
+    for hashes in batch(list(state_hashes), MATCHING_LOOKUP_BATCH_SIZE):
+        duplicate_hashes.update(ObjectViewClass.objects.filter(
+            state__organization=org,
+            state__hash_object__in=hashes,
+            cycle_id=cycle,
+        ).values_list('state__hash_object', flat=True))
+
+    unhashed_views = ObjectViewClass.objects.filter(
+        state__organization=org,
+        state__hash_object__isnull=True,
+        cycle_id=cycle,
+    ).select_related('state')
+    for view in unhashed_views.iterator():
+        state_hash = hash_state_object(view.state)
+        type(view.state).objects.filter(pk=view.state_id).update(hash_object=state_hash)
+        if state_hash in state_hashes:
+            duplicate_hashes.add(state_hash)
 
-    for (key, value) in sorted(dict_obj.items(), key=lambda x_y: x_y[0]):
-        if isinstance(value, dict):
-            add_dictionary_repr_to_hash(hash_obj, value)
-        else:
-            hash_obj.update(str(key))
-            hash_obj.update(str(value))
-    return hash_obj
+    return duplicate_hashes
 
 
 def filter_duplicated_states(unmatched_states):
@@ -960,7 +1066,7 @@ def filter_duplicated_states(unmatched_states):
     :return:
     """
 
-    hash_values = map(hash_state_object, unmatched_states)
+    hash_values = map(get_state_hash, unmatched_states)
     equality_classes = collections.defaultdict(list)
 
     for (ndx, hashval) in enumerate(hash_values):
@@ -1026,6 +1132,10 @@ class EquivalencePartitioner(object):
         self.identity_key_func = self.make_canonical_key_calculation_function(
             [(x,) for x in identity_fields])
 
+        # The fields that make up the canonical key, used to look up equivalent objects in the
+        # database.
+        self.canonical_fields = [fieldlist[0] for fieldlist in equivalence_class_description]
+
         return
 
     @classmethod
@@ -1156,32 +1266,104 @@ class EquivalencePartitioner(object):
         :param list_of_obj:
         :return:
         """
-        equivalence_classes = collections.defaultdict(list)
-        identities_for_equivalence = {}
+        # The classes are tracked by their ordinal so that the index does not need to be rebuilt
+        # when the key of a class is merged.
+        class_keys = []
+        class_members = []
+        class_identities = []
+        class_ordinal_by_key = {}
+        key_index = EquivalenceKeyIndex()
 
         for (ndx, obj) in enumerate(list_of_obj):
             cmp_key = self.calculate_comparison_key(obj)
             identity_key = self.calculate_identity_key(obj)
 
-            for class_key in equivalence_classes:
-                if self.calculate_key_equivalence(class_key,
-                                                  cmp_key) and not self.identities_are_different(
-                        identities_for_equivalence[class_key], identity_key):
-
-                    equivalence_classes[class_key].append(ndx)
+            # Only the classes that share a value with the comparison key need to be checked.
+            for ordinal in key_index.lookup(cmp_key):
+                if self.identities_are_different(class_identities[ordinal], identity_key):
+                    continue
 
-                    if self.key_needs_merging(class_key, cmp_key):
-                        merged_key = self.merge_keys(class_key, cmp_key)
-                        equivalence_classes[merged_key] = equivalence_classes.pop(class_key)
-                        identities_for_equivalence[merged_key] = identity_key
-                    break
+                class_members[ordinal].append(ndx)
+
+                class_key = class_keys[ordinal]
+                if self.key_needs_merging(class_key, cmp_key):
+                    merged_key = tuple(self.merge_keys(class_key, cmp_key))
+                    del class_ordinal_by_key[class_key]
+                    if merged_key in class_ordinal_by_key:
+                        # Another class already has the merged key, fold it into this class.
+                        other = class_ordinal_by_key[merged_key]
+                        class_members[ordinal].extend(class_members[other])
+                        class_members[ordinal].sort()
+                        class_members[other] = []
+                        key_index.discard(merged_key, other)
+
+                    key_index.discard(class_key, ordinal)
+                    key_index.add(merged_key, ordinal)
+                    class_keys[ordinal] = merged_key
+                    class_ordinal_by_key[merged_key] = ordinal
+                    class_identities[ordinal] = identity_key
+                break
             else:
                 can_key = self.calculate_canonical_key(obj)
-                equivalence_classes[can_key].append(ndx)
-                identities_for_equivalence[can_key] = identity_key
+                if can_key in class_ordinal_by_key:
+                    # A class with the same canonical key exists (e.g. states without any
+                    # identifying data), add the object to it.
+                    ordinal = class_ordinal_by_key[can_key]
+                    class_members[ordinal].append(ndx)
+                else:
+                    ordinal = len(class_keys)
+                    class_keys.append(can_key)
+                    class_members.append([ndx])
+                    class_identities.append(None)
+                    class_ordinal_by_key[can_key] = ordinal
+                    key_index.add(can_key, ordinal)
+                class_identities[ordinal] = identity_key
+
+        equivalence_classes = collections.defaultdict(list)
+        for (class_key, members) in zip(class_keys, class_members):
+            if members:
+                equivalence_classes[class_key] = members
         return equivalence_classes
 
 
+class EquivalenceKeyIndex(object):
+    """Hashed index of equivalence keys by the value in each of their positions
+
+    Two keys are equivalent (see EquivalencePartitioner.calculate_key_equivalence) when they
+    have the same non-None value in at least one position, so looking up each of the values of a
+    key returns every item that has an equivalent key without comparing against all of them.
+
+    usage:
+            index = EquivalenceKeyIndex()
+            index.add(('1', None), 0)
+            index.add((None, 'a'), 1)
+            index.lookup(('1', 'a'))  # [0, 1]
+    """
+
+    def __init__(self):
+        self._index = collections.defaultdict(list)
+
+    def add(self, key, item):
+        """Index the item under each of the non-None values of the key"""
+        for position, value in enumerate(key):
+            if value is not None:
+                self._index[(position, value)].append(item)
+
+    def discard(self, key, item):
+        """Remove the item from under each of the non-None values of the key"""
+        for position, value in enumerate(key):
+            if value is not None and item in self._index.get((position, value), []):
+                self._index[(position, value)].remove(item)
+
+    def lookup(self, key):
+        """Return the items with an equivalent key, in the order that they were added"""
+        items = set()
+        for position, value in enumerate(key):
+            if value is not None:
+                items.update(self._index.get((position, value), []))
+        return sorted(items)
+
+
 def match_and_merge_unmatched_objects(unmatched_states, partitioner):
     """
     Take a list of unmatched_property_states or unmatched_tax_lot_states and returns a set of
@@ -1232,16 +1414,45 @@ def match_and_merge_unmatched_objects(unmatched_states, partitioner):
     return merged_objects, equivalence_classes.keys()
 
 
+def find_candidate_views(ObjectViewClass, unmatched_states, partitioner, org, cycle):
+    """
+    Return the views of the organization and cycle whose states could be equivalent to any of the
+    unmatched states. A view is a candidate when one of the canonical
+    fields of its state equals the value in the same position of an unmatched state's comparison
+    key. The lookups are done in the database with batched IN lists.
+
+    :param ObjectViewClass: PropertyView or TaxLotView
+    :param unmatched_states: list, PropertyStates or TaxLotStates
+    :param partitioner: instance of EquivalencePartitioner
+    :param org: Organization instance
+    :param cycle: Cycle instance
+    :return: list of views, ordered by id, with the state selected
+    """
+    views = {}
+    for states in batch(unmatched_states, MATCHING_LOOKUP_BATCH_SIZE):
+        values = [set() for _ in partitioner.canonical_fields]
+        for state in states:
+            for position, value in enumerate(partitioner.calculate_comparison_key(state)):
+                if value is not None:
+                    values[position].add(value)
+
+        query = Q(pk__in=[])
+        for field, field_values in zip(partitioner.canonical_fields, values):
+            if field_values:
+                query |= Q(**{'state__{}__in'.format(field): list(field_values)})
+
+        for view in ObjectViewClass.objects.filter(
+                query, state__organization=org, cycle_id=cycle).select_related('state'):
+            views[view.pk] = view
+
+    return [views[pk] for pk in sorted(views)]
+
+
 def merge_unmatched_into_views(unmatched_states, partitioner, org, import_file):
     """
-    This is fairly inefficient, because we grab all the
-    organization's entire PropertyViews at once.  Surely this can be
-    improved, but the logic is unusual/particularly dynamic here, so
-    hopefully this can be refactored into a better, purely database
-    approach... Perhaps existing_view_states can wrap database
-    calls. Still the abstractions are subtly different (can I
-    refactor the partitioner to use Query objects); it may require a
-    bit of thinking.
+    Merge the unmatched states into the existing views of the import file's cycle. Only the views
+    that are candidates for a match (see find_candidate_views) are loaded from the database, and
+    exact duplicates are found through the stored state hashes.
 
     :param unmatched_states:
     :param partitioner:
@@ -1262,21 +1473,25 @@ def merge_unmatched_into_views(unmatched_states, partitioner, org, import_file):
         raise ValueError("Unknown class '{}' passed to merge_unmatched_into_views".format(
             type(unmatched_states[0])))
 
-    class_views = ObjectViewClass.objects.filter(
-        state__organization=org,
-        cycle_id=current_match_cycle).select_related('state')
+    class_views = find_candidate_views(ObjectViewClass, unmatched_states, partitioner, org,
+                                       current_match_cycle)
     existing_view_states = collections.defaultdict(dict)
-    existing_view_state_hashes = set()
+    existing_view_state_hashes = find_duplicate_hashes(ObjectViewClass, unmatched_states, org,
+                                                       current_match_cycle)
+    existing_view_keys = []
+    existing_view_key_index = EquivalenceKeyIndex()
     for view in class_views:
         equivalence_can_key = partitioner.calculate_canonical_key(view.state)
+        if equivalence_can_key not in existing_view_states:
+            existing_view_key_index.add(equivalence_can_key, len(existing_view_keys))
+            existing_view_keys.append(equivalence_can_key)
         existing_view_states[equivalence_can_key][view.cycle] = view
-        existing_view_state_hashes.add(hash_state_object(view.state))
 
     matched_views = []
 
     for unmatched in unmatched_states:
 
-        unmatched_state_hash = hash_state_object(unmatched)
+        unmatched_state_hash = get_state_hash(unmatched)
         if unmatched_state_hash in existing_view_state_hashes:
             # If an exact duplicate exists, delete the unmatched state
             unmatched.data_state = DATA_STATE_DELETE
@@ -1289,36 +1504,36 @@ def merge_unmatched_into_views(unmatched_states, partitioner, org, import_file):
             # equiv_can_key = partitioner.calculate_canonical_key(unmatched)
             equiv_cmp_key = partitioner.calculate_comparison_key(unmatched)
 
-            for key in existing_view_states:
-                if partitioner.calculate_key_equivalence(key, equiv_cmp_key):
-                    if current_match_cycle in existing_view_states[key]:
-                        # There is an existing View for the current cycle that matches us.
-                        # Merge the new state in with the existing one and update the view,
-                        # audit log.
-                        current_view = existing_view_states[key][current_match_cycle]
-                        current_state = current_view.state
-
-                        merged_state, change_ = save_state_match(current_state, unmatched)
-
-                        current_view.state = merged_state
-                        current_view.save()
-                        matched_views.append(current_view)
-                    else:
-                        # Grab another view that has the same parent as
-                        # the one we belong to.
-                        cousin_view = existing_view_states[key].values()[0]
-                        view_parent = getattr(cousin_view, ParentAttrName)
-                        new_view = type(cousin_view)()
-                        setattr(new_view, ParentAttrName, view_parent)
-                        new_view.cycle = current_match_cycle
-                        new_view.state = unmatched
-                        try:
-                            new_view.save()
-                            matched_views.append(new_view)
-                        except IntegrityError:
-                            _log.warn("Unable to save the new view as it already exists in the db")
-
-                    break
+            # Only the views whose keys share a value with the comparison key are equivalent
+            equivalent_ordinals = existing_view_key_index.lookup(equiv_cmp_key)
+            if equivalent_ordinals:
+                key = existing_view_keys[equivalent_ordinals[0]]
+                if current_match_cycle in existing_view_states[key]:
+                    # There is an existing View for the current cycle that matches us.
+                    # Merge the new state in with the existing one and update the view,
+                    # audit log.
+                    current_view = existing_view_states[key][current_match_cycle]
+                    current_state = current_view.state
+
+                    merged_state, change_ = save_state_match(current_state, unmatched)
+
+                    current_view.state = merged_state
+                    current_view.save()
+                    matched_views.append(current_view)
+                else:
+                    # Grab another view that has the same parent as
+                    # the one we belong to.
+                    cousin_view = existing_view_states[key].values()[0]
+                    view_parent = getattr(cousin_view, ParentAttrName)
+                    new_view = type(cousin_view)()
+                    setattr(new_view, ParentAttrName, view_parent)
+                    new_view.cycle = current_match_cycle
+                    new_view.state = unmatched
+                    try:
+                        new_view.save()
+                        matched_views.append(new_view)
+                    except IntegrityError:
+                        _log.warn("Unable to save the new view as it already exists in the db")
             else:
                 # Create a new object/view for the current object.
                 created_view = unmatched.promote(current_match_cycle)
@@ -1414,12 +1629,13 @@ def _match_properties_and_taxlots(file_pk):
 
     pair_new_states(merged_property_views, merged_taxlot_views)
 
-    # Mark all the unmatched objects as done with matching and mapping
-    # There should be some kind of bulk-update/save thing we can do to
-    # improve upon this.
+    # Mark all the unmatched objects as done with matching and mapping. Only the data and merge
+    # states change, so collect them and write them with a few bulk updates. A state can be in
+    # more than one of the lists, in which case the last update wins.
+    state_updates = collections.OrderedDict()
     for state in chain(unmatched_properties, unmatched_tax_lots):
         state.data_state = DATA_STATE_MATCHING
-        state.save()
+        state_updates[(type(state), state.pk)] = {'data_state': state.data_state}
 
     for state in map(lambda x: x.state, chain(merged_property_views, merged_taxlot_views)):
         state.data_state = DATA_STATE_MATCHING
@@ -1427,12 +1643,15 @@ def _match_properties_and_taxlots(file_pk):
         # MERGE_STATE_MERGED when called in the merge_unmatched_into_views, then they are new.
         if state.merge_state != MERGE_STATE_MERGED:
             state.merge_state = MERGE_STATE_NEW
-        state.save()
+        state_updates[(type(state), state.pk)] = {'data_state': state.data_state,
+                                                  'merge_state': state.merge_state}
 
     for state in chain(duplicate_property_states, duplicate_tax_lot_states):
         state.data_state = DATA_STATE_DELETE
         # state.merge_state = MERGE_STATE_DUPLICATE
-        state.save()
+        state_updates[(type(state), state.pk)] = {'data_state': state.data_state}
+
+    update_state_transitions(state_updates)
 
     data = {
         'all_unmatched_properties': len(all_unmatched_properties),
@@ -1448,6 +1667,24 @@ def _match_properties_and_taxlots(file_pk):
     return _finish_matching(import_file, prog_key, data)
 
 
+def update_state_transitions(state_updates):
+    """
+    Write the new data and merge states of the states in one transaction. The states with the
+    same new values are updated together with UPDATE ... WHERE id IN (...) statements.
+
+    :param state_updates: dict, {(PropertyState or TaxLotState, pk): {field: value}}
+    :return: None
+    """
+    grouped_pks = collections.defaultdict(list)
+    for (state_class, pk), values in state_updates.items():
+        grouped_pks[(state_class, tuple(sorted(values.items())))].append(pk)
+
+    with transaction.atomic():
+        for (state_class, values), pks in grouped_pks.items():
+            for pk_batch in batch(pks, MATCHING_LOOKUP_BATCH_SIZE):
+                state_class.objects.filter(pk__in=pk_batch).update(**dict(values))
+
+
 def list_canonical_property_states(org_id):
     """
     Return a QuerySet of the property states that are part of the inventory
@@ -1620,72 +1857,78 @@ def pair_new_states(merged_property_views, merged_taxlot_views):
     property_keys_orig = dict(
         [(property_m2m_keygen.calculate_comparison_key(p), p.pk) for p in property_objects])
 
-    # property_keys = copy.deepcopy(property_keys_orig)
-
     # Do this inelegant step to make sure we are correctly splitting.
-    property_keys = collections.defaultdict(list)
+    property_keys = {}
     for k in property_keys_orig:
-        if k[0] and ";" in k[0]:
-            for lotnum in map(lambda x: x.strip(), k[0].split(";")):
-                k_copy = list(copy.deepcopy(k))
-                k_copy[0] = lotnum
-                property_keys[tuple(k_copy)] = property_keys_orig[k]
-        else:
-            property_keys[k] = property_keys_orig[k]
+        for split_key in _split_lot_number_key(k):
+            property_keys[split_key] = property_keys_orig[k]
 
     taxlot_keys = dict(
         [(taxlot_m2m_keygen.calculate_comparison_key(p), p.pk) for p in taxlot_objects])
 
-    # property_comparison_keys = {property_m2m_keygen.calculate_comparison_key_key(p): p.pk for p in property_objects}
-    # property_canonical_keys = {property_m2m_keygen.calculate_canonical_key(p): p.pk for p in property_objects}
+    # Keys are equivalent when they share a value in the same position, so index the views by the
+    # values of their keys instead of comparing every pair of keys.
+    property_key_index = EquivalenceKeyIndex()
+    for pv_key, pv_pk in property_keys.items():
+        property_key_index.add(pv_key, pv_pk)
 
-    possible_merges = []  # List of prop.id, tl.id merges.
+    taxlot_key_index = EquivalenceKeyIndex()
+    for tlv_key, tlv_pk in taxlot_keys.items():
+        taxlot_key_index.add(tlv_key, tlv_pk)
 
-    for pv in merged_property_views:
-        # if pv.state.lot_number and ";" in pv.state.lot_number:
-        #     pdb.set_trace()
+    possible_merges = set()  # Set of prop.id, tl.id merges.
 
+    for pv in merged_property_views:
         pv_key = property_m2m_keygen.calculate_comparison_key(pv.state)
-        # TODO: Refactor pronto.  Iterating over the tax lot is bad implementation.
-        for tlk in taxlot_keys:
-            if pv_key[0] and ";" in pv_key[0]:
-                for lotnum in map(lambda x: x.strip(), pv_key[0].split(";")):
-                    pv_key_copy = list(copy.deepcopy(pv_key))
-                    pv_key_copy[0] = lotnum
-                    pv_key_copy = tuple(pv_key_copy)
-                    if property_m2m_keygen.calculate_key_equivalence(pv_key_copy, tlk):
-                        possible_merges.append((property_keys[pv_key_copy], taxlot_keys[tlk]))
-            else:
-                if property_m2m_keygen.calculate_key_equivalence(pv_key, tlk):
-                    possible_merges.append((property_keys[pv_key], taxlot_keys[tlk]))
+        for split_key in _split_lot_number_key(pv_key):
+            if split_key not in property_keys:
+                continue
+            for tlv_pk in taxlot_key_index.lookup(split_key):
+                possible_merges.add((property_keys[split_key], tlv_pk))
 
     for tlv in merged_taxlot_views:
         tlv_key = taxlot_m2m_keygen.calculate_comparison_key(tlv.state)
-        for pv_key in property_keys:
-            if property_m2m_keygen.calculate_key_equivalence(tlv_key, pv_key):
-                possible_merges.append((property_keys[pv_key], taxlot_keys[tlv_key]))
-
-    for m2m in set(possible_merges):
-        pv_pk, tlv_pk = m2m
-
-        # PropertyView.objects.get(pk=pv_pk)
-        # TaxLotView.objects.get(pk=tlv_pk)
-
-        connection = TaxLotProperty.objects.filter(
-            property_view_id=pv_pk,
-            taxlot_view_id=tlv_pk
-        ).count()
-
-        if connection:
+        if tlv_key not in taxlot_keys:
             continue
+        for pv_pk in property_key_index.lookup(tlv_key):
+            possible_merges.add((pv_pk, taxlot_keys[tlv_key]))
 
-        is_primary = TaxLotProperty.objects.filter(property_view_id=pv_pk).count() == 0
-        m2m_join = TaxLotProperty(
+    if not possible_merges:
+        return
+
+    # Fetch the existing links of the property views once. A new link is only primary if its
+    # property view does not have any other link yet.
+    existing_links = set()
+    for pv_pks in batch(sorted(set(pv_pk for pv_pk, _ in possible_merges)),
+                        MATCHING_LOOKUP_BATCH_SIZE):
+        existing_links.update(TaxLotProperty.objects.filter(
+            property_view_id__in=pv_pks).values_list('property_view_id', 'taxlot_view_id'))
+    linked_property_views = set(pv_pk for pv_pk, _ in existing_links)
+
+    new_links = []
+    for pv_pk, tlv_pk in sorted(possible_merges - existing_links):
+        new_links.append(TaxLotProperty(
             property_view_id=pv_pk,
             taxlot_view_id=tlv_pk,
             cycle=cycle,
-            primary=is_primary
-        )
-        m2m_join.save()
+            primary=pv_pk not in linked_property_views
+        ))
+        linked_property_views.add(pv_pk)
+
+    TaxLotProperty.objects.bulk_create(new_links)
 
     return
+
+
+def _split_lot_number_key(key):
+    """
+    Return the keys for each of the lot numbers in the first position of a property key. The lot
+    number field can hold a list of lot numbers separated by semicolons.
+
+    :param key: tuple, comparison key of a property
+    :return: list of tuples
+    """
+    if key[0] and ";" in key[0]:
+        return [(lotnum.strip(),) + key[1:] for lotnum in key[0].split(";")]
+    else:
+        return [key]
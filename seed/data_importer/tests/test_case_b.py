@@ -19,6 +19,8 @@ from seed.data_importer.tests.util import (
 from seed.models import (
     Column,
     PropertyState,
+    PropertyView,
+    TaxLotProperty,
     TaxLotState,
     TaxLotView,
     DATA_STATE_MAPPING,
@@ -87,3 +89,15 @@ class TestCaseB(DataMappingBaseTestCase):
         tlv = tlv[0]
         properties = tlv.property_states()
         self.assertEqual(len(properties), 3)
+
+        # the property with the list of lot numbers is linked to each of its tax lots, once
+        pv = PropertyView.objects.get(state__pm_property_id='5233255', cycle=self.cycle)
+        links = TaxLotProperty.objects.filter(property_view=pv)
+        self.assertEqual(
+            sorted(links.values_list('taxlot_view__state__jurisdiction_tax_lot_id', flat=True)),
+            ['333/66125', '333/66148', '333/66555'])
+        self.assertEqual(links.filter(primary=True).count(), 1)
+
+        link_count = TaxLotProperty.objects.count()
+        tasks.pair_new_states(list(PropertyView.objects.all()), list(TaxLotView.objects.all()))
+        self.assertEqual(TaxLotProperty.objects.count(), link_count)
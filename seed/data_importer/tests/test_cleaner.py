@@ -72,3 +72,9 @@ class TestCleaner(TestCase):
             cleaner.clean_value('123,456', 'random'),
             '123,456'
         )
+
+    def test_get_column_cleaner(self):
+        cleaner = tasks._build_cleaner(self.org)
+
+        self.assertEqual(cleaner.get_column_cleaner(self.mapped_col)('123,456'), 123456)
+        self.assertIsNone(cleaner.get_column_cleaner('random'))
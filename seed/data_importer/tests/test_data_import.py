@@ -26,6 +26,7 @@ from seed.data_importer.tests.util import (
     FAKE_MAPPINGS,
     FAKE_ROW,
 )
+from seed.lib.mcm import reader
 from seed.models import (
     ASSESSED_RAW,
     ASSESSED_BS,
@@ -37,6 +38,7 @@ from seed.models import (
     TaxLotState,
     Cycle,
 )
+from seed.utils.cache import get_cache
 
 _log = logging.getLogger(__name__)
 
@@ -87,6 +89,45 @@ class TestMappingPortfolioData(DataMappingBaseTestCase):
         self.assertDictEqual(raw_saved.extra_data, self.fake_extra_data)
         self.assertEqual(raw_saved.organization, self.org)
 
+    def test_save_raw_rows(self):
+        """Save rows in one go, sanitizing the keys and values."""
+        chunk = [
+            {u' Property Id ': u'1234', u'Property Name': u'Caf\xe9'},
+            {u'Property Id': u'5678', u'Property Name': u'Building'},
+        ]
+        tasks._save_raw_rows(chunk, ImportFile.objects.get(pk=self.import_file.pk))
+
+        raw_saved = PropertyState.objects.filter(import_file=self.import_file).order_by('id')
+        self.assertEqual(raw_saved.count(), 2)
+        self.assertDictEqual(raw_saved[0].extra_data,
+                             {u'Property Id': u'1234', u'Property Name': u'Cafe'})
+        for state in raw_saved:
+            self.assertEqual(state.organization, self.org)
+            self.assertEqual(state.data_state, DATA_STATE_IMPORT)
+
+    def test_save_raw_data_range(self):
+        """Only the requested range of rows is read from the file and saved."""
+        tasks._save_raw_data_range(self.import_file.pk, 1, 2, 'fake_cache_key', 50)
+
+        raw_saved = PropertyState.objects.filter(import_file=self.import_file).order_by('id')
+        self.assertEqual(raw_saved.count(), 2)
+
+        mcm_parser = reader.MCMParser(self.import_file.local_file)
+        expected = [row['Property Id'] for row in mcm_parser.next()][1:3]
+        self.assertEqual([s.extra_data['Property Id'] for s in raw_saved], expected)
+
+    def test_save_raw_data_range_position(self):
+        """The rows of a range are read from the position of the range in the file."""
+        mcm_parser = reader.MCMParser(self.import_file.local_file)
+        expected = [row['Property Id'] for row in mcm_parser.next()]
+        num_rows, positions = mcm_parser.chunk_positions(2)
+        self.assertEqual(num_rows, len(expected))
+        self.assertEqual(len(positions), len(range(0, num_rows, 2)))
+
+        tasks._save_raw_data_range(self.import_file.pk, 2, 2, 'fake_cache_key', 50, positions[1])
+        raw_saved = PropertyState.objects.filter(import_file=self.import_file).order_by('id')
+        self.assertEqual([s.extra_data['Property Id'] for s in raw_saved], expected[2:4])
+
     def test_map_data(self):
         """Save mappings based on user specifications."""
         # Create new import file to test
@@ -180,6 +221,22 @@ class TestMappingExampleData(DataMappingBaseTestCase):
         # The lot_number should also have the normalized code run, then re-delimited
         self.assertEqual(ps.lot_number, '333/66555;333/66125;333/66148')
 
+    def test_map_row_chunk_value_too_long(self):
+        tasks._save_raw_data(self.import_file.pk, 'fake_cache_key', 1)
+        Column.create_mappings(self.fake_mappings, self.org, self.user, self.import_file.pk)
+        raw_states = PropertyState.objects.filter(import_file=self.import_file)
+        ids = list(raw_states.values_list('id', flat=True))
+        raw_state = raw_states.get(id=ids[0])
+        raw_state.extra_data['address line 1'] = 'a' * 300
+        raw_state.save()
+
+        with self.assertRaisesRegexp(Exception, 'address_line_1'):
+            tasks.map_row_chunk(ids, self.import_file.pk, ASSESSED_RAW, 'test_map_row_chunk', 1)
+        self.assertEqual(get_cache('test_map_row_chunk')['status'], 'error')
+        # none of the states of the chunk were saved
+        self.assertFalse(PropertyState.objects.filter(import_file=self.import_file)
+                         .exclude(data_state=DATA_STATE_IMPORT).exists())
+
     def test_promote_properties(self):
         """Test if the promoting of a property works as expected"""
         tasks._save_raw_data(self.import_file.pk, 'fake_cache_key', 1)
@@ -6,7 +6,7 @@
 """
 import logging
 
-from seed.data_importer.tasks import EquivalencePartitioner
+from seed.data_importer.tasks import EquivalencePartitioner, EquivalenceKeyIndex
 from seed.data_importer.tests.util import DataMappingBaseTestCase
 
 logger = logging.getLogger(__name__)
@@ -55,6 +55,33 @@ class TestEquivalenceClassGenerator(DataMappingBaseTestCase):
 
         return
 
+    def test_equivalence_respects_identity(self):
+        partitioner = EquivalencePartitioner.make_propertystate_equivalence()
+
+        p1 = PropertyState(pm_property_id='100', custom_id_1='abc')
+        p2 = PropertyState(pm_property_id='200', custom_id_1='abc')
+        p3 = PropertyState(custom_id_1='abc')
+        p4 = PropertyState(normalized_address='123 fake street')
+        p5 = PropertyState()
+        p6 = PropertyState()
+
+        equivalence_classes = partitioner.calculate_equivalence_classes([p1, p2, p3, p4, p5, p6])
+        self.assertEqual(sorted(equivalence_classes.values()), [[0, 2], [1], [3], [4, 5]])
+
+    def test_key_index(self):
+        index = EquivalenceKeyIndex()
+        index.add(('1', None, 'a'), 0)
+        index.add((None, '2', 'a'), 1)
+        index.add(('3', None, None), 2)
+
+        self.assertEqual(index.lookup(('1', None, None)), [0])
+        self.assertEqual(index.lookup((None, None, 'a')), [0, 1])
+        self.assertEqual(index.lookup(('3', '2', None)), [1, 2])
+        self.assertEqual(index.lookup((None, None, None)), [])
+
+        index.discard(('1', None, 'a'), 0)
+        self.assertEqual(index.lookup((None, None, 'a')), [1])
+
     def test_a_dummy_class_basics(self):
         tls1 = TaxLotState(jurisdiction_tax_lot_id="1")
         tls2 = TaxLotState(jurisdiction_tax_lot_id="1", custom_id_1="100")
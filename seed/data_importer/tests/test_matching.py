@@ -19,12 +19,18 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from seed.models import (
     ASSESSED_RAW,
     ASSESSED_BS,
+    DATA_STATE_DELETE,
     DATA_STATE_MAPPING,
+    DATA_STATE_MATCHING,
+    MERGE_STATE_NEW,
 )
 from seed.models import (
     Column,
     PropertyState,
+    PropertyView,
+    TaxLotState,
 )
+from seed.test_helpers.fake import FakePropertyViewFactory
 
 logger = logging.getLogger(__name__)
 
@@ -119,6 +125,43 @@ class TestMatching(DataMappingBaseTestCase):
         self.assertEqual(matches[0], ps_test)
         self.assertEqual(matches[1], ps_test_2)
 
+    def test_find_candidate_views(self):
+        view_factory = FakePropertyViewFactory(cycle=self.cycle, organization=self.org,
+                                               user=self.user)
+        pm_view = view_factory.get_property_view(pm_property_id='1001')
+        custom_view = view_factory.get_property_view(custom_id_1='1002')
+        view_factory.get_property_view(pm_property_id='1003')
+
+        partitioner = tasks.EquivalencePartitioner.make_propertystate_equivalence()
+        unmatched_states = [
+            PropertyState(organization=self.org, pm_property_id='1001'),
+            PropertyState(organization=self.org, custom_id_1='1002'),
+            PropertyState(organization=self.org, pm_property_id='9999'),
+        ]
+        views = tasks.find_candidate_views(PropertyView, unmatched_states, partitioner,
+                                           self.org, self.cycle)
+        self.assertEqual(views, [pm_view, custom_view])
+
+    def test_update_state_transitions(self):
+        ps1 = PropertyState.objects.create(organization=self.org, data_state=DATA_STATE_MAPPING)
+        ps2 = PropertyState.objects.create(organization=self.org, data_state=DATA_STATE_MAPPING)
+        tls = TaxLotState.objects.create(organization=self.org, data_state=DATA_STATE_MAPPING)
+
+        tasks.update_state_transitions({
+            (PropertyState, ps1.pk): {'data_state': DATA_STATE_MATCHING,
+                                      'merge_state': MERGE_STATE_NEW},
+            (PropertyState, ps2.pk): {'data_state': DATA_STATE_DELETE},
+            (TaxLotState, tls.pk): {'data_state': DATA_STATE_MATCHING},
+        })
+
+        ps1 = PropertyState.objects.get(pk=ps1.pk)
+        self.assertEqual(ps1.data_state, DATA_STATE_MATCHING)
+        self.assertEqual(ps1.merge_state, MERGE_STATE_NEW)
+        updated_ps2 = PropertyState.objects.get(pk=ps2.pk)
+        self.assertEqual(updated_ps2.data_state, DATA_STATE_DELETE)
+        self.assertEqual(updated_ps2.merge_state, ps2.merge_state)
+        self.assertEqual(TaxLotState.objects.get(pk=tls.pk).data_state, DATA_STATE_MATCHING)
+
     def test_handle_id_matches_duplicate_data(self):
         """
         Test for handle_id_matches behavior when matching duplicate data
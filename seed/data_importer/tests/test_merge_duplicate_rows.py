@@ -6,8 +6,10 @@
 """
 import logging
 import os.path as osp
+from StringIO import StringIO
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 
 from seed.data_importer import tasks
 from seed.data_importer.tests.util import (
@@ -101,3 +103,56 @@ class TestCaseMultipleDuplicateMatching(DataMappingBaseTestCase):
 
         self.assertEqual(self.import_file.find_unmatched_property_states().count(), 2)
         self.assertEqual(self.import_file.find_unmatched_tax_lot_states().count(), 0)
+
+    def test_stored_hash(self):
+        # mapped states are bulk created with their hash
+        ps = PropertyState.objects.filter(data_state=DATA_STATE_MAPPING, import_file=self.import_file)
+        for state in ps:
+            self.assertEqual(state.hash_object, tasks.hash_state_object(state))
+
+        state = ps.first()
+        state.extra_data['new_field'] = 'value'
+        state.save()
+        self.assertEqual(PropertyState.objects.get(pk=state.pk).hash_object,
+                         tasks.hash_state_object(state))
+
+        tasks.match_buildings(self.import_file.id)
+        view_states = [view.state for view in PropertyView.objects.all()]
+        new_state = PropertyState(organization=self.org, pm_property_id='not-imported')
+        self.assertEqual(
+            tasks.find_duplicate_hashes(PropertyView, view_states + [new_state], self.org,
+                                        self.cycle),
+            set(state.hash_object for state in view_states))
+
+        # the states saved before the hashes were stored are hashed, and their hash is stored
+        PropertyState.objects.update(hash_object=None)
+        self.assertEqual(
+            tasks.find_duplicate_hashes(PropertyView, view_states + [new_state], self.org,
+                                        self.cycle),
+            set(state.hash_object for state in view_states))
+        for view in PropertyView.objects.select_related('state'):
+            self.assertEqual(view.state.hash_object, tasks.hash_state_object(view.state))
+
+    def test_hash_non_ascii_values(self):
+        # states edited after the import are not transliterated
+        state = PropertyState.objects.create(
+            organization=self.org, property_name=u'Caf\xe9',
+            extra_data={u'Propri\xe9taire': u'Soci\xe9t\xe9', u'Floors': 2},
+        )
+        self.assertEqual(state.hash_object, tasks.hash_state_object(state))
+        state.property_name = u'Caf\xe9 2'
+        state.save()
+        self.assertNotEqual(PropertyState.objects.get(pk=state.pk).hash_object,
+                            tasks.hash_state_object(PropertyState(organization=self.org,
+                                                                  property_name=u'Caf\xe9')))
+
+        tax_lot_state = TaxLotState.objects.create(organization=self.org,
+                                                   address_line_1=u'1 Stra\xdfe')
+        self.assertEqual(tax_lot_state.hash_object, tasks.hash_state_object(tax_lot_state))
+
+    def test_populate_state_hashes(self):
+        PropertyState.objects.update(hash_object=None)
+        call_command('populate_state_hashes', stdout=StringIO())
+
+        for state in PropertyState.objects.all():
+            self.assertEqual(state.hash_object, tasks.hash_state_object(state))
@@ -7,9 +7,7 @@
 """
 Utility methods pertaining to data import tasks (save, mapping, matching).
 """
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.utils import timezone
 
 
 def get_core_pk_column(table_column_mappings, primary_field):
@@ -19,31 +17,6 @@ def get_core_pk_column(table_column_mappings, primary_field):
     raise ValidationError("This file does not appear to contain a column mapping to %s" % primary_field)
 
 
-def acquire_lock(name, expiration=None):
-    """
-    Tries to acquire a lock from the cache.
-    Also sets the lock's value to the current time, allowing us to see how long
-    it has been held.
-
-    Returns False if lock already belongs by another process.
-    """
-    return cache.add(name, timezone.now(), expiration)
-
-
-def release_lock(name):
-    """
-    Frees a lock.
-    """
-    return cache.delete(name)
-
-
-def get_lock_time(name):
-    """
-    Examines a lock to see when it was acquired.
-    """
-    return cache.get(name)
-
-
 def chunk_iterable(iterlist, chunk_size):
     """
     Breaks an iterable (e.g. list) into smaller chunks,
@@ -19,9 +19,10 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.postgres.fields import JSONField
 from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from django.core.files.storage import FileSystemStorage
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.urlresolvers import reverse
 from django.db.models import Q
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils.timezone import make_naive
 from rest_framework import serializers, status, viewsets
 from rest_framework.authentication import SessionAuthentication
@@ -45,6 +46,7 @@ from seed.lib.mappings import mapper as simple_mapper
 from seed.lib.mappings import mapping_data
 from seed.lib.mappings.mapping_data import MappingData
 from seed.lib.mcm import mapper
+from seed.lib.mcm.utils import batch
 from seed.lib.merging import merging
 from seed.lib.superperms.orgs.decorators import has_perm_class
 from seed.lib.superperms.orgs.models import OrganizationUser
@@ -77,10 +79,35 @@ from seed.models import (
     PORTFOLIO_RAW)
 from seed.models.data_quality import DataQualityCheck
 from seed.utils.api import api_endpoint, api_endpoint_class
-from seed.utils.cache import get_cache_raw, get_cache
+from seed.utils.cache import get_cache
 
 _log = logging.getLogger(__name__)
 
+# Number of data quality results that are encoded and sent at once
+DATA_QUALITY_RESULTS_BATCH_SIZE = 500
+
+
+def _iter_json_results(response, results):
+    """
+    Generate the JSON of the response with the results as its data, encoding the results in
+    batches as they are iterated over.
+
+    :param response: dict, data of the response other than the results
+    :param results: iterator of dicts, or None
+    :return: generator of str
+    """
+    encoder = DjangoJSONEncoder()
+    if results is None:
+        yield encoder.encode(dict(response, data=None))
+        return
+
+    yield encoder.encode(response)[:-1] + ', "data": ['
+    separator = ''
+    for results_batch in batch(results, DATA_QUALITY_RESULTS_BATCH_SIZE):
+        yield separator + ', '.join(encoder.encode(result) for result in results_batch)
+        separator = ', '
+    yield ']}'
+
 
 @api_endpoint
 @ajax_request
@@ -1458,21 +1485,59 @@ class ImportFileViewSet(viewsets.ViewSet):
             data:
                 type: JSON
                 description: object describing the results of the data quality check
+            pagination:
+                type: JSON
+                description: page, per_page, has_next and has_previous, only if a page was
+                             requested
         parameter_strategy: replace
         parameters:
             - name: pk
               description: Import file ID
               required: true
               paramType: path
+            - name: page
+              description: page of the results to return, all the results are streamed if
+                           neither page nor per_page is given
+              required: false
+              paramType: query
+            - name: per_page
+              description: number of results per page, defaults to 100
+              required: false
+              paramType: query
         """
         import_file_id = pk
-        data_quality_results = get_cache_raw(DataQualityCheck.cache_key(import_file_id))
-        return JsonResponse({
+        response = {
             'status': 'success',
             'message': 'data quality check complete',
             'progress': 100,
-            'data': data_quality_results
-        })
+        }
+        if 'page' not in request.query_params and 'per_page' not in request.query_params:
+            # encode the results as they are merged instead of holding them all
+            return StreamingHttpResponse(
+                _iter_json_results(response, DataQualityCheck.retrieve_results(import_file_id)),
+                content_type='application/json'
+            )
+
+        try:
+            page = int(request.query_params.get('page', 1))
+            per_page = int(request.query_params.get('per_page', 100))
+            if page < 1 or per_page < 1:
+                raise ValueError
+        except ValueError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'page and per_page must be positive integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        response['data'], has_next = DataQualityCheck.retrieve_results_page(
+            import_file_id, page, per_page)
+        response['pagination'] = {
+            'page': page,
+            'per_page': per_page,
+            'has_next': has_next,
+            'has_previous': page > 1,
+        }
+        return JsonResponse(response)
 
     @api_endpoint_class
     @ajax_request_class
@@ -8,10 +8,11 @@ import json
 from functools import wraps
 
 from django.http import HttpResponse, HttpResponseForbidden, HttpResponseBadRequest
+from django.http.response import HttpResponseBase
 
 from seed.lib.superperms.orgs.models import OrganizationUser
 from seed.serializers.pint import PintJSONEncoder
-from seed.utils.cache import make_key, lock_cache, unlock_cache, get_lock
+from seed.utils.cache import make_key, acquire_lock, release_lock
 
 SEED_CACHE_PREFIX = 'SEED:{0}'
 LOCK_CACHE_PREFIX = SEED_CACHE_PREFIX + ':LOCK'
@@ -52,18 +53,15 @@ def lock_and_track(fn, *args, **kwargs):
         """Lock and return progress url for updates."""
         lock_key = _get_lock_key(func_name, import_file_pk)
         prog_key = get_prog_key(func_name, import_file_pk)
-        is_locked = get_lock(lock_key)
-        # If we're already processing a given task, don't proceed.
-        if is_locked:
+        # Set the lock for 1 minute. If we're already processing a given task, don't proceed.
+        if not acquire_lock(lock_key):
             return {'error': 'locked'}
 
-        # Otherwise, set the lock for 1 minute.
-        lock_cache(lock_key)
         try:
             response = fn(import_file_pk, *args, **kwargs)
         finally:
             # Unset our lock
-            unlock_cache(lock_key)
+            release_lock(lock_key)
 
         # If our response is a dict, add our progress URL to it.
         if isinstance(response, dict):
@@ -111,7 +109,7 @@ def ajax_request(func):
                 status_code = 400
 
         # convert the response into an HttpResponse if it is not already.
-        if not isinstance(response, HttpResponse):
+        if not isinstance(response, HttpResponseBase):
             data = FORMAT_TYPES[format_type](response)
             response = HttpResponse(data, content_type=format_type, status=status_code)
             response['content-length'] = len(data)
@@ -157,7 +155,7 @@ def ajax_request_class(func):
                 status_code = 400
 
         # convert the response into an HttpResponse if it is not already.
-        if not isinstance(response, HttpResponse):
+        if not isinstance(response, HttpResponseBase):
             data = FORMAT_TYPES[format_type](response)
             response = HttpResponse(data, content_type=format_type,
                                     status=status_code)
@@ -14,6 +14,7 @@ except ImportError:
     import sha
     sha1 = sha.sha
 
+from django.core.cache import cache
 from django.contrib.auth.models import (
     AbstractBaseUser,
     PermissionsMixin,
@@ -31,6 +32,14 @@ from django.contrib.postgres.fields import JSONField
 
 from seed.lib.superperms.orgs.models import Organization
 
+# Seconds that the user of an API key is cached, see SEEDUser.process_header_request
+API_KEY_CACHE_TIMEOUT = 300
+
+
+def _api_key_cache_key(username, api_key):
+    digest = sha1(u'{}:{}'.format(username, api_key).encode('utf-8')).hexdigest()
+    return 'api_key_user__{}'.format(digest)
+
 
 class SEEDUser(AbstractBaseUser, PermissionsMixin):
     """
@@ -92,12 +101,17 @@ class SEEDUser(AbstractBaseUser, PermissionsMixin):
         :param request: object, request object with HTTP Authorization
         :return: User object
         """
+        # the authentication and the API endpoint decorators both process the header
+        if hasattr(request, '_api_key_user'):
+            return request._api_key_user
+
         auth_header = request.META.get('Authorization')
 
         if not auth_header:
             auth_header = request.META.get('HTTP_AUTHORIZATION')
 
         if not auth_header:
+            request._api_key_user = None
             return None
 
         try:
@@ -107,13 +121,32 @@ class SEEDUser(AbstractBaseUser, PermissionsMixin):
             auth_header = auth_header.split()[1]
             auth_header = base64.urlsafe_b64decode(auth_header)
             username, api_key = auth_header.split(':')
-            user = SEEDUser.objects.get(api_key=api_key, username=username)
-            return user
+            user = cls._get_api_key_user(username, api_key)
         except ValueError:
             raise exceptions.AuthenticationFailed("Invalid HTTP_AUTHORIZATION Header")
         except SEEDUser.DoesNotExist:
             raise exceptions.AuthenticationFailed("Invalid API key")
 
+        request._api_key_user = user
+        return user
+
+    @classmethod
+    def _get_api_key_user(cls, username, api_key):
+        """
+        Return the user of the API key. The id of the user is cached for a few minutes, the key
+        is checked against the user in case it was rotated in the meantime.
+        """
+        key = _api_key_cache_key(username, api_key)
+        user_id = cache.get(key)
+        if user_id is not None:
+            user = cls.objects.filter(pk=user_id).first()
+            if user and user.api_key == api_key and user.username == username:
+                return user
+
+        user = cls.objects.get(api_key=api_key, username=username)
+        cache.set(key, user.pk, API_KEY_CACHE_TIMEOUT)
+        return user
+
     def get_absolute_url(self):
         return "/users/%s/" % urlquote(self.username)
 
@@ -141,6 +174,9 @@ class SEEDUser(AbstractBaseUser, PermissionsMixin):
 
         https://github.com/toastdriven/django-tastypie/blob/master/tastypie/models.py#L47  # noqa
         """
+        if self.api_key:
+            # the previous key must not be accepted anymore
+            cache.delete(_api_key_cache_key(self.username, self.api_key))
         new_uuid = uuid.uuid4()
         api_key = hmac.new(new_uuid.bytes, digestmod=sha1).hexdigest()
         self.api_key = api_key
@@ -7,6 +7,7 @@
 import re
 import string
 from datetime import datetime, date
+from functools import partial
 
 import dateutil
 import dateutil.parser
@@ -192,24 +193,39 @@ class Cleaner(object):
 
         return pint_column_map
 
-    def clean_value(self, value, column_name):
-        """Clean the value, based on characteristics of its column_name."""
-        value = default_cleaner(value)
-        if value is not None:
-            if column_name in self.float_columns:
-                return float_cleaner(value)
+    def get_column_cleaner(self, column_name):
+        """
+        Return the function that cleans the (non-None) values of the column_name, or None if the
+        values are passed through as is. The function can be resolved once and reused for all the
+        values of the column.
+
+        :param column_name: str, name of the column in the schema
+        :return: callable or None
+        """
+        column_type = self.schema.get(column_name)
+        if column_type == u'float':
+            return float_cleaner
 
-            if column_name in self.date_columns:
-                return date_cleaner(value)
+        if column_type in (u'date', u'datetime'):
+            return date_cleaner
 
-            if column_name in self.string_columns:
-                return str(value)
+        if column_type == u'string':
+            return str
 
-            if column_name in self.int_columns:
-                return int_cleaner(value)
+        if column_type == u'integer':
+            return int_cleaner
 
-            if column_name in self.pint_column_map.keys():
-                units = self.pint_column_map[column_name]
-                return pint_cleaner(value, units)
+        if column_name in self.pint_column_map:
+            return partial(pint_cleaner, units=self.pint_column_map[column_name])
+
+        return None
+
+    def clean_value(self, value, column_name):
+        """Clean the value, based on characteristics of its column_name."""
+        value = default_cleaner(value)
+        if value is not None:
+            column_cleaner = self.get_column_cleaner(column_name)
+            if column_cleaner is not None:
+                return column_cleaner(value)
 
         return value
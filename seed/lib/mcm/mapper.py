@@ -86,6 +86,23 @@ def _concat_values(concat_columns, column_values, delimiter):
     return delimiter.join(values) or None
 
 
+def is_quantity_type_column(column_name):
+    """Test if the column_name is a QuantityField"""
+    # TODO rgm re-locate to someplace else, eg. Column
+    quantity_column_names = [
+        'gross_floor_area',
+        'occupied_floor_area',
+        'conditioned_floor_area',
+        'site_eui',
+        'site_eui_modeled',
+        'site_eui_weather_normalized',
+        'source_eui',
+        'source_eui_modeled',
+        'source_eui_weather_normalized',
+    ]
+    return (column_name in quantity_column_names)
+
+
 def apply_column_value(raw_column_name, column_value, model, mapping, is_extra_data, cleaner):
     """Set the column value as the target attr on our model.
 
@@ -99,22 +116,6 @@ def apply_column_value(raw_column_name, column_value, model, mapping, is_extra_d
     :rtype: model inst
     """
 
-    def is_quantity_type_column(column_name):
-        """Test if the column_name is a QuantityField"""
-        # TODO rgm re-locate to someplace else, eg. Column
-        quantity_column_names = [
-            'gross_floor_area',
-            'occupied_floor_area',
-            'conditioned_floor_area',
-            'site_eui',
-            'site_eui_modeled',
-            'site_eui_weather_normalized',
-            'source_eui',
-            'source_eui_modeled',
-            'source_eui_weather_normalized',
-        ]
-        return (column_name in quantity_column_names)
-
     # If the item is the extra_data column, then make sure to save it to the
     # extra_data field of the database
     if raw_column_name in mapping:
@@ -331,3 +332,100 @@ def map_row(row, mapping, model_class, extra_data_fields=[], cleaner=None, **kwa
     #                                    cleaner, apply_func=apply_func)
 
     return model
+
+
+class MappingPlan(object):
+    """
+    Precompiled mapping of the raw columns of an import file onto the tables. The plan resolves
+    the mapped field, the extra data flag, and the cleaning function of each raw column once so
+    that the rows only have to be run through the resulting lookup tables. The plan is picklable
+    so that it can be cached and shared between the mapping tasks of an import file.
+
+    usage:
+            plan = MappingPlan(table_mappings, extra_data_fields, delimited_fields, cleaner)
+            for table in plan.tables:
+                for row in plan.expand_row(raw_row, table):
+                    model = plan.map_row(row, table, PropertyState)
+    """
+
+    def __init__(self, table_mappings, extra_data_fields, delimited_fields, cleaner=None):
+        """
+        :param table_mappings: dict, {table: {raw_column: (table, mapped_column)}}
+        :param extra_data_fields: dict, {table: list of raw columns that are extra data}
+        :param delimited_fields: dict, {mapped_column: {'from_field', 'to_table', 'to_field_name'}}
+        :param cleaner: (optional) inst, cleaner instance for row values.
+        """
+        self.delimited_field_list = [v['from_field'] for v in delimited_fields.values()]
+        self.expanded_tables = set([v['to_table'] for v in delimited_fields.values()])
+
+        # {table: {raw_column: (mapped_column, is_extra_data, column_cleaner)}}
+        self.columns = {}
+        for table, mappings in table_mappings.items():
+            if not table:
+                continue
+
+            self.columns[table] = {}
+            for raw_column_name, (table_name, mapped_column_name) in mappings.items():
+                # Only the columns that map onto the model of the table are ever applied
+                if table_name != table:
+                    continue
+
+                column_cleaner = None
+                if cleaner:
+                    if is_quantity_type_column(mapped_column_name):
+                        # clean against the raw name with pint because that's the column
+                        # that holds the units needed to interpret the value correctly
+                        column_cleaner = cleaner.get_column_cleaner(raw_column_name)
+                    else:
+                        column_cleaner = cleaner.get_column_cleaner(mapped_column_name)
+
+                self.columns[table][raw_column_name] = (
+                    mapped_column_name,
+                    raw_column_name in extra_data_fields.get(table, []),
+                    column_cleaner,
+                )
+
+    @property
+    def tables(self):
+        """list of the tables that the rows are mapped onto"""
+        return self.columns.keys()
+
+    def expand_row(self, row, table):
+        """
+        Clean the delimited fields of the row and, if the table is the one that the delimited
+        fields are mapped to, expand the row into one row per delimited value.
+
+        :param row: dict, raw row
+        :param table: str, name of the table that the row is mapped to
+        :return: list of rows
+        """
+        return expand_rows(row, self.delimited_field_list, table in self.expanded_tables)
+
+    def map_row(self, row, table, model_class, **kwargs):
+        """Apply the plan of the table to the row. See ``map_row`` for the parameters."""
+        initial_data = kwargs.get('initial_data', None)
+        model = model_class()
+
+        if initial_data:
+            model = apply_initial_data(model, initial_data)
+
+        columns = self.columns[table]
+        for raw_field, value in row.items():
+            # Save the value if is is not None, keep empty fields.
+            if value is None or raw_field not in columns:
+                continue
+
+            mapped_column_name, is_extra_data, column_cleaner = columns[raw_field]
+            cleaned_value = default_cleaner(value)
+            if cleaned_value is not None and column_cleaner is not None:
+                cleaned_value = column_cleaner(cleaned_value)
+
+            if is_extra_data:
+                if isinstance(cleaned_value, (datetime, date)):
+                    model.extra_data[mapped_column_name] = cleaned_value.isoformat()
+                else:
+                    model.extra_data[mapped_column_name] = cleaned_value
+            else:
+                setattr(model, mapped_column_name, cleaned_value)
+
+        return model
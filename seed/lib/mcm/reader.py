@@ -10,13 +10,22 @@ out of CSV files. Fuzzy matches, application to data models happens
 elsewhere.
 
 """
+import csv
 import mmap
 import operator
+import os
+import re
 import sys
+import zipfile
+from contextlib import contextmanager
+from itertools import islice
 
+import xlrd
 from unicodecsv import DictReader, Sniffer
 from unidecode import unidecode
 from xlrd import xldate, XLRDError, open_workbook, empty_cell
+from xlrd.book import Book
+from xlrd.sheet import Cell
 from xlrd.xldate import XLDateAmbiguous
 
 from seed.lib.mcm import mapper, utils
@@ -33,10 +42,329 @@ from seed.lib.mcm import mapper, utils
 
 ROW_DELIMITER = "|#*#|"
 
+# XLSXSheet decodes the cells with internals of xlrd 1.x (xlsx.X12Sheet.do_row and
+# Book._xf_index_to_xl_type_map), see requirements/base.txt. With any other version of xlrd the
+# .xlsx files are loaded by xlrd, like the .xls files.
+XLSX_STREAMING = xlrd.__VERSION__.split('.')[0] == '1'
+
+if XLSX_STREAMING:
+    from xlrd import xlsx
+
+    XLSX_ROW_TAG = xlsx.U_SSML12 + 'row'
+    XLSX_SHEET_DATA_TAG = xlsx.U_SSML12 + 'sheetData'
+
+# Start tags of the rows and of the sheetData element in the XML of a worksheet. Text and
+# attribute values cannot contain a "<", so the tags are found without parsing the XML.
+XLSX_ROW_RE = re.compile(br'<(?:[\w.-]+:)?row(?=[\s/>])[^>]*>')
+XLSX_ROW_NUMBER_RE = re.compile(br'\sr="([0-9]+)"')
+XLSX_SHEET_DATA_RE = re.compile(br'<(?:[\w.-]+:)?sheetData(?=[\s/>])[^>]*>')
+
+XLSX_READ_SIZE = 1 << 20
+
+
+class XLSXSheet(object):
+    """Streaming reader of a worksheet of an .xlsx file for ExcelParser
+
+    xlrd loads the cells of all the worksheets of an .xlsx file into memory before the first row
+    can be read. This reader only loads the shared strings and the styles of the workbook, then
+    parses the rows of the worksheet one at a time. The cells of the rows are decoded by xlrd, so
+    they are the same as the cells of an xlrd sheet, and the rows before an offset are skipped
+    without decoding their cells.
+
+    The number of columns of the worksheet is only known once all its rows have been read. When
+    it is already known, e.g. from a previous reader of the file, pass it as ncols to only read
+    the rows that are used.
+
+    usage:
+            f = open('data.xlsx', 'rb')
+            sheet = XLSXSheet(f)
+            for row in sheet.iter_rows(start=10):
+                # list of xlrd cells of the row
+    """
+
+    def __init__(self, f, sheet_index=0, ncols=None):
+        self.f = f
+        xlsx.ensure_elementtree_imported(0, None)
+
+        # see xlrd.xlsx.open_workbook_2007_xml
+        book = Book()
+        book.logfile = sys.stdout
+        book.verbosity = 0
+        book.formatting_info = 0
+        book.use_mmap = False
+        book.on_demand = False
+        book.ragged_rows = 0
+        self.book = book
+
+        with self._open_zip() as zf:
+            names = self._component_names(zf)
+            x12book = xlsx.X12Book(book)
+            x12book.process_rels(zf.open(names['xl/_rels/workbook.xml.rels']))
+            x12book.process_stream(zf.open(names['xl/workbook.xml']), 'Workbook')
+            if 'xl/styles.xml' in names:
+                xlsx.X12Styles(book).process_stream(zf.open(names['xl/styles.xml']), 'styles')
+            if 'xl/sharedstrings.xml' in names:
+                xlsx.X12SST(book).process_stream(zf.open(names['xl/sharedstrings.xml']), 'SST')
+        self.worksheet_name = names[x12book.sheet_targets[sheet_index]]
+
+        self._nrows = None
+        if ncols is None:
+            self.ncols, self._nrows = self._get_dimensions()
+        else:
+            self.ncols = ncols
+
+    @property
+    def nrows(self):
+        """number of rows of the worksheet, read from the worksheet the first time when ncols was
+        given"""
+        if self._nrows is None:
+            self._nrows = self._get_dimensions()[1]
+        return self._nrows
+
+    @staticmethod
+    def is_xlsx(f):
+        """returns True if the file is an .xlsx workbook"""
+        if not XLSX_STREAMING or _is_empty(f):
+            return False
+        with _MappedFile(f) as data:
+            if data.read(4) != b'PK\x03\x04':
+                return False
+            try:
+                return 'xl/workbook.xml' in XLSXSheet._component_names(zipfile.ZipFile(data))
+            except zipfile.BadZipfile:
+                return False
+
+    @staticmethod
+    def _component_names(zf):
+        return {xlsx.X12Book.convert_filename(name): name for name in zf.namelist()}
+
+    @contextmanager
+    def _open_zip(self):
+        # every stream has its own mmap of the file, the zip members of one ZipFile share the
+        # position in the file
+        with _MappedFile(self.f) as data:
+            yield zipfile.ZipFile(data)
+
+    @contextmanager
+    def _open_worksheet(self, offset=None):
+        """returns a stream of the XML of the worksheet, or of the worksheet without its rows
+        before a row offset (see row_offsets)"""
+        with self._open_zip() as zf:
+            stream = zf.open(self.worksheet_name)
+            if offset is not None:
+                stream = self._skip_rows(stream, offset)
+            yield stream
+
+    @staticmethod
+    def _skip_rows(stream, offset):
+        """returns the stream of the XML of a worksheet without its rows before a row offset"""
+        # keep the start of the worksheet up to the sheetData element, for the namespaces
+        head = b''
+        match = None
+        while match is None:
+            block = stream.read(XLSX_READ_SIZE)
+            if not block:
+                raise ValueError('The worksheet has no sheetData element')
+            head += block
+            match = XLSX_SHEET_DATA_RE.search(head)
+
+        if offset < len(head):
+            rest = head[offset:]
+        else:
+            to_skip = offset - len(head)
+            while to_skip > 0:
+                block = stream.read(min(to_skip, XLSX_READ_SIZE))
+                if not block:
+                    break
+                to_skip -= len(block)
+            rest = b''
+        return _PrefixedStream(head[:match.end()] + rest, stream)
+
+    def row_offsets(self, starts):
+        """returns the offsets in the XML of the worksheet of the first rows at or after the row
+        indexes, without parsing the XML
+
+        :param starts: list of int, increasing row indexes
+        :returns: list, offset for each row index, or None when it can not be found
+        """
+        offsets = []
+        starts = iter(starts)
+        start = next(starts, None)
+        buf = b''
+        buf_offset = 0  # offset of the buffer in the worksheet
+        with self._open_worksheet() as stream:
+            while start is not None:
+                block = stream.read(XLSX_READ_SIZE)
+                if not block:
+                    break
+                buf += block
+                end = 0
+                for match in XLSX_ROW_RE.finditer(buf):
+                    row_number = XLSX_ROW_NUMBER_RE.search(match.group())
+                    if row_number is None:
+                        # the row number is optional, the rows would have to be counted
+                        return [None] * (len(offsets) + 1 + len(list(starts)))
+                    rowx = int(row_number.group(1)) - 1
+                    while start is not None and rowx >= start:
+                        offsets.append(buf_offset + match.start())
+                        start = next(starts, None)
+                    end = match.end()
+                # a tag cut by the end of the block is found with the next block
+                cut = max(end, buf.rfind(b'<'))
+                buf_offset += cut
+                buf = buf[cut:]
+
+        # no more rows
+        while start is not None:
+            offsets.append(None)
+            start = next(starts, None)
+        return offsets
+
+    def _iterparse(self, offset=None):
+        """yields the row elements of the worksheet, from a row offset if any"""
+        sheet_data = None
+        with self._open_worksheet(offset) as stream:
+            for event, elem in xlsx.ET.iterparse(stream, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == XLSX_SHEET_DATA_TAG:
+                        sheet_data = elem
+                elif elem.tag == XLSX_ROW_TAG:
+                    yield elem
+                    # drop the row from the tree once it has been read
+                    sheet_data.clear()
+
+    @staticmethod
+    def _has_value(cell_elem):
+        """returns True if xlrd stores a cell for the cell element, see X12Sheet.do_row"""
+        cell_type = cell_elem.get('t', 'n')
+        if cell_type in ('str', 'b', 'e'):
+            return True
+        if cell_type == 'inlineStr':
+            return len(cell_elem) > 0
+        return any(child.tag == xlsx.V_TAG and child.text for child in cell_elem)
+
+    def _get_dimensions(self):
+        """returns the number of columns and of rows of the cells of the worksheet
+
+        The dimension of the worksheet is not used, it is optional and it includes the blank
+        cells that only have a style. The cells are in the order of the columns, so only the
+        last cells with a value of the rows are decoded.
+        """
+        ncols = 0
+        nrows = 0
+        rowx = -1
+        for elem in self._iterparse():
+            row_number = elem.get('r')
+            rowx = int(row_number) - 1 if row_number is not None else rowx + 1
+            for colx in range(len(elem) - 1, -1, -1):
+                cell_elem = elem[colx]
+                if self._has_value(cell_elem):
+                    cell_name = cell_elem.get('r')
+                    if cell_name:
+                        colx = xlsx.cell_name_to_rowx_colx(cell_name)[1]
+                    ncols = max(ncols, colx + 1)
+                    nrows = rowx + 1
+                    break
+        return ncols, nrows
+
+    def iter_rows(self, start=0, offset=None):
+        """returns a generator yielding the cells of the rows starting at a row index
+
+        :param start: int, index of the first row
+        :param offset: int, offset of the first row at or after start (see row_offsets), to only
+                       parse the XML of the worksheet from there
+        :returns: Generator yielding a list of ncols xlrd cells per row
+        """
+        row = _XLSXRow(self.book)
+        x12sheet = xlsx.X12Sheet(row)
+        rowx = -1
+        last_rowx = start - 1
+        for elem in self._iterparse(offset):
+            row_number = elem.get('r')
+            rowx = int(row_number) - 1 if row_number is not None else rowx + 1
+            if rowx < start or not len(elem):
+                continue
+
+            x12sheet.rowx = rowx - 1
+            row.cells = {}
+            x12sheet.do_row(elem)
+            if not row.cells:
+                # like xlrd, rows of blank cells only count when they are followed by other rows
+                continue
+            for _ in range(last_rowx + 1, rowx):
+                yield [empty_cell] * self.ncols
+            yield [row.cells.get(colx, empty_cell) for colx in range(self.ncols)]
+            last_rowx = rowx
+
+
+class _PrefixedStream(object):
+    """Stream of bytes followed by the rest of a stream, for iterparse"""
+
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size=-1):
+        if self.prefix:
+            data, self.prefix = self.prefix, b''
+            return data
+        return self.stream.read(size)
+
+
+def _is_empty(f):
+    """returns True if the file is empty, an empty file can not be mapped"""
+    return os.fstat(f.fileno()).st_size == 0
+
+
+class _MappedFile(object):
+    """Read only memory map of a file for zipfile, which reads whole files with read()
+
+    usage:
+            with _MappedFile(f) as data:
+                zf = zipfile.ZipFile(data)
+    """
+
+    def __init__(self, f):
+        self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.seek = self.data.seek
+        self.tell = self.data.tell
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read(self, size=-1):
+        if size < 0:
+            size = self.data.size() - self.data.tell()
+        return self.data.read(size)
+
+    def close(self):
+        self.data.close()
+
+
+class _XLSXRow(object):
+    """Collects the cells that xlrd decodes from a row of a worksheet, see XLSXSheet"""
+
+    def __init__(self, book):
+        self.book = book
+        self.merged_cells = []
+        self.cells = {}
+
+    def put_cell(self, rowx, colx, ctype, value, xf_index):
+        if ctype is None:
+            # a number, the style of the cell tells if it is a date
+            ctype = self.book._xf_index_to_xl_type_map.get(xf_index, XL_CELL_NUMBER)
+        self.cells[colx] = Cell(ctype, value)
+
 
 class ExcelParser(object):
     """MS Excel (.xls, .xlsx) file parser for MCMParser
 
+    The rows of .xlsx files are streamed with XLSXSheet, .xls files are read with xlrd. The
+    number of columns of the file can be passed as num_columns, see XLSXSheet.
+
     usage:
             f = open('data.xls', 'rb')
             reader = MCMParser(f)
@@ -49,10 +377,17 @@ class ExcelParser(object):
     """
 
     def __init__(self, excel_file, *args, **kwargs):
-        self.cache_headers = []
         self.excel_file = excel_file
-        self.sheet = self._get_sheet(excel_file)
-        self.header_row = self._get_header_row(self.sheet)
+        if XLSXSheet.is_xlsx(excel_file):
+            self.sheet = XLSXSheet(excel_file, ncols=kwargs.get('num_columns'))
+            self._workbook = self.sheet.book  # needed to determine datemode
+        else:
+            self.sheet = self._get_sheet(excel_file)
+        self.header_row, header_cells = self._get_header_row(self.sheet)
+
+        # decode the headers once, they are the keys of all the rows
+        self.row_keys = [self.get_value(cell) for cell in header_cells]
+        self.cache_headers = [key.strip() for key in self.row_keys]
         self.excelreader = self.XLSDictReader(self.sheet, self.header_row)
 
     def _get_sheet(self, f, sheet_index=0):
@@ -62,27 +397,37 @@ class ExcelParser(object):
         :param sheet_index: the excel sheet with a 0-index
         :returns: xlrd Sheet
         """
-        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-        book = open_workbook(file_contents=data, on_demand=True)
-        self._workbook = book  # needed to determine datemode
-        return book.sheet_by_index(sheet_index)
+        if _is_empty(f):
+            raise XLRDError('Unsupported format, or corrupt file: the file is empty')
+
+        with _MappedFile(f) as data:
+            book = open_workbook(file_contents=data.data, on_demand=True)
+            self._workbook = book  # needed to determine datemode
+            sheet = book.sheet_by_index(sheet_index)
+            # the cells of the sheet are loaded, the book must not use the file anymore
+            book.release_resources()
+        return sheet
+
+    def _iter_rows(self, sheet, start=0, position=None):
+        """returns a generator yielding the cells of the rows of the sheet from a row index"""
+        if isinstance(sheet, XLSXSheet):
+            return sheet.iter_rows(start, position)
+        return (sheet.row(rowx) for rowx in range(start, sheet.nrows))
 
     def _get_header_row(self, sheet):
         """returns the best guess for the header row
 
-        :param sheet: xlrd sheet
-        :returns: index of header row
+        :param sheet: xlrd sheet or XLSXSheet
+        :returns: tuple, index and cells of header row
         """
-        for row in range(sheet.nrows):
-            row_contains_empty_cells = False
-            for col in range(sheet.ncols):
-                if sheet.cell(row, col).ctype == empty_cell.ctype:
-                    row_contains_empty_cells = True
-                    break
-            if not row_contains_empty_cells:
-                return row
+        first_row = None
+        for rowx, row in enumerate(self._iter_rows(sheet)):
+            if first_row is None:
+                first_row = row
+            if all(cell.ctype != empty_cell.ctype for cell in row):
+                return rowx, row
         # default to first row
-        return 0
+        return 0, first_row or []
 
     def get_value(self, item, **kwargs):
         """Handle different value types for XLS.
@@ -110,35 +455,24 @@ class ExcelParser(object):
 
         return item.value
 
-    def XLSDictReader(self, sheet, header_row=0):
+    def XLSDictReader(self, sheet, header_row=0, start_row=0, position=None):
         """returns a generator yeilding a dict per row from the XLS/XLSX file
         https://gist.github.com/mdellavo/639082
 
-        :param sheet: xlrd Sheet
+        :param sheet: xlrd Sheet or XLSXSheet
         :param header_row: the row index to start with
+        :param start_row: int, index of the first data row (0 is the first row after the header)
+        :param position: position of start_row from chunk_positions
         :returns: Generator yeilding a row as Dict
         """
-
-        # save off the headers into a member variable. Only do this once. If XLSDictReader is
-        # called later (which it is in `seek_to_beginning` then don't reparse the headers
-        if not self.cache_headers:
-            for j in range(sheet.ncols):
-                self.cache_headers.append(self.get_value(sheet.cell(header_row, j)).strip())
-
-        def item(i, j):
-            """returns a tuple (column header, cell value)"""
-            # self.cache_headers[j],
-            return (
-                self.get_value(sheet.cell(header_row, j)),
-                self.get_value(sheet.cell(i, j))
-            )
+        row_keys = self.row_keys
 
         # return a generator, using yield here wouldn't run until the first
         # usage causing the try/except in MCMParser _get_reader to return
         # ExcelReader for csv files
         return (
-            dict(item(i, j) for j in range(sheet.ncols))
-            for i in range(header_row + 1, sheet.nrows)
+            dict(zip(row_keys, [self.get_value(cell) for cell in row]))
+            for row in self._iter_rows(sheet, header_row + 1 + start_row, position)
         )
 
     def next(self):
@@ -149,11 +483,27 @@ class ExcelParser(object):
             except StopIteration:
                 break
 
+    def chunk_positions(self, chunk_size):
+        """returns the number of data rows and the position of the first row of each chunk of
+        chunk_size rows, the offsets in the worksheet for .xlsx files"""
+        num_rows = max(self.sheet.nrows - self.header_row - 1, 0)
+        starts = range(self.header_row + 1, self.header_row + 1 + num_rows, chunk_size)
+        if isinstance(self.sheet, XLSXSheet):
+            return num_rows, self.sheet.row_offsets(starts)
+        return num_rows, [None] * len(starts)
+
+    def rows_in_range(self, start_row, num_rows, position=None):
+        """returns a generator over a range of the data rows, the rows before the range are not
+        decoded"""
+        return islice(
+            self.XLSDictReader(self.sheet, self.header_row, start_row, position), num_rows
+        )
+
     def seek_to_beginning(self):
         """seeks to the beginning of the file
 
-        Since ``XLSDictReader`` is in memory, a new one is created. Note: the headers will not be
-        parsed again when the XLSDictReader is loaded
+        A new ``XLSDictReader`` is created. Note: the headers will not be parsed again when the
+        XLSDictReader is loaded
         """
         self.excel_file.seek(0)
         self.excelreader = self.XLSDictReader(self.sheet, self.header_row)
@@ -224,6 +574,36 @@ class CSVParser(object):
             except StopIteration:
                 break
 
+    def chunk_positions(self, chunk_size):
+        """returns the number of data rows and the position in the file of the first row of each
+        chunk of chunk_size rows"""
+        # read the lines one at a time so that the position of the file is the end of the row
+        self.csvfile.seek(0)
+        rows = csv.reader(iter(self.csvfile.readline, ''), self.csvreader.reader.reader.dialect)
+        next(rows, None)  # header row
+
+        num_rows = 0
+        positions = []
+        position = self.csvfile.tell()
+        for row in rows:
+            # like DictReader, skip the empty rows
+            if row:
+                if num_rows % chunk_size == 0:
+                    positions.append(position)
+                num_rows += 1
+            position = self.csvfile.tell()
+
+        self.seek_to_beginning()
+        return num_rows, positions
+
+    def rows_in_range(self, start_row, num_rows, position=None):
+        """returns a generator over a range of the data rows"""
+        if position is not None:
+            self.csvfile.seek(position)
+            return islice(self.next(), num_rows)
+        self.seek_to_beginning()
+        return islice(self.next(), start_row, start_row + num_rows)
+
     def seek_to_beginning(self):
         """seeks to the beginning of the file"""
         self.csvfile.seek(0)
@@ -263,7 +643,7 @@ class MCMParser(object):
     """
 
     def __init__(self, import_file, *args, **kwargs):
-        self.reader = self._get_reader(import_file)
+        self.reader = self._get_reader(import_file, kwargs.get('num_columns'))
         self.import_file = import_file
         if 'matching_func' not in kwargs:
             # Special note, contains expects arguments like the following
@@ -294,10 +674,10 @@ class MCMParser(object):
             # e.g. model.objects.get('some canonical id') or model_class()
             yield mapper.map_row(row, mapping, model_class)
 
-    def _get_reader(self, import_file):
+    def _get_reader(self, import_file, num_columns=None):
         """returns a CSV or XLS/XLSX reader or raises an exception"""
         try:
-            return ExcelParser(import_file)
+            return ExcelParser(import_file, num_columns=num_columns)
         except XLRDError as e:
             if 'Unsupported format' in e.message:
                 return CSVParser(import_file)
@@ -308,6 +688,29 @@ class MCMParser(object):
         """calls the reader's next"""
         return self.reader.next()
 
+    def chunk_positions(self, chunk_size):
+        """
+        Return the number of data rows of the file and the positions of the first rows of the
+        chunks of chunk_size rows, in one pass over the file. The rows of a chunk are read from
+        its position with rows_in_range.
+
+        :param chunk_size: int, number of rows of the chunks
+        :returns: tuple, number of rows and list of positions (None if unknown)
+        """
+        return self.reader.chunk_positions(chunk_size)
+
+    def rows_in_range(self, start_row, num_rows, position=None):
+        """
+        Return a generator over a range of the data rows of the file
+
+        :param start_row: int, index of the first row to return (0 is the first row after the header)
+        :param num_rows: int, maximum number of rows to return
+        :param position: position of start_row from chunk_positions, to start reading the file
+                         there instead of reading the rows before start_row
+        :returns: Generator yielding a row as Dict
+        """
+        return self.reader.rows_in_range(start_row, num_rows, position)
+
     def seek_to_beginning(self):
         """calls the reader's seek_to_beginning"""
         return self.reader.seek_to_beginning()
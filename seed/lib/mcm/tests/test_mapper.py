@@ -0,0 +1,59 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from django.test import TestCase
+
+from seed.lib.mcm.cleaners import Cleaner
+from seed.lib.mcm.mapper import MappingPlan, map_row
+from seed.models import PropertyState
+
+
+class TestMappingPlan(TestCase):
+    """Tests that the compiled mapping plan maps rows like map_row."""
+
+    def test_map_row(self):
+        table_mappings = {
+            'PropertyState': {
+                'Address': ('PropertyState', 'address_line_1'),
+                'GFA': ('PropertyState', 'gross_floor_area'),
+                'Color': ('PropertyState', 'Color'),
+            }
+        }
+        extra_data_fields = {'PropertyState': ['Color']}
+        cleaner = Cleaner({'types': {
+            'address_line_1': 'string',
+            'GFA': ('quantity', 'ft**2'),
+        }})
+        plan = MappingPlan(table_mappings, extra_data_fields, {}, cleaner)
+        self.assertEqual(plan.tables, ['PropertyState'])
+
+        row = {'Address': '123 Main St', 'GFA': '1,000', 'Color': 'Red', 'Unmapped': 'x'}
+        expected = map_row(row, table_mappings['PropertyState'], PropertyState,
+                           extra_data_fields['PropertyState'], cleaner)
+        state = plan.map_row(row, 'PropertyState', PropertyState)
+
+        self.assertEqual(state.address_line_1, expected.address_line_1)
+        self.assertEqual(state.gross_floor_area, expected.gross_floor_area)
+        self.assertEqual(state.extra_data, {'Color': 'Red'})
+        self.assertEqual(state.extra_data, expected.extra_data)
+
+    def test_expand_row(self):
+        table_mappings = {
+            'TaxLotState': {'Lots': ('TaxLotState', 'jurisdiction_tax_lot_id')},
+        }
+        delimited_fields = {
+            'jurisdiction_tax_lot_id': {
+                'from_field': 'Lots',
+                'to_table': 'TaxLotState',
+                'to_field_name': 'jurisdiction_tax_lot_id',
+            }
+        }
+        plan = MappingPlan(table_mappings, {}, delimited_fields)
+
+        rows = plan.expand_row({'Lots': '1;2'}, 'TaxLotState')
+        self.assertEqual([r['Lots'] for r in rows], ['1', '2'])
+        rows = plan.expand_row({'Lots': '1;2'}, 'PropertyState')
+        self.assertEqual([r['Lots'] for r in rows], ['1;2'])
@@ -0,0 +1,80 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+import os
+import tempfile
+
+import mock
+from django.test import TestCase
+from xlrd import XLRDError
+
+from seed.lib.mcm import reader
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), 'test_data')
+
+
+class TestExcelParser(TestCase):
+    """Tests for reading the rows of the Excel files."""
+
+    def parse(self, filename, streaming=True):
+        """returns the headers, number of columns, rows and first five rows of the file"""
+        with open(os.path.join(TEST_DATA, filename), 'rb') as f:
+            with mock.patch.object(reader.XLSXSheet, 'is_xlsx', return_value=streaming):
+                parser = reader.MCMParser(f)
+            self.assertEqual(isinstance(parser.reader.sheet, reader.XLSXSheet), streaming)
+            rows = list(parser.next())
+            return parser.headers, parser.num_columns(), rows, parser.first_five_rows
+
+    def test_xlsx_is_streamed(self):
+        # the rows are the same as the rows of the sheet loaded by xlrd
+        self.assertEqual(self.parse('test_espm.xlsx'),
+                         self.parse('test_espm.xlsx', streaming=False))
+
+    def test_xlsx_dates(self):
+        headers, _, rows, _ = self.parse('test_espm_date_format.xlsx')
+        self.assertEqual(headers, ['OTR-YearBuilt', 'OTR-DateSold'])
+        self.assertEqual(rows[0], {'OTR-YearBuilt': 1964, 'OTR-DateSold': '1995-07-27 00:00:00'})
+
+    def test_rows_in_range(self):
+        for filename in ['test_espm.xlsx', 'test_espm.xls', 'test_espm.csv']:
+            with open(os.path.join(TEST_DATA, filename), 'rb') as f:
+                parser = reader.MCMParser(f)
+                rows = list(parser.next())
+                self.assertEqual(list(parser.rows_in_range(1, 5)), rows[1:6])
+                self.assertEqual(list(parser.rows_in_range(0, 1)), rows[:1])
+
+                num_rows, positions = parser.chunk_positions(2)
+                self.assertEqual(num_rows, len(rows))
+                self.assertEqual(list(parser.rows_in_range(2, 2, positions[1])), rows[2:4])
+
+    def test_num_columns(self):
+        with open(os.path.join(TEST_DATA, 'test_espm.xlsx'), 'rb') as f:
+            parser = reader.MCMParser(f)
+            rows = list(parser.next())
+            num_columns = parser.num_columns()
+
+            # the worksheet is not read to count the columns again
+            with mock.patch.object(reader.XLSXSheet, '_get_dimensions') as get_dimensions:
+                parser = reader.MCMParser(f, num_columns=num_columns)
+                self.assertEqual(list(parser.rows_in_range(1, 5)), rows[1:6])
+            self.assertFalse(get_dimensions.called)
+            self.assertEqual(parser.num_columns(), num_columns)
+
+    def test_xlsx_without_streaming(self):
+        # with another version of xlrd, the .xlsx files are loaded by xlrd
+        with mock.patch.object(reader, 'XLSX_STREAMING', False):
+            with open(os.path.join(TEST_DATA, 'test_espm.xlsx'), 'rb') as f:
+                self.assertFalse(reader.XLSXSheet.is_xlsx(f))
+                parser = reader.MCMParser(f)
+                self.assertNotIsInstance(parser.reader.sheet, reader.XLSXSheet)
+                rows = list(parser.next())
+        self.assertEqual(rows, self.parse('test_espm.xlsx')[2])
+
+    def test_empty_file(self):
+        with tempfile.TemporaryFile() as f:
+            self.assertFalse(reader.XLSXSheet.is_xlsx(f))
+            with self.assertRaisesRegexp(XLRDError, 'Unsupported format'):
+                reader.ExcelParser(f)
@@ -153,6 +153,13 @@ def _make_resp(message_name):
 
 def _get_org_id(request):
     """Extract the ``organization_id`` regardless of HTTP method type."""
+    # the body is only parsed once per request
+    if not hasattr(request, '_perms_org_id'):
+        request._perms_org_id = _parse_org_id(request)
+    return request._perms_org_id
+
+
+def _parse_org_id(request):
     # first try to get it from the query parameters
     org_id = request.GET.get('organization_id')
     # if that does not work...
@@ -178,6 +185,21 @@ def _get_org_id(request):
     return org_id
 
 
+def _get_org_user(request, org_id):
+    """
+    Return the membership of the request's user in the organization, or None. The memberships are
+    kept on the request for the other permission checks of the request.
+    """
+    if org_id is None:
+        return None
+    if not hasattr(request, '_perms_org_users'):
+        request._perms_org_users = {}
+    key = (request.user.pk, str(org_id))
+    if key not in request._perms_org_users:
+        request._perms_org_users[key] = OrganizationUser.get_org_user(request.user, org_id)
+    return request._perms_org_users[key]
+
+
 def has_perm(perm_name):
     """Proceed if user from request has ``perm_name``."""
 
@@ -188,18 +210,10 @@ def has_perm(perm_name):
             if request.user.is_superuser and ALLOW_SUPER_USER_PERMS:
                 return fn(request, *args, **kwargs)
 
-            org_id = _get_org_id(request)
-
-            try:
-                org = Organization.objects.get(pk=org_id)
-            except Organization.DoesNotExist:
-                return _make_resp('org_dne')
-
-            try:
-                org_user = OrganizationUser.objects.get(
-                    user=request.user, organization=org
-                )
-            except OrganizationUser.DoesNotExist:
+            org_user = _get_org_user(request, _get_org_id(request))
+            if org_user is None:
+                if not Organization.objects.filter(pk=_get_org_id(request)).exists():
+                    return _make_resp('org_dne')
                 return _make_resp('user_dne')
 
             if not PERMS.get(perm_name, lambda x: False)(org_user):
@@ -223,18 +237,10 @@ def has_perm_class(perm_name):
             if request.user.is_superuser and ALLOW_SUPER_USER_PERMS:
                 return fn(self, request, *args, **kwargs)
 
-            org_id = _get_org_id(request)
-
-            try:
-                org = Organization.objects.get(pk=org_id)
-            except Organization.DoesNotExist:
-                return _make_resp('org_dne')
-
-            try:
-                org_user = OrganizationUser.objects.get(
-                    user=request.user, organization=org
-                )
-            except OrganizationUser.DoesNotExist:
+            org_user = _get_org_user(request, _get_org_id(request))
+            if org_user is None:
+                if not Organization.objects.filter(pk=_get_org_id(request)).exists():
+                    return _make_resp('org_dne')
                 return _make_resp('user_dne')
 
             if not PERMS.get(perm_name, lambda x: False)(org_user):
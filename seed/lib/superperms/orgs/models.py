@@ -8,8 +8,10 @@ import logging
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
 
 from seed.lib.superperms.orgs.exceptions import TooManyNestedOrgs
 
@@ -28,6 +30,10 @@ ROLE_LEVEL_CHOICES = (
     (ROLE_OWNER, 'Owner'),
 )
 
+# Seconds that the roles of the users in the organizations are cached, see
+# OrganizationUser.get_org_user
+ROLE_CACHE_TIMEOUT = 300
+
 # Invite status
 STATUS_PENDING = 'pending'
 STATUS_ACCEPTED = 'accepted'
@@ -40,10 +46,24 @@ STATUS_CHOICES = (
 )
 
 
+class OrganizationUserQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        """Update the memberships and clear the cached roles of their users, update() does not
+        send post_save"""
+        user_ids = set(self.values_list('user_id', flat=True))
+        rows = super(OrganizationUserQuerySet, self).update(**kwargs)
+        for user_id in user_ids:
+            OrganizationUser.clear_role_cache(user_id)
+        return rows
+
+
 class OrganizationUser(models.Model):
     class Meta:
         ordering = ['organization', '-role_level']
 
+    objects = OrganizationUserQuerySet.as_manager()
+
     user = models.ForeignKey(USER_MODEL)
     organization = models.ForeignKey('Organization')
     status = models.CharField(
@@ -72,12 +92,63 @@ class OrganizationUser(models.Model):
                     raise UserWarning('Did not find suitable user to promote')
         super(OrganizationUser, self).delete(*args, **kwargs)
 
+    @staticmethod
+    def _role_cache_key(user_id):
+        return 'org_user_roles__{}'.format(user_id)
+
+    @classmethod
+    def clear_role_cache(cls, user_id):
+        """Check the roles of the user in the organizations again, see get_org_user"""
+        cache.delete(cls._role_cache_key(user_id))
+
+    @classmethod
+    def get_org_user(cls, user, organization_id):
+        """
+        Return the membership of the user in the organization, or None. The roles of the user
+        are cached for a few minutes, until the memberships of the user change, and the
+        organization of the returned membership is only loaded when it is used.
+
+        :param user: User
+        :param organization_id: int, id of the organization
+        :return: OrganizationUser or None
+        """
+        organization_id = int(organization_id)
+        key = cls._role_cache_key(user.pk)
+        roles = cache.get(key) or {}
+        membership = roles.get(organization_id)
+        if membership is None:
+            membership = cls.objects.filter(
+                user=user, organization_id=organization_id
+            ).values_list('pk', 'role_level', 'status').first()
+            if membership is None:
+                return None
+            roles[organization_id] = membership
+            cache.set(key, roles, ROLE_CACHE_TIMEOUT)
+
+        pk, role_level, status = membership
+        return cls(pk=pk, user=user, organization_id=organization_id,
+                   role_level=role_level, status=status)
+
     def __unicode__(self):
         return u'OrganizationUser: {0} <{1}> ({2})'.format(
             self.user.username, self.organization.name, self.pk
         )
 
 
+@receiver(post_save, sender=OrganizationUser)
+@receiver(post_delete, sender=OrganizationUser)
+def invalidate_role_cache(sender, instance, **kwargs):
+    """Check the roles of the user again when they change or the user leaves an organization"""
+    OrganizationUser.clear_role_cache(instance.user_id)
+
+
+@receiver(post_save, sender=USER_MODEL)
+def invalidate_new_user_role_cache(sender, instance, created, **kwargs):
+    """A new user must not get the roles of a deleted user with the same id"""
+    if created:
+        OrganizationUser.clear_role_cache(instance.pk)
+
+
 class Organization(models.Model):
     """A group of people that optionally contains another sub group."""
 
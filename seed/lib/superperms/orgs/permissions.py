@@ -129,12 +129,10 @@ class SEEDOrgPermissions(BasePermission):
         if not org_id:
             org = get_user_org(request.user)
             org_id = getattr(org, 'pk')
-        try:
-            org_user = OrganizationUser.objects.get(
-                user=request.user, organization__id=org_id
-            )
+        org_user = OrganizationUser.get_org_user(request.user, org_id)
+        if org_user is not None:
             has_perm = org_user.role_level >= required_perm
-        except OrganizationUser.DoesNotExist:
+        else:
             self.message = 'No relationship to organization'
             # return the right error message. we wait until here to check for
             # organization so the extra db call is not made if not needed.
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from seed.utils.export import EXPORT_MAX_AGE, delete_old_exports
+
+
+class Command(BaseCommand):
+    help = 'Deletes the files of the background inventory exports that are older than a day'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours',
+                            default=EXPORT_MAX_AGE.total_seconds() / 3600,
+                            help='Delete the files that are older than this number of hours',
+                            action='store',
+                            type=float,
+                            dest='hours')
+
+    def handle(self, *args, **options):
+        count = delete_old_exports(timedelta(hours=options['hours']))
+        self.stdout.write('Deleted %s export files' % count, ending='\n')
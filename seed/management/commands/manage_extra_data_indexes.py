@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from django.core.management.base import BaseCommand
+
+from seed.models import ExtraDataIndex
+
+
+class Command(BaseCommand):
+    help = ('Saves the uses of the extra_data keys counted by the searches, creates indexes on the '
+            'keys that each organization filters and sorts on the most, and drops the indexes of '
+            'the keys that are not used as much anymore. Run it periodically, e.g. from cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-keys',
+                            default=5,
+                            type=int,
+                            help='Maximum number of keys to index per organization and table',
+                            dest='max_keys')
+        parser.add_argument('--min-uses',
+                            default=10,
+                            type=int,
+                            help='Minimum number of filters (or sorts) on a key to index it',
+                            dest='min_uses')
+        parser.add_argument('--dry-run',
+                            default=False,
+                            help='Only show the indexes that would be created and dropped',
+                            action='store_true',
+                            dest='dry_run')
+
+    def handle(self, *args, **options):
+        created, dropped = ExtraDataIndex.update_indexes(max_keys=options['max_keys'],
+                                                         min_uses=options['min_uses'],
+                                                         dry_run=options['dry_run'])
+        prefix = 'Would have ' if options['dry_run'] else ''
+        for index in dropped:
+            self.stdout.write('%sdropped %s' % (prefix, index), ending='\n')
+        for index in created:
+            self.stdout.write('%screated %s' % (prefix, index), ending='\n')
+        self.stdout.write(
+            '%s%s indexes created and %s dropped' % (prefix, len(created), len(dropped)),
+            ending='\n'
+        )
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from django.core.management.base import BaseCommand
+
+from seed.models import PropertyState, TaxLotState
+from seed.utils.hashing import hash_state_object
+
+
+class Command(BaseCommand):
+    help = 'Calculates and stores the hash of the property and tax lot states'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all',
+                            default=False,
+                            help='Recalculate the hash of every state, not only the missing ones',
+                            action='store_true',
+                            dest='all')
+
+    def handle(self, *args, **options):
+        for model in [PropertyState, TaxLotState]:
+            states = model.objects.all()
+            if not options['all']:
+                states = states.filter(hash_object__isnull=True)
+
+            count = 0
+            for state in states.iterator():
+                hash_object = hash_state_object(state)
+                if hash_object != state.hash_object:
+                    # Only write the hash; save() would also touch the normalized address
+                    model.objects.filter(pk=state.pk).update(hash_object=hash_object)
+                    count += 1
+
+            self.stdout.write(
+                'Updated the hash of %s %s objects' % (count, model.__name__),
+                ending='\n'
+            )
@@ -1,45 +1,77 @@
 # !/usr/bin/env python
 # encoding: utf-8
 
-from django.db.models import Manager
+from django.db.models import Case, DecimalField, F, Func, Manager, TextField, Value, When
 from django.db.models.query import QuerySet
 
+# Strings that PostgreSQL can cast to a numeric, which only accepts exponents up to 1000
+NUMERIC_REGEX = r'^\s*[-+]?([0-9]+(\.[0-9]*)?|\.[0-9]+)([eE][-+]?[0-9]{1,3})?\s*$'
+
+
+class JsonKeyText(Func):
+    """
+    Value of a key of a JSON field as text, i.e. field->>key. Unlike KeyTextTransform, the key is
+    passed to the database as a parameter.
+    """
+    arg_joiner = ' ->> '
+    template = '(%(expressions)s)'
+
+    def __init__(self, field, key):
+        super(JsonKeyText, self).__init__(F(field), Value(key), output_field=TextField())
+
+
+class TextToNumeric(Func):
+    """
+    Text cast to numeric. Unlike a cast to double precision, the cast does not fail for the
+    numbers that are out of the range of a double, e.g. 1e400.
+    """
+    template = '(%(expressions)s)::numeric'
+
+    def __init__(self, expression):
+        super(TextToNumeric, self).__init__(expression, output_field=DecimalField())
+
 
 class JsonQuerySet(QuerySet):
     PRIMARY = 'extra_data'
     TABLE = 'seed_buildingsnapshot'
 
-    def _safe_cast(self, cast_fn, val):
-        try:
-            return cast_fn(val)
-        except TypeError:
-            return val
-
     def json_order_by(self, key, order_by, order_by_rev=False, unit=None):
-        from seed.models import FLOAT, DECIMAL, STRING
+        """
+        Order the queryset by a key of the extra_data in the database, so that the result is
+        still a queryset that can be paginated.
+
+        Unless the unit is a date, the values that look like numbers are sorted numerically
+        before the other values, which are sorted as text. Missing and null values are always
+        last.
 
-        def get_field(x):
-            return getattr(x, self.PRIMARY).get(order_by, None)
+        :param key: str, unused, same as order_by
+        :param order_by: str, key of the extra_data
+        :param order_by_rev: bool, if True then sort in descending order
+        :param unit: Unit, unit of the extra_data column, defaults to a string
+        :return: queryset
+        """
+        from seed.models import DATE, DATETIME, STRING
 
         unit_type = STRING
         if unit:
             unit_type = unit.unit_type
 
-        qs = self
-        qs = list(qs)
-
-        key_fns = {
-            STRING: get_field,
-            FLOAT: lambda x: self._safe_cast(float, get_field(x)),
-            DECIMAL: lambda x: self._safe_cast(float, get_field(x)),
-        }
-
-        qs.sort(
-            key=key_fns.get(unit_type, get_field),
-            reverse=order_by_rev,
-        )
+        qs = self.annotate(json_order_text=JsonKeyText(self.PRIMARY, order_by))
+        ordering = ['json_order_text']
+        if unit_type not in (DATE, DATETIME):
+            qs = qs.annotate(json_order_number=Case(
+                When(json_order_text__regex=NUMERIC_REGEX,
+                     then=TextToNumeric('json_order_text')),
+                default=None,
+                output_field=DecimalField(),
+            ))
+            ordering.insert(0, 'json_order_number')
 
-        return qs
+        if order_by_rev:
+            ordering = [F(field).desc(nulls_last=True) for field in ordering] + ['-pk']
+        else:
+            ordering = [F(field).asc(nulls_last=True) for field in ordering] + ['pk']
+        return qs.order_by(*ordering)
 
 
 class JsonManager(Manager):
@@ -0,0 +1,53 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from django.core.paginator import Paginator
+from django.test import TestCase
+
+from seed.models import BuildingSnapshot, DATE, FLOAT, Unit
+
+
+class JsonQuerySetTests(TestCase):
+
+    def setUp(self):
+        values = ['10', 'b', None, '9.5', 'a', '-2', '1e2', "it's"]
+        self.snapshots = {}
+        for value in values:
+            extra_data = {'other': 1} if value is None else {'my key': value}
+            self.snapshots[value] = BuildingSnapshot.objects.create(extra_data=extra_data)
+
+    def _ordered_values(self, *args, **kwargs):
+        qs = BuildingSnapshot.objects.all().json_order_by('my key', 'my key', *args, **kwargs)
+        return [b.extra_data.get('my key') for b in qs]
+
+    def test_json_order_by(self):
+        self.assertEqual(self._ordered_values(),
+                         ['-2', '9.5', '10', '1e2', 'a', 'b', "it's", None])
+        self.assertEqual(self._ordered_values(order_by_rev=True),
+                         ['1e2', '10', '9.5', '-2', "it's", 'b', 'a', None])
+        self.assertEqual(self._ordered_values(unit=Unit(unit_type=FLOAT)),
+                         ['-2', '9.5', '10', '1e2', 'a', 'b', "it's", None])
+        # dates are sorted as text
+        self.assertEqual(self._ordered_values(unit=Unit(unit_type=DATE)),
+                         ['-2', '10', '1e2', '9.5', 'a', 'b', "it's", None])
+
+    def test_json_order_by_out_of_range(self):
+        # numbers out of the range of a double are sorted too
+        for value in ['1e400', '-1e400', '1e-400', '1e5000']:
+            BuildingSnapshot.objects.create(extra_data={'my key': value})
+        self.assertEqual(self._ordered_values(),
+                         ['-1e400', '-2', '1e-400', '9.5', '10', '1e2', '1e400',
+                          '1e5000', 'a', 'b', "it's", None])
+
+    def test_json_order_by_paginates(self):
+        qs = BuildingSnapshot.objects.all().json_order_by('my key', 'my key')
+        page = Paginator(qs, 3).page(2)
+        self.assertEqual([b.extra_data.get('my key') for b in page], ['1e2', 'a', 'b'])
+        self.assertEqual(page.paginator.count, 8)
+
+        # keys are passed as parameters
+        qs = BuildingSnapshot.objects.all().json_order_by("it's", "it's")
+        self.assertEqual(len(qs), 8)
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 02:59
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seed', '0087_merge_20180123_1033'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertystate',
+            name='hash_object',
+            field=models.CharField(blank=True, db_index=True, default=None, editable=False, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='taxlotstate',
+            name='hash_object',
+            field=models.CharField(blank=True, db_index=True, default=None, editable=False, max_length=32, null=True),
+        ),
+    ]
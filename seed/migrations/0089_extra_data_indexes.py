@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 03:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orgs', '0006_organization_display_significant_figures'),
+        ('seed', '0088_state_hash_object'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtraDataIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(max_length=100)),
+                ('key', models.CharField(max_length=255)),
+                ('index_type', models.CharField(choices=[(b'btree', b'Exact, range and empty filters'), (b'trigram', b'Contains filters'), (b'sort', b'Sorting')], max_length=20)),
+                ('name', models.CharField(max_length=63, unique=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='extra_data_indexes', to='orgs.Organization')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExtraDataKeyUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(max_length=100)),
+                ('key', models.CharField(max_length=255)),
+                ('filter_count', models.IntegerField(default=0)),
+                ('sort_count', models.IntegerField(default=0)),
+                ('last_used', models.DateTimeField(default=django.utils.timezone.now)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='extra_data_key_usages', to='orgs.Organization')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='extradatakeyusage',
+            unique_together=set([('organization', 'table_name', 'key')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='extradataindex',
+            unique_together=set([('organization', 'table_name', 'key', 'index_type')]),
+        ),
+    ]
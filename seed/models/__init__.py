@@ -21,6 +21,7 @@ from .meters import *  # noqa
 from .simulations import *  # noqa
 from .building_file import *  # noqa
 from .notes import *  # noqa
+from .extra_data_indexes import *  # noqa
 
 from .certification import (    # noqa
     GreenAssessment,
@@ -9,10 +9,13 @@ import copy
 import csv
 import logging
 import os.path
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+from uuid import uuid4
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
 from seed.landing.models import SEEDUser as User
@@ -23,6 +26,7 @@ from seed.models.models import (
     Unit,
     SEED_DATA_SOURCES,
 )
+from seed.utils.cache import get_cache_raw, set_cache_raw
 from seed.utils.constants import VIEW_COLUMNS_PROPERTY
 from seed.utils.strings import titlecase
 
@@ -36,6 +40,12 @@ INVENTORY_MAP_PREPEND = {
 }
 _log = logging.getLogger(__name__)
 
+# Seconds that the column catalogs of an organization are cached, see ColumnCatalog
+COLUMN_CATALOG_TIMEOUT = 86400
+
+# Version of the format of the column catalogs, change it when the built columns change
+COLUMN_CATALOG_VERSION = 1
+
 
 def get_column_mapping(raw_column, organization, attr_name='column_mapped'):
     """Find the ColumnMapping objects that exist in the database from a raw_column
@@ -476,6 +486,45 @@ class Column(models.Model):
 
                     break
 
+    @staticmethod
+    def save_extra_data_column_names(organization, table_name, column_names):
+        """Save the column names of a batch of extra_data keys in this organization.
+
+        This is the batch version of ``save_column_names``. The existing columns are looked up
+        with one query and all of the missing columns are created with one insert. There is no
+        unique constraint on the Column table, so this is not an upsert in the database sense.
+
+        :param organization: Organization instance
+        :param table_name: str, either PropertyState or TaxLotState
+        :param column_names: iterable, extra_data keys that have been seen
+        """
+        md = MappingData()
+
+        columns = set()
+        for key in column_names:
+            # yes i am a db column, thus I am not extra_data
+            columns.add((key[:511], False if md.find_column(table_name, key) else True))
+
+        if not columns:
+            return
+
+        existing = set(Column.objects.filter(
+            organization=organization,
+            table_name=table_name,
+            column_name__in=[name for name, _ in columns],
+        ).values_list('column_name', 'is_extra_data'))
+
+        created = Column.objects.bulk_create([
+            Column(column_name=column[0],
+                   is_extra_data=column[1],
+                   organization=organization,
+                   table_name=table_name)
+            for column in columns - existing
+        ])
+        # bulk_create does not send the post_save signals
+        if created:
+            ColumnCatalog.invalidate_on_commit(organization.pk)
+
     def to_dict(self):
         """
         Convert the column object to a dictionary
@@ -588,6 +637,28 @@ class Column(models.Model):
 
         return list(fields)
 
+    @staticmethod
+    def retrieve_catalog(org_id, inventory_type, only_used):
+        """
+        Return the ColumnCatalog of an organization. The catalog is cached until a Column or a
+        ColumnMapping of the organization changes.
+
+        :param org_id: Organization ID (or instance)
+        :param inventory_type: Inventory Type (property|taxlot)
+        :param only_used: View only the used columns that exist in the Column's table
+        :return: ColumnCatalog
+        """
+        org_id = getattr(org_id, 'pk', org_id)
+        inventory_type = inventory_type.lower()
+        only_used = bool(only_used)
+
+        key = ColumnCatalog.cache_key(org_id, inventory_type, only_used)
+        catalog = get_cache_raw(key)
+        if catalog is None:
+            catalog = ColumnCatalog(Column._build_catalog_columns(org_id, inventory_type, only_used))
+            set_cache_raw(key, catalog, COLUMN_CATALOG_TIMEOUT)
+        return catalog
+
     @staticmethod
     def retrieve_all(org_id, inventory_type, only_used):
         """
@@ -605,29 +676,46 @@ class Column(models.Model):
 
         :return: dict
         """
+        # the callers are free to change the columns, so return a copy of the cached catalog
+        return copy.deepcopy(Column.retrieve_catalog(org_id, inventory_type, only_used).columns)
+
+    @staticmethod
+    def _build_catalog_columns(org_id, inventory_type, only_used):
+        """Build the columns of retrieve_all from the database, see retrieve_all"""
+        shared_field_types = dict(Column.SHARED_FIELD_TYPES)
+
+        # Grab all the columns of the organization at once
+        db_columns = defaultdict(list)
+        extra_data_columns = []
+        for table_name, column_name, is_extra_data, shared_field_type in Column.objects.filter(
+                organization_id=org_id
+        ).order_by('id').values_list('table_name', 'column_name', 'is_extra_data',
+                                     'shared_field_type'):
+            if not is_extra_data:
+                db_columns[(table_name, column_name)].append(shared_field_type)
+            elif table_name:
+                # don't return columns that have no table_name as these are the columns of the
+                # import files
+                extra_data_columns.append((table_name, column_name, shared_field_type))
 
         # Grab the default columns and their details
-        columns = Column._retrieve_db_columns()
-        remove_columns = []
-        # Clean up the columns
-        for index, c in enumerate(columns):
+        columns = []
+        for c in Column._retrieve_db_columns():
             # set the raw db name as well. Eventually we will want the table/db_name to be the unique id
             c['dbName'] = c['name']
 
             # check if the column is in the database and if it is then add in the other information that
             # is in the database
-            db_col = Column.objects.filter(organization_id=org_id, is_extra_data=False,
-                                           table_name=c['table'], column_name=c['name'])
+            db_col = db_columns.get((c['table'], c['name']), [])
             if len(db_col) == 1:
-                db_col = db_col.first()
-                c['sharedFieldType'] = db_col.get_shared_field_type_display()
+                c['sharedFieldType'] = shared_field_types[db_col[0]]
             elif len(db_col) == 0:
                 if only_used:
-                    remove_columns.append(index)
+                    continue
                 else:
                     c['sharedFieldType'] = 'None'
 
-            if c['table'] and (inventory_type.lower() in c['table'].lower()):
+            if c['table'] and (inventory_type in c['table'].lower()):
                 c['related'] = False
                 if c.get('pinIfNative', False):
                     c['pinnedLeft'] = True
@@ -635,39 +723,22 @@ class Column(models.Model):
                 c['related'] = True
                 # For now, a related field has a prepended value to make the columns unique.
                 if c.get('duplicateNameInOtherTable', False):
-                    c['name'] = "{}_{}".format(INVENTORY_MAP_PREPEND[inventory_type.lower()], c['name'])
+                    c['name'] = "{}_{}".format(INVENTORY_MAP_PREPEND[inventory_type], c['name'])
 
             # Remove some keys that are not needed for the API
-            try:
-                c.pop('pinIfNative')
-            except KeyError:
-                pass
+            c.pop('pinIfNative', None)
+            c.pop('duplicateNameInOtherTable', None)
+            c.pop('dbField', None)
+            columns.append(c)
 
-            try:
-                c.pop('duplicateNameInOtherTable')
-            except KeyError:
-                pass
-
-            try:
-                c.pop('dbField')
-            except KeyError:
-                pass
-
-        # reverse the remove_columns list and remove the indexes from the columns
-        for remove_column in remove_columns[::-1]:
-            del columns[remove_column]
+        # tables of each column name
+        name_tables = defaultdict(set)
+        for c in columns:
+            name_tables[c['name']].add(c['table'])
 
         # Add in all the extra columns
-        # don't return columns that have no table_name as these are the columns of the import files
-        extra_data_columns = Column.objects.filter(
-            organization_id=org_id, is_extra_data=True
-        ).exclude(table_name='').exclude(table_name=None)
-
-        for edc in extra_data_columns:
-            name = edc.column_name
-            table = edc.table_name
-            # set the raw db name as well. Eventually we will want the table/db_name to be the unique id
-            db_name = name
+        for table, db_name, shared_field_type in extra_data_columns:
+            name = db_name
 
             # Avoid name conflicts with protected front-end columns
             if name in ['id', 'notes_count']:
@@ -678,7 +749,7 @@ class Column(models.Model):
             # needs to be tagged something else.
 
             # add _extra if the column is already in the list and it is not the one of
-            while any(col['name'] == name and col['table'] != table for col in columns):
+            while name_tables[name] - {table}:
                 name += '_extra'
 
             # TODO: need to check if the column name is already in the list and if it is then overwrite the data
@@ -687,14 +758,15 @@ class Column(models.Model):
                 {
                     'name': name,
                     'dbName': db_name,
-                    'table': edc.table_name,
-                    'displayName': titlecase(edc.column_name),
+                    'table': table,
+                    'displayName': titlecase(db_name),
                     # 'dataType': 'string',  # TODO: how to check dataTypes on extra_data!
-                    'related': not (inventory_type.lower() in edc.table_name.lower()),
+                    'related': not (inventory_type in table.lower()),
                     'extraData': True,
-                    'sharedFieldType': edc.get_shared_field_type_display(),
+                    'sharedFieldType': shared_field_types[shared_field_type],
                 }
             )
+            name_tables[name].add(table)
 
         # validate that the field 'name' is unique.
         uniq = set()
@@ -707,6 +779,70 @@ class Column(models.Model):
         return columns
 
 
+class ColumnCatalog(object):
+    """
+    Columns of an organization as returned by Column.retrieve_all, indexed by name and by table
+    and name. The catalogs are cached per organization, inventory type and only_used, under a
+    version of the organization's columns that changes whenever one of its Column or
+    ColumnMapping changes.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.by_name = {}
+        self.by_table_name = {}
+        for c in columns:
+            self.by_name[c['name']] = c
+            self.by_table_name[(c['table'], c['name'])] = c
+
+    def get(self, name, default=None):
+        """Return the column with the name (the last one if there are several tables)"""
+        return self.by_name.get(name, default)
+
+    def get_by_table(self, table, name, default=None):
+        """Return the column of the table with the name"""
+        return self.by_table_name.get((table, name), default)
+
+    @staticmethod
+    def _version_key(org_id):
+        return 'column_catalog_version__{}'.format(org_id)
+
+    @staticmethod
+    def cache_key(org_id, inventory_type, only_used):
+        """Return the cache key of a catalog for the current version of the organization"""
+        version_key = ColumnCatalog._version_key(org_id)
+        version = get_cache_raw(version_key)
+        if version is None:
+            version = ColumnCatalog.invalidate(org_id)
+        return 'column_catalog__{}__{}__{}__{}__{}'.format(
+            org_id, version, inventory_type, int(only_used), COLUMN_CATALOG_VERSION
+        )
+
+    @staticmethod
+    def invalidate(org_id):
+        """
+        Change the version of the organization's columns so that the catalogs are built again.
+        The previous catalogs expire on their own.
+
+        :param org_id: int, id of the organization
+        :return: str, the new version
+        """
+        version = uuid4().hex
+        set_cache_raw(ColumnCatalog._version_key(org_id), version, COLUMN_CATALOG_TIMEOUT)
+        return version
+
+    @staticmethod
+    def invalidate_on_commit(org_id):
+        """
+        Invalidate the catalogs of the organization now and once the transaction is committed,
+        so that a catalog built from the data before the commit is not kept.
+        """
+        if org_id is None:
+            return
+        ColumnCatalog.invalidate(org_id)
+        transaction.on_commit(lambda: ColumnCatalog.invalidate(org_id))
+
+
 class ColumnMapping(models.Model):
     """Stores previous user-defined column mapping.
 
@@ -903,3 +1039,35 @@ class ColumnMapping(models.Model):
         """
         count, _ = ColumnMapping.objects.filter(super_organization=organization).delete()
         return count
+
+
+@receiver(post_save, sender=Column)
+@receiver(post_delete, sender=Column)
+def invalidate_column_catalog(sender, instance, **kwargs):
+    """Build the column catalogs of the organization again when one of its columns changes"""
+    ColumnCatalog.invalidate_on_commit(instance.organization_id)
+
+
+@receiver(post_save, sender=ColumnMapping)
+@receiver(post_delete, sender=ColumnMapping)
+def invalidate_column_mapping_catalog(sender, instance, **kwargs):
+    """Build the column catalogs of the organization again when one of its mappings changes"""
+    ColumnCatalog.invalidate_on_commit(instance.super_organization_id)
+
+
+@receiver(m2m_changed, sender=ColumnMapping.column_raw.through)
+@receiver(m2m_changed, sender=ColumnMapping.column_mapped.through)
+def invalidate_column_mapping_columns_catalog(sender, instance, action, **kwargs):
+    """Build the column catalogs of the organization again when the columns of a mapping change"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if isinstance(instance, ColumnMapping):
+            ColumnCatalog.invalidate_on_commit(instance.super_organization_id)
+        else:
+            ColumnCatalog.invalidate_on_commit(instance.organization_id)
+
+
+@receiver(post_save, sender=SuperOrganization)
+def invalidate_new_organization_catalog(sender, instance, created, **kwargs):
+    """Do not use catalogs that were cached for an organization with the same id"""
+    if created:
+        ColumnCatalog.invalidate(instance.pk)
@@ -4,16 +4,23 @@
 :copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
 :author
 """
+import hashlib
+import heapq
 import json
 import logging
+import operator
 import re
+from collections import OrderedDict, defaultdict
 from datetime import date, datetime
+from itertools import islice
 from random import randint
 
 import pytz
 from django.apps import apps
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
 from django.utils.timezone import get_current_timezone, make_aware, make_naive
+from pint.errors import DimensionalityError
 from quantityfield import ureg
 
 from seed.lib.superperms.orgs.models import Organization
@@ -24,8 +31,9 @@ from seed.models import (
 from seed.models import obj_to_dict
 from seed.serializers.pint import pretty_units
 from seed.utils.cache import (
-    set_cache_raw, get_cache_raw
+    append_cache_list, delete_cache, get_cache_list, get_cache_hash_values, set_cache_hash_values
 )
+from seed.utils.hashing import get_comparison_fields
 from seed.utils.time import convert_datestr
 
 _log = logging.getLogger(__name__)
@@ -37,6 +45,18 @@ RULE_TYPE = [
     (RULE_TYPE_CUSTOM, 'custom'),
 ]
 
+# Keep the data quality results for 24 hours
+DATA_QUALITY_RESULTS_TIMEOUT = 86400
+
+# Keep the checks of the states for a week. Increment the version when the checks change so that
+# the cached checks are not used. The checks are only an optimization: an expired (or evicted)
+# check is done again and gives the same results, so they are kept in the cache rather than in a
+# table. Their results hold the values of the states (e.g. quantities and dates), which are
+# pickled by the cache. A week covers the imports and re-checks of the same data, and the
+# checks of states that are not checked anymore expire without a cleanup.
+DATA_QUALITY_CHECKS_TIMEOUT = 604800
+DATA_QUALITY_CHECKS_VERSION = 1
+
 TYPE_NUMBER = 0
 TYPE_STRING = 1
 TYPE_DATE = 2
@@ -246,6 +266,42 @@ class DataQualityTypeCastError(Exception):
     pass
 
 
+def _to_none(value):
+    return None
+
+
+def _to_number(value):
+    if value == '':
+        return None
+    else:
+        return float(value)
+
+
+def _to_date(value):
+    if value == '':
+        return None
+    else:
+        return convert_datestr(value, True)
+
+
+def _to_year(value):
+    if value == '':
+        return None
+    else:
+        dt = convert_datestr(value, True)
+        if dt is not None:
+            return dt.date()
+
+
+# Functions to type the string values (e.g. from extra_data) for each data type
+STR_CASTS = {
+    TYPE_NUMBER: _to_number,
+    TYPE_STRING: str,
+    TYPE_DATE: _to_date,
+    TYPE_YEAR: _to_year,
+}
+
+
 def format_pint_violation(rule, source_value):
     """
     Format a pint min, max violation for human readability.
@@ -401,27 +457,7 @@ class Rule(models.Model):
         if isinstance(value, (str, unicode)):
             # check if we can type cast the value
             try:
-                # since we already checked for data type, does this mean it isn't None, ever?
-                if value is not None:
-                    if self.data_type == TYPE_NUMBER:
-                        if value == '':
-                            return None
-                        else:
-                            return float(value)
-                    elif self.data_type == TYPE_STRING:
-                        return str(value)
-                    elif self.data_type == TYPE_DATE:
-                        if value == '':
-                            return None
-                        else:
-                            return convert_datestr(value, True)
-                    elif self.data_type == TYPE_YEAR:
-                        if value == '':
-                            return None
-                        else:
-                            dt = convert_datestr(value, True)
-                            if dt is not None:
-                                return dt.date()
+                return STR_CASTS.get(self.data_type, _to_none)(value)
             except ValueError as e:
                 raise DataQualityTypeCastError("Error converting {} with {}".format(value, e))
         else:
@@ -469,6 +505,261 @@ class Rule(models.Model):
         return [f_min, f_max, f_value]
 
 
+class CompiledRule(object):
+    """
+    Rule prepared for checking many values. The type cast and the regex are resolved once and
+    the min/max bounds are converted once for each type (and units) of the checked values, instead
+    of for every comparison.
+    """
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.cast = STR_CASTS.get(rule.data_type, _to_none)
+        self.regex = None
+        if rule.data_type == TYPE_STRING and rule.text_match:
+            self.regex = re.compile(rule.text_match, re.IGNORECASE)
+        self.bounds = {}
+
+    def str_to_data_type(self, value):
+        """Same as Rule.str_to_data_type with the cast resolved once"""
+        if isinstance(value, (str, unicode)):
+            try:
+                return self.cast(value)
+            except ValueError as e:
+                raise DataQualityTypeCastError("Error converting {} with {}".format(value, e))
+        else:
+            return value
+
+    def valid_text(self, value):
+        """Same as Rule.valid_text with the regex compiled once"""
+        if self.regex is not None and isinstance(value, (str, unicode)):
+            return self.regex.search(value) is not None
+        return True
+
+    def _convert_bound(self, bound, key):
+        if bound is None:
+            return None
+        elif key is datetime:
+            return make_aware(datetime.strptime(str(int(bound)), '%Y%m%d'), pytz.UTC)
+        elif key is date:
+            return datetime.strptime(str(int(bound)), '%Y%m%d').date()
+        elif key is int:
+            return int(bound)
+        elif key in (float, str):
+            return bound
+        else:
+            # key is the units of the quantities
+            return bound * ureg(self.rule.units)
+
+    def _get_bounds(self, key):
+        if key not in self.bounds:
+            rule_min = self._convert_bound(self.rule.min, key)
+            rule_max = self._convert_bound(self.rule.max, key)
+            magnitudes = False
+            if isinstance(key, ureg.Unit):
+                # Compare the magnitudes in the units of the values, if the units are compatible
+                try:
+                    if rule_min is not None:
+                        rule_min = rule_min.to(key).magnitude
+                    if rule_max is not None:
+                        rule_max = rule_max.to(key).magnitude
+                    magnitudes = True
+                except (AttributeError, DimensionalityError):
+                    rule_min = self._convert_bound(self.rule.min, key)
+                    rule_max = self._convert_bound(self.rule.max, key)
+            self.bounds[key] = (rule_min, rule_max, magnitudes)
+        return self.bounds[key]
+
+    def _prepare(self, value):
+        """
+        Return the value and the rule's bounds converted to comparable types, see
+        Rule.minimum_valid and Rule.maximum_valid.
+        """
+        if isinstance(value, datetime):
+            key = datetime
+            value = value.astimezone(get_current_timezone()).replace(tzinfo=pytz.UTC)
+        elif isinstance(value, date):
+            key = date
+        elif isinstance(value, int):
+            key = int
+        elif isinstance(value, ureg.Quantity):
+            key = value.units
+        elif isinstance(value, (str, unicode)):
+            key = str
+        else:
+            # must be a float...
+            key = float
+            value = float(value)
+
+        rule_min, rule_max, magnitudes = self._get_bounds(key)
+        if magnitudes:
+            value = value.magnitude
+        return value, rule_min, rule_max
+
+    def check(self, value, from_extra_data, mapped, display_name):
+        """
+        Check a value of the rule's field.
+
+        :param value: value of the field
+        :param from_extra_data: bool, if the value is from the extra_data and must be typed
+        :param mapped: bool, if the field is one of the organization's columns
+        :param display_name: str, display name of the field
+        :return: tuple, (list of the results as (result type, args), bool if the rule is
+            violated, bool if the rule could not be checked and the label must not be removed)
+        """
+        rule = self.rule
+        if from_extra_data:
+            try:
+                value = self.str_to_data_type(value)
+            except DataQualityTypeCastError:
+                return [('type_error', (rule.field, value))], False, True
+
+        if not mapped:
+            # If the rule is not in the column lookup, then it may have been a required
+            # field that wasn't mapped
+            if rule.required:
+                return [('missing_req', (display_name, value))], True, False
+            return [], False, False
+        elif value is None or value == '':
+            # Empty fields
+            if rule.required:
+                return [('missing_and_none', (display_name, value))], True, False
+            elif rule.not_null:
+                return [('is_null', (display_name, value))], True, False
+            return [], False, False
+        elif not self.valid_text(value):
+            return [('string_error', (display_name, value))], True, False
+        elif rule.min is None and rule.max is None:
+            return [], False, False
+
+        results = []
+        compared_value, rule_min, rule_max = self._prepare(value)
+        for bound, result_type in [(rule_min, 'min_error'), (rule_max, 'max_error')]:
+            if bound is None:
+                continue
+            try:
+                if result_type == 'min_error':
+                    valid = not compared_value < bound
+                else:
+                    valid = not compared_value > bound
+            except ValueError:
+                valid = None
+
+            if not valid:
+                s_min, s_max, s_value = rule.format_strings(value)
+                s_bound = s_min if result_type == 'min_error' else s_max
+                if valid is None:
+                    results.append(('comparison_error', (display_name, s_value, s_bound)))
+                    return results, bool(results[:-1]), True
+                results.append((result_type, (display_name, s_value, s_bound)))
+
+        return results, bool(results), False
+
+
+class RulePlan(object):
+    """
+    Enabled rules of a table compiled for checking chunks of rows. The rules are grouped by field
+    and the rows are checked a field (column) at a time.
+
+    The checks of each field can be cached by the hash of the states' content (hash_object) and
+    the version of the field's rules, so that unchanged states are not checked again until the
+    rules of the field (or its column) change.
+    """
+
+    def __init__(self, rules):
+        self.fields = OrderedDict()
+        for rule in rules:
+            self.fields.setdefault(rule.field, []).append(CompiledRule(rule))
+
+    def field_version(self, field, mapped, display_name):
+        """
+        Return the version of the checks of a field, i.e. a hash of its rules and column.
+
+        :param field: str, name of the field
+        :param mapped: bool, if the field is one of the organization's columns
+        :param display_name: str, display name of the field
+        :return: str
+        """
+        m = hashlib.md5()
+        m.update(repr((DATA_QUALITY_CHECKS_VERSION, field, mapped, display_name)))
+        for compiled_rule in self.fields[field]:
+            m.update(repr([getattr(compiled_rule.rule, f.attname)
+                           for f in Rule._meta.concrete_fields]))
+        return m.hexdigest()
+
+    @staticmethod
+    def is_hashed(field, table_name):
+        """Return True if the value of the field is part of the hash_object of the states"""
+        if field in get_comparison_fields():
+            return True
+        # Otherwise the field is checked in the extra_data, which is hashed, unless it is another
+        # attribute of the states
+        return not hasattr(apps.get_model('seed', table_name), field)
+
+    def evaluate(self, rows, column_lookup, table_name, cache_key=None):
+        """
+        Check the rows against all the rules.
+
+        :param rows: list, PropertyStates or TaxLotStates
+        :param column_lookup: dict, display names of the columns by (table name, field)
+        :param table_name: one of PropertyState | TaxLotState
+        :param cache_key: str, prefix of the cache keys of the checks, if None then the checks are
+            not cached
+        :return: list with, for each row, the list of (rule, results, violated, halted) in the
+            order of the rules, see CompiledRule.check
+        """
+        checks = [[] for _ in rows]
+        for field, compiled_rules in self.fields.items():
+            mapped = (table_name, field) in column_lookup
+            display_name = column_lookup.get((table_name, field), field)
+
+            field_cache_key = None
+            cached_checks, new_checks = {}, {}
+            if cache_key is not None and self.is_hashed(field, table_name):
+                field_cache_key = '{}__{}__{}'.format(
+                    cache_key, field, self.field_version(field, mapped, display_name)
+                )
+                cached_checks = get_cache_hash_values(
+                    field_cache_key, set(row.hash_object for row in rows if row.hash_object)
+                )
+                rules_by_id = {c.rule.id: c.rule for c in compiled_rules}
+
+            for index, row in enumerate(rows):
+                if row.hash_object in cached_checks:
+                    checks[index].extend(
+                        (rules_by_id[rule_id], results, violated, halted)
+                        for rule_id, results, violated, halted in cached_checks[row.hash_object]
+                    )
+                    continue
+
+                # check if the field exists
+                if hasattr(row, field):
+                    value, from_extra_data = getattr(row, field), False
+                elif field in row.extra_data:
+                    value, from_extra_data = row.extra_data[field], True
+                else:
+                    value, from_extra_data = None, None
+
+                row_checks = []
+                if from_extra_data is not None:
+                    for compiled_rule in compiled_rules:
+                        results, violated, halted = compiled_rule.check(
+                            value, from_extra_data, mapped, display_name
+                        )
+                        row_checks.append((compiled_rule.rule, results, violated, halted))
+                checks[index].extend(row_checks)
+
+                if field_cache_key is not None and row.hash_object:
+                    new_checks[row.hash_object] = [
+                        (row_check[0].id,) + row_check[1:] for row_check in row_checks
+                    ]
+
+            if new_checks:
+                set_cache_hash_values(field_cache_key, new_checks, DATA_QUALITY_CHECKS_TIMEOUT)
+
+        return checks
+
+
 class DataQualityCheck(models.Model):
     """
     Object that stores the high level configuration per organization of the DataQualityCheck
@@ -522,6 +813,12 @@ class DataQualityCheck(models.Model):
         # set in check_data
         self.column_lookup = {}
 
+        # Ids of the property/taxlot linked to each of the checked states and their status labels,
+        # as they were in the database and as they are updated by the checks. Set in check_data.
+        self.linked_ids = {}
+        self.saved_status_labels = {}
+        self.status_labels = {}
+
         super(DataQualityCheck, self).__init__(*args, **kwargs)
 
     @staticmethod
@@ -536,7 +833,10 @@ class DataQualityCheck(models.Model):
         if identifier is None:
             identifier = randint(100, 100000)
         cache_key = DataQualityCheck.cache_key(identifier)
-        set_cache_raw(cache_key, [])
+        delete_cache(cache_key)
+        # Start the list with an empty set of results so that the results exist (and are empty)
+        # until the first chunk is checked
+        append_cache_list(cache_key, [], DATA_QUALITY_RESULTS_TIMEOUT)
         return cache_key
 
     @staticmethod
@@ -559,19 +859,30 @@ class DataQualityCheck(models.Model):
         """
 
         # grab the columns so we can grab the display names
-        columns = Column.retrieve_all(self.organization, record_type, False)
+        catalog = Column.retrieve_catalog(self.organization, record_type, False)
 
         # create lookup tuple for the display name
-        for c in columns:
-            self.column_lookup[(c['table'], c['name'])] = c['displayName']
+        for key, c in catalog.by_table_name.items():
+            self.column_lookup[key] = c['displayName']
 
-        # grab all the rules once, save query time
-        rules = self.rules.filter(enabled=True, table_name=record_type).order_by('field',
-                                                                                 'severity')
+        # grab all the rules once, save query time, and compile them for checking the chunk
+        plan = RulePlan(
+            self.rules.filter(enabled=True, table_name=record_type).order_by('field', 'severity')
+        )
 
         # Get the list of the field names that will show in every result
         fields = self.get_fieldnames(record_type)
-        for row in rows:
+
+        # Fetch the linked properties/taxlots and their labels for all the rows at once
+        rows = list(rows)
+        self.prefetch_status_labels(record_type, rows)
+
+        # Run the checks a column at a time, skipping the states that were already checked
+        # against the same rules
+        checks = plan.evaluate(rows, self.column_lookup, record_type,
+                               cache_key=self.checks_cache_key(record_type))
+
+        for row, row_checks in zip(rows, checks):
             # Initialize the ID if it does not exist yet. Add in the other
             # fields that are of interest to the GUI
             if row.id not in self.results:
@@ -580,14 +891,25 @@ class DataQualityCheck(models.Model):
                     self.results[row.id][field] = getattr(row, field)
                 self.results[row.id]['data_quality_results'] = []
 
-            # Run the checks
-            self._check(rules, row)
+            # Save the results of the checks
+            self._check(row, row_checks)
+
+        self.save_status_labels(record_type)
 
         # Prune the results will remove any entries that have zero data_quality_results
         for k, v in self.results.items():
             if not v['data_quality_results']:
                 del self.results[k]
 
+    def checks_cache_key(self, record_type):
+        """
+        Return the prefix of the cache keys of the checks of the states, see RulePlan.evaluate
+
+        :param record_type: one of PropertyState | TaxLotState
+        :return: str
+        """
+        return 'data_quality_checks__{}__{}'.format(self.pk, record_type)
+
     def get_fieldnames(self, record_type):
         """Get fieldnames to apply to results."""
         field_names = ['id']
@@ -597,101 +919,106 @@ class DataQualityCheck(models.Model):
     def reset_results(self):
         self.results = {}
 
-    def _check(self, rules, row):
+    def prefetch_status_labels(self, record_type, rows):
         """
-        Check for errors in the min/max of the values.
+        Look up the property/taxlot linked to each of the rows and the ids of their status labels.
 
-        :param rules: list, rules to run from database objects
-        :param row: PropertyState or TaxLotState, row of data to check
+        :param record_type: one of PropertyState | TaxLotState
+        :param rows: list, PropertyStates or TaxLotStates
         :return: None
         """
-        # check if the row has any rules applied to it
-        model_labels = {'linked_id': None, 'label_ids': []}
-        if row.__class__.__name__ == 'PropertyState':
-            label = apps.get_model('seed', 'Property_labels')
-            if PropertyView.objects.filter(state=row).exists():
-                model_labels['linked_id'] = PropertyView.objects.get(state=row).property_id
-                model_labels['label_ids'] = list(
-                    label.objects.filter(property_id=model_labels['linked_id']).values_list(
-                        'statuslabel_id', flat=True)
-                )
-                # _log.debug("Property {} has {} labels".format(model_labels['linked_id'],
-                #                                               len(model_labels['label_ids'])))
-        elif row.__class__.__name__ == 'TaxLotState':
-            label = apps.get_model('seed', 'TaxLot_labels')
-            if TaxLotView.objects.filter(state=row).exists():
-                model_labels['linked_id'] = TaxLotView.objects.get(state=row).taxlot_id
-                model_labels['label_ids'] = list(
-                    label.objects.filter(taxlot_id=model_labels['linked_id']).values_list(
-                        'statuslabel_id', flat=True)
-                )
-                # _log.debug("TaxLot {} has {} labels".format(model_labels['linked_id'],
-                #                                             len(model_labels['label_ids'])))
+        if record_type == 'PropertyState':
+            view_class, linked_field = PropertyView, 'property_id'
+        else:
+            view_class, linked_field = TaxLotView, 'taxlot_id'
+        label_class = self._get_label_class(record_type)
 
-        # rename the propertystate_id and taxlot_id to be model_id
-        for rule in rules:
-            # check if the field exists
-            if hasattr(row, rule.field) or rule.field in row.extra_data:
-                value = None
+        self.linked_ids = dict(view_class.objects.filter(
+            state_id__in=[row.id for row in rows]).values_list('state_id', linked_field))
+
+        self.saved_status_labels = defaultdict(set)
+        for linked_id, label_id in label_class.objects.filter(**{
+            '{}__in'.format(linked_field): set(self.linked_ids.values())
+        }).values_list(linked_field, 'statuslabel_id'):
+            self.saved_status_labels[linked_id].add(label_id)
+
+        self.status_labels = defaultdict(set)
+        for linked_id, label_ids in self.saved_status_labels.items():
+            self.status_labels[linked_id] = set(label_ids)
+
+    def save_status_labels(self, record_type):
+        """
+        Save the status labels that were added or removed by the checks with one bulk create and
+        one delete.
+
+        :param record_type: one of PropertyState | TaxLotState
+        :return: None
+        """
+        linked_field = 'property_id' if record_type == 'PropertyState' else 'taxlot_id'
+        label_class = self._get_label_class(record_type)
+
+        new_labels = []
+        removed_labels = []
+        for linked_id, label_ids in self.status_labels.items():
+            saved_label_ids = self.saved_status_labels.get(linked_id, set())
+            for label_id in label_ids - saved_label_ids:
+                new_labels.append(label_class(**{linked_field: linked_id,
+                                                 'statuslabel_id': label_id}))
+            if saved_label_ids - label_ids:
+                removed_labels.append(Q(**{linked_field: linked_id,
+                                           'statuslabel_id__in': saved_label_ids - label_ids}))
+
+        if new_labels:
+            try:
+                with transaction.atomic():
+                    label_class.objects.bulk_create(new_labels)
+            except IntegrityError:
+                # Another check added some of the labels in the meantime
+                for new_label in new_labels:
+                    label_class.objects.get_or_create(**{
+                        linked_field: getattr(new_label, linked_field),
+                        'statuslabel_id': new_label.statuslabel_id
+                    })
+        if removed_labels:
+            label_class.objects.filter(reduce(operator.or_, removed_labels)).delete()
+
+        self.saved_status_labels = defaultdict(set)
+        for linked_id, label_ids in self.status_labels.items():
+            self.saved_status_labels[linked_id] = set(label_ids)
+
+    @staticmethod
+    def _get_label_class(record_type):
+        if record_type == 'PropertyState':
+            return apps.get_model('seed', 'Property_labels')
+        else:
+            return apps.get_model('seed', 'TaxLot_labels')
+
+    def _check(self, row, checks):
+        """
+        Save the results of the checks of a row and update the status labels of the linked
+        property or taxlot.
+
+        :param row: PropertyState or TaxLotState, row of data that was checked
+        :param checks: list, (rule, results, violated, halted) as returned by RulePlan.evaluate
+        :return: None
+        """
+        # check if the row has any rules applied to it (prefetched in check_data)
+        linked_id = self.linked_ids.get(row.id)
+        label_ids = set()
+        if linked_id is not None:
+            label_ids = set(self.status_labels[linked_id])
+
+        for rule, results, violated, halted in checks:
+            for result_type, args in results:
+                getattr(self, 'add_result_' + result_type)(row.id, rule, *args)
+
+            if violated:
+                label_applied = self.update_status_label(rule, linked_id)
+            else:
                 label_applied = False
-                display_name = rule.field
-
-                if hasattr(row, rule.field):
-                    value = getattr(row, rule.field)
-                elif rule.field in row.extra_data:
-                    value = row.extra_data[rule.field]
-                    try:
-                        value = rule.str_to_data_type(value)
-                    except DataQualityTypeCastError:
-                        self.add_result_type_error(row.id, rule, display_name, value)
-                        continue
-
-                if (rule.table_name, rule.field) in self.column_lookup:
-                    display_name = self.column_lookup[(rule.table_name, rule.field)]
-
-                # get the status_labels for the linked properties and tax lots
-                linked_id = model_labels['linked_id']
-
-                if (rule.table_name, rule.field) not in self.column_lookup:
-                    # If the rule is not in the column lookup, then it may have been a required
-                    # field that wasn't mapped
-                    if rule.required:
-                        self.add_result_missing_req(row.id, rule, display_name, value)
-                        label_applied = self.update_status_label(label, rule, linked_id)
-                elif value is None or value == '':
-                    # Empty fields
-                    if rule.required:
-                        self.add_result_missing_and_none(row.id, rule, display_name, value)
-                        label_applied = self.update_status_label(label, rule, linked_id)
-                    elif rule.not_null:
-                        self.add_result_is_null(row.id, rule, display_name, value)
-                        label_applied = self.update_status_label(label, rule, linked_id)
-                elif not rule.valid_text(value):
-                    self.add_result_string_error(row.id, rule, display_name, value)
-                    label_applied = self.update_status_label(label, rule, linked_id)
-                else:
-                    try:
-                        if not rule.minimum_valid(value):
-                            s_min, s_max, s_value = rule.format_strings(value)
-                            self.add_result_min_error(row.id, rule, display_name, s_value, s_min)
-                            label_applied = self.update_status_label(label, rule, linked_id)
-                    except ComparisonError:
-                        s_min, s_max, s_value = rule.format_strings(value)
-                        self.add_result_comparison_error(row.id, rule, display_name, s_value, s_min)
-                        continue
-
-                    try:
-                        if not rule.maximum_valid(value):
-                            s_min, s_max, s_value = rule.format_strings(value)
-                            self.add_result_max_error(row.id, rule, display_name, s_value, s_max)
-                            label_applied = self.update_status_label(label, rule, linked_id)
-                    except ComparisonError:
-                        s_min, s_max, s_value = rule.format_strings(value)
-                        self.add_result_comparison_error(row.id, rule, display_name, s_value, s_max)
-                        continue
-
-                if not label_applied and rule.status_label_id in model_labels['label_ids']:
-                    self.remove_status_label(label, rule, linked_id)
+
+            if not halted and not label_applied and rule.status_label_id in label_ids:
+                self.remove_status_label(rule, linked_id)
 
     def save_to_cache(self, identifier):
         """
@@ -700,22 +1027,59 @@ class DataQualityCheck(models.Model):
         a dict of dict. This is important to remember because the data from the
         cache cannot be simply loaded into the above structure.
 
+        Each call appends its results, sorted by id, to the cache. The chunks of a data quality
+        check can therefore save their results concurrently; retrieve_results merges them.
+
         :param identifier: Import file primary key
         :return: None
         """
 
         # change the format of the data in the cache. Make this a list of
         # objects instead of object of objects.
-        existing_results = get_cache_raw(DataQualityCheck.cache_key(identifier)) or []
+        results = sorted(self.results.values(), key=lambda k: k['id'])
+        append_cache_list(DataQualityCheck.cache_key(identifier), results,
+                          DATA_QUALITY_RESULTS_TIMEOUT)
 
-        results = []
-        for key, value in self.results.items():
-            results.append(value)
+    @staticmethod
+    def retrieve_results(identifier):
+        """
+        Return the results saved in the cache for the identifier, sorted by id. The results of
+        each chunk are already sorted, so they are merged lazily.
+
+        :param identifier: Import file primary key
+        :return: iterator of dicts, or None if there are no results for the identifier
+        """
+        chunks = get_cache_list(DataQualityCheck.cache_key(identifier))
+        if chunks is None:
+            return None
+
+        def _decorate(chunk_index, chunk):
+            # ties on the id keep the order in which the results were saved
+            for result_index, result in enumerate(chunk):
+                yield result['id'], chunk_index, result_index, result
+
+        decorated_chunks = [_decorate(index, chunk) for index, chunk in enumerate(chunks)]
+        return (decorated[-1] for decorated in heapq.merge(*decorated_chunks))
 
-        existing_results += results
+    @staticmethod
+    def retrieve_results_page(identifier, page, per_page):
+        """
+        Return a page of the results saved in the cache for the identifier, sorted by id. Only the
+        results of the page are kept once they are merged.
 
-        z = sorted(existing_results, key=lambda k: k['id'])
-        set_cache_raw(DataQualityCheck.cache_key(identifier), z, 86400)  # 24 hours
+        :param identifier: Import file primary key
+        :param page: int, page number, starting at 1
+        :param per_page: int, number of results per page
+        :return: tuple, list of dicts (or None if there are no results for the identifier) and
+                 True if there are more results after the page
+        """
+        results = DataQualityCheck.retrieve_results(identifier)
+        if results is None:
+            return None, False
+        start = (page - 1) * per_page
+        # one more result tells if there is a next page
+        results = list(islice(results, start, start + per_page + 1))
+        return results[:per_page], len(results) > per_page
 
     def initialize_rules(self):
         """
@@ -869,40 +1233,31 @@ class DataQualityCheck(models.Model):
             'severity': rule.get_severity_display(),
         })
 
-    def update_status_label(self, label_class, rule, linked_id):
+    def update_status_label(self, rule, linked_id):
         """
+        Add the rule's label to the property or taxlot. The labels are saved at the end of
+        check_data.
 
-        :param label_class: statuslabel object, either property label or taxlot label
         :param rule: rule object
-        :param linked_id: id of propertystate or taxlotstate object
+        :param linked_id: id of property or taxlot object
         :return: boolean, if labeled was applied
         """
 
         if rule.status_label_id is not None and linked_id is not None:
-            if rule.table_name == 'PropertyState':
-                label_class.objects.get_or_create(property_id=linked_id,
-                                                  statuslabel_id=rule.status_label_id)
-            else:
-                label_class.objects.get_or_create(taxlot_id=linked_id,
-                                                  statuslabel_id=rule.status_label_id)
+            self.status_labels[linked_id].add(rule.status_label_id)
             return True
 
-    def remove_status_label(self, label_class, rule, linked_id):
+    def remove_status_label(self, rule, linked_id):
         """
-        Remove label because it did not match any of the range exceptions
+        Remove label because it did not match any of the range exceptions. The labels are saved at
+        the end of check_data.
 
-        :param label_class: statuslabel object, either property label or taxlot label
         :param rule: rule object
-        :param linked_id: id of propertystate or taxlotstate object
-        :return: boolean, if labeled was applied
+        :param linked_id: id of property or taxlot object
+        :return: None
         """
 
-        if rule.table_name == 'PropertyState':
-            label_class.objects.filter(property_id=linked_id,
-                                       statuslabel_id=rule.status_label_id).delete()
-        else:
-            label_class.objects.filter(taxlot_id=linked_id,
-                                       statuslabel_id=rule.status_label_id).delete()
+        self.status_labels[linked_id].discard(rule.status_label_id)
 
     def retrieve_result_by_address(self, address):
         """
@@ -0,0 +1,308 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+import hashlib
+import logging
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.db import DatabaseError, IntegrityError, connection, models, transaction
+from django.db.models import F
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from seed.lib.superperms.orgs.models import Organization
+from seed.utils.cache import increment_cache_hash, pop_cache_hash
+
+_log = logging.getLogger(__name__)
+
+# Inventory tables whose extra_data can be indexed, with the column of their organization
+INDEXED_TABLES = {
+    'BuildingSnapshot': 'super_organization_id',
+    'PropertyState': 'organization_id',
+    'TaxLotState': 'organization_id',
+}
+
+# Cache key of the usage counts that are not saved yet
+USAGE_CACHE_KEY = 'extra_data_key_usage'
+
+
+class ExtraDataKeyUsage(models.Model):
+    """
+    Number of times an organization filtered or sorted an inventory table by a key of the
+    extra_data. The most used keys are indexed, see ExtraDataIndex. The searches count the uses in
+    the cache, and the counts are saved by save_recorded when the indexes are updated.
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE,
+                                     related_name='extra_data_key_usages')
+    table_name = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    filter_count = models.IntegerField(default=0)
+    sort_count = models.IntegerField(default=0)
+    last_used = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('organization', 'table_name', 'key')
+
+    def __unicode__(self):
+        return u'{}: {} (filtered {}, sorted {})'.format(
+            self.table_name, self.key, self.filter_count, self.sort_count
+        )
+
+    @classmethod
+    def record(cls, organization_id, table_name, filter_keys=None, sort_keys=None):
+        """
+        Count the use of the keys by the organization in the cache, so that searches do not write
+        to the database.
+
+        :param organization_id: int, id of the organization that was searched
+        :param table_name: str, one of INDEXED_TABLES
+        :param filter_keys: list, extra_data keys that were filtered on
+        :param sort_keys: list, extra_data keys that were sorted on
+        :return: None
+        """
+        if organization_id is None or table_name not in INDEXED_TABLES:
+            return
+
+        max_length = cls._meta.get_field('key').max_length
+        increments = Counter()
+        for count_field, keys in [('filter_count', filter_keys), ('sort_count', sort_keys)]:
+            for key in keys or []:
+                if len(key) <= max_length:
+                    # the key is last since it can contain the separator
+                    increments[u'{}|{}|{}|{}'.format(
+                        organization_id, table_name, count_field, key)] += 1
+        if increments:
+            increment_cache_hash(USAGE_CACHE_KEY, increments)
+
+    @classmethod
+    def save_recorded(cls):
+        """
+        Add the counts recorded in the cache to the saved usages.
+
+        :return: int, number of usages updated or created
+        """
+        counts = defaultdict(Counter)
+        for field, value in pop_cache_hash(USAGE_CACHE_KEY).items():
+            organization_id, table_name, count_field, key = field.split('|', 3)
+            counts[(int(organization_id), table_name, key)][count_field] += int(value)
+
+        # the organizations could have been deleted since
+        organization_ids = set(Organization.objects.filter(
+            pk__in={organization_id for organization_id, _, _ in counts}
+        ).values_list('pk', flat=True))
+
+        saved = 0
+        now = timezone.now()
+        for (organization_id, table_name, key), count in counts.items():
+            if organization_id not in organization_ids:
+                continue
+            usages = cls.objects.filter(organization_id=organization_id, table_name=table_name,
+                                        key=key)
+            updates = {
+                'filter_count': F('filter_count') + count['filter_count'],
+                'sort_count': F('sort_count') + count['sort_count'],
+                'last_used': now,
+            }
+            if not usages.update(**updates):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(organization_id=organization_id,
+                                           table_name=table_name, key=key,
+                                           filter_count=count['filter_count'],
+                                           sort_count=count['sort_count'], last_used=now)
+                except IntegrityError:
+                    # Created by another process in the meantime
+                    usages.update(**updates)
+            saved += 1
+        return saved
+
+
+class ExtraDataIndex(models.Model):
+    """
+    Partial expression index on a key of the extra_data of an organization's inventory table. The
+    indexes are created and dropped by the manage_extra_data_indexes command for the most used
+    keys. The expressions are the ones of the queries built by the JSON field lookups.
+    """
+    BTREE = 'btree'
+    TRIGRAM = 'trigram'
+    SORT = 'sort'
+
+    INDEX_TYPES = (
+        (BTREE, 'Exact, range and empty filters'),
+        (TRIGRAM, 'Contains filters'),
+        (SORT, 'Sorting'),
+    )
+
+    # index method and expression of each index type, the key is a parameter
+    INDEX_EXPRESSIONS = {
+        BTREE: ('btree', '(extra_data -> %s)'),
+        TRIGRAM: ('gin', '(UPPER((extra_data ->> %s)::text)) gin_trgm_ops'),
+        SORT: ('btree', '(extra_data ->> %s)'),
+    }
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE,
+                                     related_name='extra_data_indexes')
+    table_name = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    index_type = models.CharField(max_length=20, choices=INDEX_TYPES)
+    name = models.CharField(max_length=63, unique=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('organization', 'table_name', 'key', 'index_type')
+
+    def __unicode__(self):
+        return u'{} ({}: {} {})'.format(self.name, self.table_name, self.key, self.index_type)
+
+    @staticmethod
+    def get_name(organization_id, table_name, key, index_type):
+        """Return a unique index name that fits in the 63 characters of PostgreSQL"""
+        digest = hashlib.md5(
+            u'{}|{}|{}'.format(organization_id, table_name, key).encode('utf-8')
+        ).hexdigest()[:16]
+        return 'seed_extra_data_{}_{}'.format(index_type, digest)
+
+    def _get_table(self):
+        return apps.get_model('seed', self.table_name)._meta.db_table
+
+    def _is_valid(self, cursor):
+        """Return if the index in the database is valid, or None if there is no index"""
+        cursor.execute(
+            'SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid)', [self.name]
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _drop(self, cursor):
+        """Drop the index from the database"""
+        # Indexes can only be dropped without locking the table outside of a transaction
+        concurrently = '' if connection.in_atomic_block else 'CONCURRENTLY '
+        cursor.execute('DROP INDEX {}IF EXISTS {}'.format(
+            concurrently, connection.ops.quote_name(self.name)
+        ))
+
+    def create_index(self):
+        """
+        Create the index in the database and save it. A failed concurrent build leaves an invalid
+        index that is not used by the queries, so the invalid indexes are dropped and the index
+        is only saved once it is valid.
+        """
+        method, expression = self.INDEX_EXPRESSIONS[self.index_type]
+        quote_name = connection.ops.quote_name
+        # Indexes can only be created without locking the table outside of a transaction
+        concurrently = '' if connection.in_atomic_block else 'CONCURRENTLY '
+        sql = 'CREATE INDEX {}IF NOT EXISTS {} ON {} USING {} ({}) WHERE {} = %s'.format(
+            concurrently, quote_name(self.name), quote_name(self._get_table()), method,
+            expression, quote_name(INDEXED_TABLES[self.table_name])
+        )
+        with connection.cursor() as cursor:
+            if self._is_valid(cursor) is False:
+                # left by a failed build, IF NOT EXISTS would keep it
+                self._drop(cursor)
+            try:
+                cursor.execute(sql, [self.key, self.organization_id])
+            except DatabaseError:
+                if concurrently:
+                    self._drop(cursor)
+                raise
+            if not self._is_valid(cursor):
+                self._drop(cursor)
+                raise DatabaseError('The index {} is not valid'.format(self.name))
+        self.save()
+
+    def drop_index(self):
+        """Drop the index from the database and delete it"""
+        with connection.cursor() as cursor:
+            self._drop(cursor)
+        self.delete()
+
+    @staticmethod
+    def trigram_available():
+        """Return True if the pg_trgm extension is (or could be) installed"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            if cursor.fetchone():
+                return True
+            try:
+                with transaction.atomic():
+                    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                return True
+            except DatabaseError as e:
+                _log.warning('Could not install pg_trgm, contains filters are not indexed: {}'
+                             .format(e))
+                return False
+
+    @classmethod
+    def get_wanted_indexes(cls, max_keys, min_uses, trigram=True):
+        """
+        Return the indexes of the most filtered and sorted keys of each organization's tables.
+
+        :param max_keys: int, maximum number of keys to index per organization, table and use
+        :param min_uses: int, minimum number of uses of a key to index it
+        :param trigram: bool, if the contains filters can be indexed
+        :return: set, (organization id, table name, key, index type)
+        """
+        wanted = set()
+        usages = ExtraDataKeyUsage.objects.filter(table_name__in=INDEXED_TABLES.keys())
+        for count_field, index_types in [
+            ('filter_count', [cls.BTREE, cls.TRIGRAM] if trigram else [cls.BTREE]),
+            ('sort_count', [cls.SORT]),
+        ]:
+            ranked = defaultdict(list)
+            for usage in usages.filter(**{'{}__gte'.format(count_field): min_uses}).order_by(
+                    '-{}'.format(count_field), 'key'):
+                keys = ranked[(usage.organization_id, usage.table_name)]
+                if len(keys) < max_keys:
+                    keys.append(usage.key)
+            for (organization_id, table_name), keys in ranked.items():
+                for key in keys:
+                    for index_type in index_types:
+                        wanted.add((organization_id, table_name, key, index_type))
+        return wanted
+
+    @classmethod
+    def update_indexes(cls, max_keys=5, min_uses=10, dry_run=False):
+        """
+        Save the usage counts recorded since the last update, then create the indexes of the most
+        used keys and drop the indexes of the keys that are not used as much anymore.
+
+        :param max_keys: int, maximum number of keys to index per organization, table and use
+        :param min_uses: int, minimum number of uses of a key to index it
+        :param dry_run: bool, if True then only return the changes to the indexes
+        :return: tuple, (list of created ExtraDataIndex, list of dropped ExtraDataIndex)
+        """
+        ExtraDataKeyUsage.save_recorded()
+        wanted = cls.get_wanted_indexes(max_keys, min_uses, trigram=cls.trigram_available())
+        existing = {
+            (index.organization_id, index.table_name, index.key, index.index_type): index
+            for index in cls.objects.all()
+        }
+
+        dropped = [index for spec, index in existing.items() if spec not in wanted]
+        created = [
+            cls(organization_id=organization_id, table_name=table_name, key=key,
+                index_type=index_type,
+                name=cls.get_name(organization_id, table_name, key, index_type))
+            for organization_id, table_name, key, index_type in sorted(wanted)
+            if (organization_id, table_name, key, index_type) not in existing
+        ]
+
+        if not dry_run:
+            for index in dropped:
+                index.drop_index()
+            for index in created:
+                index.create_index()
+        return created, dropped
+
+
+@receiver(pre_delete, sender=ExtraDataIndex)
+def drop_deleted_extra_data_index(sender, instance, **kwargs):
+    """Drop the index from the database when it is deleted in bulk or with its organization"""
+    with connection.cursor() as cursor:
+        instance._drop(cursor)
@@ -16,7 +16,7 @@ from django.apps import apps
 from django.contrib.postgres.fields import JSONField
 from django.db import IntegrityError
 from django.db import models
-from django.db.models.signals import pre_delete, post_save
+from django.db.models.signals import post_delete, pre_delete, post_save
 from django.dispatch import receiver
 from django.forms.models import model_to_dict
 from quantityfield.fields import QuantityField
@@ -37,6 +37,7 @@ from seed.models import (
 )
 from seed.utils.address import normalize_address_str
 from seed.utils.generic import split_model_fields, obj_to_dict
+from seed.utils.hashing import hash_state_object
 from seed.utils.time import convert_datestr
 from seed.utils.time import convert_to_js_timestamp
 
@@ -205,6 +206,10 @@ class PropertyState(models.Model):
     source_eui_modeled = QuantityField('kBtu/ft**2/year', null=True, blank=True)
 
     extra_data = JSONField(default=dict, blank=True)
+
+    # Hash of the comparison fields and extra data, used to find exact duplicates of a state
+    hash_object = models.CharField(max_length=32, null=True, blank=True, default=None,
+                                   db_index=True, editable=False)
     measures = models.ManyToManyField('Measure', through='PropertyMeasure')
 
     class Meta:
@@ -326,14 +331,27 @@ class PropertyState(models.Model):
 
         return d
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(PropertyState, cls).from_db(db, field_names, values)
+        # remember the loaded address to only normalize it again when it changes
+        if 'address_line_1' in field_names and 'normalized_address' in field_names:
+            instance._loaded_address_line_1 = instance.address_line_1
+        return instance
+
     def save(self, *args, **kwargs):
         # Calculate and save the normalized address
-        if self.address_line_1 is not None:
-            self.normalized_address = normalize_address_str(self.address_line_1)
-        else:
+        if self.address_line_1 is None:
             self.normalized_address = None
+        elif (self.normalized_address is None or
+              self.address_line_1 != getattr(self, '_loaded_address_line_1', None)):
+            self.normalized_address = normalize_address_str(self.address_line_1)
 
-        return super(PropertyState, self).save(*args, **kwargs)
+        self.hash_object = hash_state_object(self)
+
+        result = super(PropertyState, self).save(*args, **kwargs)
+        self._loaded_address_line_1 = self.address_line_1
+        return result
 
     def history(self):
         """
@@ -730,6 +748,27 @@ def post_save_property_view(sender, **kwargs):
         kwargs['instance'].property.save()
 
 
+@receiver(post_save, sender=PropertyView)
+@receiver(post_delete, sender=PropertyView)
+def invalidate_property_view_reports(sender, instance, **kwargs):
+    """The property reports of the cycle are computed again when its views change"""
+    from seed.utils.reports import invalidate_cycle_reports
+    invalidate_cycle_reports(instance.cycle_id)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_save, sender=PropertyState)
+@receiver(post_delete, sender=PropertyState)
+def invalidate_property_reports(sender, instance, created=False, **kwargs):
+    """
+    The property reports of the organization are computed again when a property or a state
+    changes, new ones are not in any view yet.
+    """
+    if not created:
+        from seed.utils.reports import invalidate_organization_reports
+        invalidate_organization_reports(instance.organization_id)
+
+
 class PropertyAuditLog(models.Model):
     organization = models.ForeignKey(Organization)
     parent1 = models.ForeignKey('PropertyAuditLog', blank=True, null=True,
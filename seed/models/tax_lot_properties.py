@@ -11,6 +11,7 @@ from collections import defaultdict
 
 from django.apps import apps
 from django.db import models
+from django.db.models import Count
 from django.forms.models import model_to_dict
 from django.utils.timezone import make_naive
 
@@ -68,6 +69,8 @@ class TaxLotProperty(models.Model):
                 'obj_state_id': 'property_state_id',
                 'obj_view_id': 'property_view_id',
                 'obj_id': 'property_id',
+                'obj_parent': 'property',
+                'obj_labels': 'property_labels',
                 'related_class': 'TaxLotView',
                 'select_related': 'taxlot',
                 'related_view': 'taxlot_view',
@@ -82,6 +85,8 @@ class TaxLotProperty(models.Model):
                 'obj_state_id': 'taxlot_state_id',
                 'obj_view_id': 'taxlot_view_id',
                 'obj_id': 'taxlot_id',
+                'obj_parent': 'taxlot',
+                'obj_labels': 'taxlot_labels',
                 'related_class': 'PropertyView',
                 'select_related': 'property',
                 'related_view': 'property_view',
@@ -92,23 +97,35 @@ class TaxLotProperty(models.Model):
 
         # Ids of propertyviews to look up in m2m
         ids = [obj.pk for obj in object_list]
-        joins = TaxLotProperty.objects.filter(**{lookups['obj_query_in']: ids}).select_related(
-            lookups['related_view'])
+        joins = TaxLotProperty.objects.filter(**{lookups['obj_query_in']: ids})
 
         # Get all ids of tax lots on these joins
         related_ids = [getattr(j, lookups['related_view_id']) for j in joins]
 
+        # Count the notes of the objects and of the related views with one query each
+        notes_counts = cls._count_notes(lookups['obj_view_id'], ids)
+        related_notes_counts = cls._count_notes(lookups['related_view_id'], related_ids)
+
+        # Get the sorted label names of all the objects' parents with a single query
+        parent_class = apps.get_model('seed', lookups['obj_parent'])
+        label_names = defaultdict(list)
+        for parent_id, label_name in parent_class.labels.through.objects.filter(**{
+            '{}__in'.format(lookups['obj_id']): [getattr(obj, lookups['obj_id']) for obj in object_list]
+        }).order_by('statuslabel__name').values_list(lookups['obj_id'], 'statuslabel__name'):
+            label_names[parent_id].append(label_name)
+
         # Get all tax lot views that are related
         related_views = apps.get_model('seed', lookups['related_class']).objects.select_related(
             lookups['select_related'], 'state', 'cycle').filter(pk__in=related_ids)
 
         # Map the related view id to the other view's state data
         # so we can reference these easily and save some queries.
-        db_columns = apps.get_model('seed', 'Column').retrieve_db_fields()
+        db_columns = set(apps.get_model('seed', 'Column').retrieve_db_fields())
 
         related_map = {}
         for related_view in related_views:
-            related_dict = model_to_dict(related_view.state, exclude=['extra_data'])
+            # Measures are not returned, so do not query them for every state
+            related_dict = model_to_dict(related_view.state, exclude=['extra_data', 'measures'])
             related_dict[lookups['related_state_id']] = related_view.state.id
 
             # custom handling for when it is TaxLotView
@@ -144,11 +161,13 @@ class TaxLotProperty(models.Model):
             # Replace taxlot_view id with taxlot id
             related_map[related_view.pk]['id'] = getattr(related_view, lookups['select_related']).id
 
-        # Not sure what this code is really doing, but it only exists for TaxLotViews
+        # For TaxLotViews, list the jurisdiction tax lot ids of all the tax lots of each of the
+        # related properties
         if lookups['obj_class'] == 'TaxLotView':
-            # Get whole taxlotstate table:
+            # Only the related properties of these tax lots are needed
             tuple_prop_to_jurisdiction_tl = tuple(
-                TaxLotProperty.objects.values_list('property_view_id', 'taxlot_view__state__jurisdiction_tax_lot_id')
+                TaxLotProperty.objects.filter(property_view_id__in=related_ids).values_list(
+                    'property_view_id', 'taxlot_view__state__jurisdiction_tax_lot_id')
             )
 
             # create a mapping that defaults to an empty list
@@ -186,7 +205,8 @@ class TaxLotProperty(models.Model):
                     lookups['related_view_id']: getattr(join, lookups['related_view_id'])
                 })
 
-            join_dict['notes_count'] = getattr(join, lookups['related_view']).notes.count()
+            join_dict['notes_count'] = related_notes_counts.get(
+                getattr(join, lookups['related_view_id']), 0)
 
             # fix specific time stamps - total hack right now. Need to reconcile with
             # /data_importer/views.py and /seed/views/properties.py
@@ -205,10 +225,6 @@ class TaxLotProperty(models.Model):
             if join_dict.get('analysis_end_time'):
                 join_dict['analysis_end_time'] = make_naive(join_dict['analysis_end_time']).isoformat()
 
-            # remove the measures from this view for now
-            if join_dict.get('measures'):
-                del join_dict['measures']
-
             try:
                 join_map[getattr(join, lookups['obj_view_id'])].append(join_dict)
             except KeyError:
@@ -216,7 +232,7 @@ class TaxLotProperty(models.Model):
 
         for obj in object_list:
             # Each object in the response is built from the state data, with related data added on.
-            obj_dict = model_to_dict(obj.state, exclude=['extra_data'])
+            obj_dict = model_to_dict(obj.state, exclude=['extra_data', 'measures'])
 
             for extra_data_field, extra_data_value in obj.state.extra_data.items():
                 if extra_data_field in ['id', 'notes_count']:
@@ -229,7 +245,7 @@ class TaxLotProperty(models.Model):
 
             # Use property_id instead of default (state_id)
             obj_dict['id'] = getattr(obj, lookups['obj_id'])
-            obj_dict['notes_count'] = obj.notes.count()
+            obj_dict['notes_count'] = notes_counts.get(obj.pk, 0)
 
             obj_dict[lookups['obj_state_id']] = obj.state.id
             obj_dict[lookups['obj_view_id']] = obj.id
@@ -266,21 +282,27 @@ class TaxLotProperty(models.Model):
             if obj_dict.get('analysis_end_time'):
                 obj_dict['analysis_end_time'] = make_naive(obj_dict['analysis_end_time']).isoformat()
 
-            # remove the measures from this view for now
-            if obj_dict.get('measures'):
-                del obj_dict['measures']
-
-            label_string = []
-            if hasattr(obj, 'property'):
-                for label in obj.property.labels.all().order_by('name'):
-                    label_string.append(label.name)
-                obj_dict['property_labels'] = ','.join(label_string)
-
-            elif hasattr(obj, 'taxlot'):
-                for label in obj.taxlot.labels.all().order_by('name'):
-                    label_string.append(label.name)
-                obj_dict['taxlot_labels'] = ','.join(label_string)
+            obj_dict[lookups['obj_labels']] = ','.join(
+                label_names[getattr(obj, lookups['obj_id'])])
 
             results.append(obj_dict)
 
         return results
+
+    @staticmethod
+    def _count_notes(view_id_field, view_ids):
+        """
+        Return the number of notes of each of the views.
+
+        :param view_id_field: str, 'property_view_id' or 'taxlot_view_id'
+        :param view_ids: list, ids of the views
+        :return: dict, {view_id: count}, views without notes are not included
+        """
+        if not view_ids:
+            return {}
+
+        return dict(
+            apps.get_model('seed', 'Note').objects.filter(
+                **{'{}__in'.format(view_id_field): view_ids}
+            ).order_by().values_list(view_id_field).annotate(Count('id'))
+        )
@@ -31,6 +31,7 @@ from seed.models import (
 )
 from seed.utils.address import normalize_address_str
 from seed.utils.generic import split_model_fields, obj_to_dict
+from seed.utils.hashing import hash_state_object
 from seed.utils.time import convert_to_js_timestamp
 
 _log = logging.getLogger(__name__)
@@ -81,6 +82,10 @@ class TaxLotState(models.Model):
 
     extra_data = JSONField(default=dict, blank=True)
 
+    # Hash of the comparison fields and extra data, used to find exact duplicates of a state
+    hash_object = models.CharField(max_length=32, null=True, blank=True, default=None,
+                                   db_index=True, editable=False)
+
     class Meta:
         index_together = [
             ['import_file', 'data_state'],
@@ -178,14 +183,27 @@ class TaxLotState(models.Model):
 
         return d
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(TaxLotState, cls).from_db(db, field_names, values)
+        # remember the loaded address to only normalize it again when it changes
+        if 'address_line_1' in field_names and 'normalized_address' in field_names:
+            instance._loaded_address_line_1 = instance.address_line_1
+        return instance
+
     def save(self, *args, **kwargs):
         # Calculate and save the normalized address
-        if self.address_line_1 is not None:
-            self.normalized_address = normalize_address_str(self.address_line_1)
-        else:
+        if self.address_line_1 is None:
             self.normalized_address = None
+        elif (self.normalized_address is None or
+              self.address_line_1 != getattr(self, '_loaded_address_line_1', None)):
+            self.normalized_address = normalize_address_str(self.address_line_1)
 
-        return super(TaxLotState, self).save(*args, **kwargs)
+        self.hash_object = hash_state_object(self)
+
+        result = super(TaxLotState, self).save(*args, **kwargs)
+        self._loaded_address_line_1 = self.address_line_1
+        return result
 
     def history(self):
         """
@@ -23,7 +23,7 @@ from rest_framework import status
 from rest_framework.renderers import JSONRenderer
 
 from seed.lib.superperms.orgs.models import Organization
-from seed.serializers.pint import apply_display_unit_preferences
+from seed.serializers.pint import DisplayUnitConverter
 
 
 class SEEDJSONRenderer(JSONRenderer):
@@ -79,10 +79,9 @@ class SEEDJSONRenderer(JSONRenderer):
             # a situation where we'd want to vary units running down a column of
             # data per-org.
             org_id = data["properties"][0]["state"]["organization_id"]
-            org = Organization.objects.get(pk=org_id)
+            converter = DisplayUnitConverter(Organization.objects.get(pk=org_id))
             for i in range(len(data["properties"])):
-                data["properties"][i]["state"] = \
-                    apply_display_unit_preferences(org, data["properties"][i]["state"])
+                data["properties"][i]["state"] = converter.apply(data["properties"][i]["state"])
 
         return super(SEEDJSONRenderer, self).render(
             data,
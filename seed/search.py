@@ -27,6 +27,7 @@ from .models import (
     TaxLotState,
     TaxLotView,
     Column,
+    ExtraDataKeyUsage,
 )
 from .utils import search as search_utils
 from .utils.mapping import get_mappable_types
@@ -219,7 +220,7 @@ def is_not_whitelist_building(parent_org, building, whitelist_orgs):
     return parent_org and building.super_organization not in whitelist_orgs
 
 
-def filter_other_params(queryset, other_params, db_columns):
+def filter_other_params(queryset, other_params, db_columns, organization_id=None):
     """applies a dictionary filter to the query set. Does some domain specific parsing, mostly to remove extra
     query params and deal with ranges. Ranges should be passed in as '<field name>__lte' or '<field name>__gte'
     e.g. other_params = {'gross_floor_area__lte': 50000}
@@ -227,6 +228,7 @@ def filter_other_params(queryset, other_params, db_columns):
     :param Django Queryset queryset: queryset to be filtered
     :param dict other_params: dictionary to be parsed and applied to filter.
     :param dict db_columns: list of column names, extra_data blob outside these
+    :param int organization_id: id of the organization being searched, to record the extra_data keys it filters on
     :returns: Django Queryset:
     """
 
@@ -296,8 +298,10 @@ def filter_other_params(queryset, other_params, db_columns):
         queryset = queryset.none()
 
     # handle extra_data with json_query
+    extra_data_keys = []
     for k, v in other_params.iteritems():
         if (not search_utils.is_column(k, db_columns)) and k != 'q' and v:
+            extra_data_keys.append(re.sub(r'__(gt|gte|lt|lte)$', '', k))
 
             exact_match = search_utils.is_exact_match(v)
             empty_match = search_utils.is_empty_match(v)
@@ -310,44 +314,62 @@ def filter_other_params(queryset, other_params, db_columns):
                 # Filter for records that DO NOT contain this field OR
                 # contain a blank value for this field.
                 queryset = queryset.filter(
-                    Q(**{'extra_data__at_%s__isnull' % k: True}) |
-                    Q(**{'extra_data__at_%s' % k: ''})
+                    Q(**{'extra_data__%s__isnull' % k: True}) |
+                    Q(**{'extra_data__%s' % k: ''})
                 )
             elif not_empty_match:
                 # Only return records that have the key in extra_data, but the
                 # value is not empty.
                 queryset = queryset.filter(
-                    Q(**{'extra_data__at_%s__isnull' % k: False}) & ~Q(**{'extra_data__at_%s' % k: ''})
+                    Q(**{'extra_data__%s__isnull' % k: False}) & ~Q(**{'extra_data__%s' % k: ''})
                 )
             elif exclude_filter:
                 # Exclude this value
                 queryset = queryset.filter(
-                    ~Q(**{'extra_data__at_%s__icontains' % k: exclude_filter.group(1)})
+                    ~Q(**{'extra_data__%s__icontains' % k: exclude_filter.group(1)})
                 )
             elif exact_exclude_filter:
                 # Exclude this exact value
                 queryset = queryset.filter(
-                    ~Q(**{'extra_data__at_%s__exact' % k: exact_exclude_filter.group(2)})
+                    ~Q(**{'extra_data__%s__exact' % k: exact_exclude_filter.group(2)})
                 )
             elif exact_match:
                 queryset = queryset.filter(
-                    Q(**{'extra_data__at_%s__exact' % k: exact_match.group(2)})
+                    Q(**{'extra_data__%s__exact' % k: exact_match.group(2)})
                 )
             elif case_insensitive_match:
                 queryset = queryset.filter(
-                    Q(**{'extra_data__at_%s__iexact' % k: case_insensitive_match.group(2)})
+                    Q(**{'extra_data__%s__iexact' % k: case_insensitive_match.group(2)})
                 )
             elif k.endswith(('__gt', '__gte', '__lt', '__lte')):
                 queryset = queryset.filter(
-                    Q(**{'extra_data__at_%s' % k: v})
+                    Q(**{'extra_data__%s' % k: v})
                 )
             else:
                 queryset = queryset.filter(
-                    Q(**{'extra_data__at_%s__icontains' % k: v})
+                    Q(**{'extra_data__%s__icontains' % k: v})
                 )
+
+    if organization_id is not None and extra_data_keys:
+        ExtraDataKeyUsage.record(organization_id, queryset.model.__name__, filter_keys=extra_data_keys)
     return queryset
 
 
+def get_searched_organization_id(params, orgs):
+    """
+    Return the id of the organization in the search params if it is one of the orgs, else None
+
+    :param params: dict, search params
+    :param orgs: queryset, Organizations of the user
+    :returns: int or None
+    """
+    try:
+        organization_id = int(params.get('organization_id'))
+    except (TypeError, ValueError):
+        return None
+    return organization_id if orgs.filter(pk=organization_id).exists() else None
+
+
 def parse_body(request):
     """parses the request body for search params, q, etc
 
@@ -694,12 +716,16 @@ def orchestrate_search_filter_sort(params, user, skip_sort=False):
     buildings_queryset = search_buildings(
         params['q'], queryset=building_snapshots
     )
+    # the extra_data keys are only counted for the organization being searched
+    organization_id = get_searched_organization_id(params, orgs)
     buildings_queryset = filter_other_params(
-        buildings_queryset, other_search_params, db_columns
+        buildings_queryset, other_search_params, db_columns, organization_id=organization_id
     )
 
     # sorting
     if extra_data_sort and not skip_sort:
+        ExtraDataKeyUsage.record(organization_id, 'BuildingSnapshot',
+                                 sort_keys=[params['order_by']])
         ed_mapping = ColumnMapping.objects.filter(
             super_organization__in=orgs,
             column_mapped__column_name=params['order_by'],
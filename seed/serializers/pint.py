@@ -29,31 +29,93 @@ def get_dimensionality(quantity_object):
     return str(quantity_object.dimensionality)
 
 
+# Conversion factors by (units of a quantity, display units) and dimensionality by units of a
+# quantity. There are only a few of each, so they are computed once per process.
+_CONVERSION_FACTORS = {}
+_DIMENSIONALITIES = {}
+
+
+class DisplayUnitConverter(object):
+    """
+    Collapse Quantity objects down to straight floats in the display units of an organization.
+    Use one converter for a page of results so that the preferences are only read once.
+
+    Pint multiplies the magnitude by the factor between the units when converting multiplicative
+    units, so the factors are computed once per units and the values are converted with one
+    multiplication. The results are the same as with ``Quantity.to``.
+    """
+
+    def __init__(self, org):
+        # make extensible / field name agnostic by just branching on the dimensionality
+        # and not the field name (eg. 'gross_floor_area') ... the dimensionality gets
+        # enforced separately by the django pint column type
+        self.pint_specs = {
+            EUI_DIMENSIONALITY: org.display_units_eui or EUI_DEFAULT_UNITS,
+            AREA_DIMENSIONALITY: org.display_units_area or AREA_DEFAULT_UNITS
+        }
+        self.significant_figures = org.display_significant_figures
+
+    @staticmethod
+    def get_factor(units, pint_spec):
+        """
+        Return the factor to convert a magnitude from units to the pint_spec.
+
+        :param units: UnitsContainer, units of a quantity
+        :param pint_spec: str, display units
+        :return: float
+        """
+        key = (units, pint_spec)
+        factor = _CONVERSION_FACTORS.get(key)
+        if factor is None:
+            factor = _CONVERSION_FACTORS[key] = ureg.Quantity(1.0, units).to(pint_spec).magnitude
+        return factor
+
+    def get_field_factor(self, base_units):
+        """Return the factor to convert the values stored in base_units to the display units"""
+        quantity = ureg.Quantity(1.0, base_units)
+        return self.get_factor(quantity._units, self.pint_specs[get_dimensionality(quantity)])
+
+    def convert(self, x):
+        """Return the magnitude of the Quantity in the display units of the organization"""
+        units = x._units
+        dimensionality = _DIMENSIONALITIES.get(units)
+        if dimensionality is None:
+            dimensionality = _DIMENSIONALITIES[units] = get_dimensionality(x)
+        pint_spec = self.pint_specs[dimensionality]
+
+        magnitude = x.magnitude
+        if isinstance(magnitude, (int, long, float)):
+            return magnitude * self.get_factor(units, pint_spec)
+        # pint converts the factor to the type of other magnitudes (eg. Decimal)
+        return x.to(pint_spec).magnitude
+
+    def collapse(self, x):
+        """See collapse_unit"""
+        if isinstance(x, ureg.Quantity):
+            return round(self.convert(x), self.significant_figures)
+        elif isinstance(x, list):
+            # recurse out to collapse a dict for eg. the `related` key that
+            # contains properties when the pt_dict is for a taxlot and vice-versa
+            return [self.apply(y) for y in x]
+        else:
+            return x
+
+    def apply(self, pt_dict):
+        """See apply_display_unit_preferences"""
+        return {k: self.collapse(v) for k, v in pt_dict.iteritems()}
+
+    def apply_all(self, pt_dicts):
+        """Apply the display unit preferences to a list of property/taxlot data"""
+        return [self.apply(pt_dict) for pt_dict in pt_dicts]
+
+
 def collapse_unit(org, x):
     """
     Collapse a Quantity object present down to a straight Float, per the
     preferences of the organization supplied (or the base units). Generally
     used to hide the fact of Quantities from Angular.
     """
-    # make extensible / field name agnostic by just branching on the dimensionality
-    # and not the field name (eg. 'gross_floor_area') ... the dimensionality gets
-    # enforced separately by the django pint column type
-    pint_specs = {
-        EUI_DIMENSIONALITY: org.display_units_eui or EUI_DEFAULT_UNITS,
-        AREA_DIMENSIONALITY: org.display_units_area or AREA_DEFAULT_UNITS
-    }
-
-    if isinstance(x, ureg.Quantity):
-        dimensionality = get_dimensionality(x)
-        pint_spec = pint_specs[dimensionality]
-        converted_value = x.to(pint_spec).magnitude
-        return round(converted_value, org.display_significant_figures)
-    elif isinstance(x, list):
-        # recurse out to collapse a dict for eg. the `related` key that
-        # contains properties when the pt_dict is for a taxlot and vice-versa
-        return [apply_display_unit_preferences(org, y) for y in x]
-    else:
-        return x
+    return DisplayUnitConverter(org).collapse(x)
 
 
 def apply_display_unit_preferences(org, pt_dict):
@@ -62,9 +124,7 @@ def apply_display_unit_preferences(org, pt_dict):
     API and collapse any Quantity objects present down to a straight float, per
     the organization preferences.
     """
-    converted_dict = {k: collapse_unit(org, v) for k, v in pt_dict.iteritems()}
-
-    return converted_dict
+    return DisplayUnitConverter(org).apply(pt_dict)
 
 
 def pretty_units(quantity):
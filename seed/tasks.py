@@ -7,13 +7,17 @@
 from __future__ import absolute_import
 
 import sys
+import tempfile
+from uuid import uuid4
 
 from celery import chord, chain
 from celery import shared_task
 from celery.utils.log import get_task_logger
 from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
 from django.core.mail import send_mail
-from django.core.urlresolvers import reverse_lazy
+from django.core.urlresolvers import reverse, reverse_lazy
 from django.template import loader
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
@@ -27,9 +31,13 @@ from seed.models import (
     TaxLot, TaxLotState
 )
 from seed.utils.cache import set_cache, increment_cache
+from seed.utils.export import InventoryExport, delete_old_exports, get_export_path
 
 logger = get_task_logger(__name__)
 
+# File formats of the background inventory exports
+EXPORT_TYPES = ('csv', 'xls')
+
 
 @shared_task
 def invite_to_seed(domain, email_address, token, user_pk, first_name):
@@ -218,3 +226,47 @@ def _delete_organization_taxlot_state_chunk(del_ids, prog_key, increment, org_pk
     """deletes a list of ``del_ids`` and increments the cache"""
     TaxLotState.objects.filter(organization_id=org_pk, pk__in=del_ids).delete()
     increment_cache(prog_key, increment * 100)
+
+
+@shared_task
+def export_inventory(prog_key, org_pk, inventory_type, columns, ids, export_type, filename):
+    """
+    Writes an export of the properties or tax lots of an organization to the default storage.
+    Once done, the result of the progress key has the name of the file and the url to download
+    it, which is only served to the members of the organization until the file is deleted with
+    the other old exports.
+    """
+    delete_old_exports()
+
+    export = InventoryExport(org_pk, inventory_type, columns=columns, ids=ids)
+    total = export.count()
+
+    result = {
+        'status': 'success',
+        'progress_key': prog_key,
+        'progress': 0
+    }
+    set_cache(prog_key, result['status'], result)
+
+    # keep the last percent for saving the file
+    step = 99.0 / total if total else 0
+
+    def progress(count):
+        increment_cache(prog_key, count * step)
+
+    with tempfile.TemporaryFile() as f:
+        if export_type == 'xls':
+            export.write_xls(f, progress)
+        else:
+            export.write_csv(f, progress)
+        f.seek(0)
+        export_id = uuid4().hex
+        default_storage.save(get_export_path(org_pk, export_id, filename), File(f))
+
+    result['progress'] = 100
+    result['filename'] = filename
+    result['url'] = '{}?organization_id={}&export_id={}'.format(
+        reverse('api:v2.1:tax_lot_properties-download'), org_pk, export_id
+    )
+    set_cache(prog_key, result['status'], result)
+    return result
@@ -0,0 +1,70 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from django.test import TestCase
+from mock import patch
+
+from seed.landing.models import SEEDUser as User
+from seed.models import PropertyState
+from seed.models.data_quality import CompiledRule, DataQualityCheck, Rule, TYPE_EUI
+from seed.test_helpers.fake import FakePropertyStateFactory
+from seed.utils.cache import clear_cache
+from seed.utils.organizations import create_organization
+
+
+class DataQualityCheckCacheTests(TestCase):
+    """Tests for the cached checks of states that did not change."""
+
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_superuser('test_user@demo.com', 'test_user@demo.com',
+                                                  'test_pass')
+        self.org, _, _ = create_organization(self.user)
+        self.property_state_factory = FakePropertyStateFactory(organization=self.org)
+
+        self.dq = DataQualityCheck.retrieve(self.org)
+        self.dq.rules.update(enabled=False)
+        self.rule = Rule.objects.create(data_quality_check=self.dq, table_name='PropertyState',
+                                        field='site_eui', data_type=TYPE_EUI, min=0, max=100,
+                                        units='kBtu/ft**2/year')
+        Rule.objects.create(data_quality_check=self.dq, table_name='PropertyState',
+                            field='source_eui', data_type=TYPE_EUI, min=0, max=100,
+                            units='kBtu/ft**2/year')
+
+        self.state_ids = [
+            self.property_state_factory.get_property_state(site_eui=site_eui,
+                                                           source_eui=source_eui).id
+            for site_eui, source_eui in [(50, 50), (150, 50), (75, 250)]
+        ]
+
+    def _check(self):
+        dq = DataQualityCheck.retrieve(self.org)
+        with patch.object(CompiledRule, 'check', autospec=True,
+                          side_effect=CompiledRule.check) as check:
+            dq.check_data('PropertyState', PropertyState.objects.filter(id__in=self.state_ids))
+        fields = sorted(result['field'] for results in dq.results.values()
+                        for result in results['data_quality_results'])
+        return fields, sorted(c[0][0].rule.field for c in check.call_args_list)
+
+    def test_check_data_cache(self):
+        fields, checked = self._check()
+        self.assertEqual(fields, ['site_eui', 'source_eui'])
+        self.assertEqual(checked, ['site_eui'] * 3 + ['source_eui'] * 3)
+
+        # nothing changed, so nothing is checked again
+        self.assertEqual(self._check(), (['site_eui', 'source_eui'], []))
+
+        # only the edited state is checked again
+        state = PropertyState.objects.get(id=self.state_ids[0])
+        state.site_eui = 500
+        state.save()
+        self.assertEqual(self._check(),
+                         (['site_eui', 'site_eui', 'source_eui'], ['site_eui', 'source_eui']))
+
+        # only the field of the edited rule is checked again
+        self.rule.max = 1000
+        self.rule.save()
+        self.assertEqual(self._check(), (['source_eui'], ['site_eui'] * 3))
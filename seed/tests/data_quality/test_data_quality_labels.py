@@ -0,0 +1,78 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from seed.landing.models import SEEDUser as User
+from seed.models import PropertyState, PropertyView, StatusLabel
+from seed.models.data_quality import DataQualityCheck, Rule, TYPE_EUI
+from seed.test_helpers.fake import (
+    FakeCycleFactory,
+    FakePropertyFactory,
+    FakePropertyStateFactory,
+)
+from seed.utils.cache import clear_cache
+from seed.utils.organizations import create_organization
+
+
+class DataQualityLabelsTests(TestCase):
+    """Tests for the status labels applied by the data quality checks."""
+
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_superuser('test_user@demo.com', 'test_user@demo.com',
+                                                  'test_pass')
+        self.org, _, _ = create_organization(self.user)
+        self.cycle = FakeCycleFactory(organization=self.org, user=self.user).get_cycle()
+        self.property_factory = FakePropertyFactory(organization=self.org)
+        self.property_state_factory = FakePropertyStateFactory(organization=self.org)
+
+        self.label = StatusLabel.objects.create(name='EUI out of range',
+                                                super_organization=self.org)
+        self.dq = DataQualityCheck.retrieve(self.org)
+        self.dq.rules.update(enabled=False)
+        Rule.objects.create(data_quality_check=self.dq, table_name='PropertyState',
+                            field='site_eui', data_type=TYPE_EUI, min=0, max=100,
+                            units='kBtu/ft**2/year',
+                            status_label=self.label)
+
+    def _create_view(self, site_eui):
+        state = self.property_state_factory.get_property_state(site_eui=site_eui)
+        prprty = self.property_factory.get_property()
+        PropertyView.objects.create(property=prprty, cycle=self.cycle, state=state)
+        return prprty, state
+
+    def test_check_data_labels(self):
+        properties, state_ids = [], []
+        for site_eui in [50, 150, 250, 75]:
+            prprty, state = self._create_view(site_eui)
+            properties.append(prprty)
+            state_ids.append(state.id)
+        # a valid property keeps its unrelated labels but loses the rule's label
+        other_label = StatusLabel.objects.create(name='Other', super_organization=self.org)
+        properties[0].labels.add(self.label, other_label)
+        # an invalid property that already has the label keeps it
+        properties[1].labels.add(self.label)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.dq.check_data('PropertyState',
+                               PropertyState.objects.filter(id__in=state_ids).iterator())
+        self.assertEqual(sorted(self.dq.results.keys()), sorted(state_ids[1:3]))
+
+        self.assertEqual(list(properties[0].labels.all()), [other_label])
+        self.assertEqual(list(properties[1].labels.all()), [self.label])
+        self.assertEqual(list(properties[2].labels.all()), [self.label])
+        self.assertEqual(list(properties[3].labels.all()), [])
+
+        # the number of queries does not depend on the number of rows
+        num_queries = len(ctx.captured_queries)
+        state_ids = [self._create_view(eui)[1].id for eui in [150, 150, 50, 250, 50, 20]]
+        with CaptureQueriesContext(connection) as ctx:
+            self.dq.check_data('PropertyState',
+                               PropertyState.objects.filter(id__in=state_ids).iterator())
+        self.assertLessEqual(len(ctx.captured_queries), num_queries)
@@ -0,0 +1,147 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+import json
+from threading import Thread
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from seed.landing.models import SEEDUser as User
+from seed.lib.superperms.orgs.models import Organization, OrganizationUser
+from seed.models.data_quality import DataQualityCheck
+from seed.utils.cache import clear_cache
+
+
+class DataQualityResultsTests(TestCase):
+    """Tests for saving and retrieving the data quality results of chunked checks."""
+
+    identifier = 'results_test'
+
+    def setUp(self):
+        clear_cache()
+
+    def _save_chunk(self, ids):
+        dq = DataQualityCheck()
+        dq.results = {i: {'id': i, 'data_quality_results': []} for i in ids}
+        dq.save_to_cache(self.identifier)
+
+    def test_retrieve_results(self):
+        self.assertIsNone(DataQualityCheck.retrieve_results(self.identifier))
+
+        DataQualityCheck.initialize_cache(self.identifier)
+        self.assertEqual(list(DataQualityCheck.retrieve_results(self.identifier)), [])
+
+        self._save_chunk([7, 1, 5])
+        self._save_chunk([4, 2, 8])
+        results = list(DataQualityCheck.retrieve_results(self.identifier))
+        self.assertEqual([r['id'] for r in results], [1, 2, 4, 5, 7, 8])
+
+        # initializing the cache again removes the previous results
+        DataQualityCheck.initialize_cache(self.identifier)
+        self.assertEqual(list(DataQualityCheck.retrieve_results(self.identifier)), [])
+
+    def test_save_chunks_concurrently(self):
+        DataQualityCheck.initialize_cache(self.identifier)
+        threads = [Thread(target=self._save_chunk, args=(range(i, 200, 20),)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        results = list(DataQualityCheck.retrieve_results(self.identifier))
+        self.assertEqual([r['id'] for r in results], range(200))
+
+    def test_retrieve_results_page(self):
+        self.assertEqual(DataQualityCheck.retrieve_results_page(self.identifier, 1, 2), (None, False))
+
+        DataQualityCheck.initialize_cache(self.identifier)
+        self._save_chunk([5, 1, 3])
+        self._save_chunk([4, 2])
+
+        results, has_next = DataQualityCheck.retrieve_results_page(self.identifier, 1, 2)
+        self.assertEqual([r['id'] for r in results], [1, 2])
+        self.assertTrue(has_next)
+        results, has_next = DataQualityCheck.retrieve_results_page(self.identifier, 3, 2)
+        self.assertEqual([r['id'] for r in results], [5])
+        self.assertFalse(has_next)
+        results, has_next = DataQualityCheck.retrieve_results_page(self.identifier, 4, 2)
+        self.assertEqual(results, [])
+        self.assertFalse(has_next)
+
+
+class DataQualityResultsViewTests(TestCase):
+    """Tests for the endpoints that return the data quality results."""
+
+    def setUp(self):
+        clear_cache()
+        user_details = {
+            'username': 'test_user@demo.com',
+            'password': 'test_pass',
+        }
+        self.user = User.objects.create_superuser(email='test_user@demo.com', **user_details)
+        self.org = Organization.objects.create()
+        OrganizationUser.objects.create(user=self.user, organization=self.org)
+        self.client.login(**user_details)
+
+        self.identifier = 11
+        DataQualityCheck.initialize_cache(self.identifier)
+        for ids in [[3, 1], [2]]:
+            dq = DataQualityCheck()
+            dq.results = {
+                i: {
+                    'id': i,
+                    'address_line_1': '%s Main St' % i,
+                    'custom_id_1': None,
+                    'data_quality_results': [{
+                        'table_name': 'PropertyState',
+                        'formatted_field': 'Site EUI',
+                        'detailed_message': 'Site EUI out of range',
+                        'severity': 'error',
+                    }],
+                } for i in ids
+            }
+            dq.save_to_cache(self.identifier)
+
+    def test_get_data_quality_results(self):
+        url = reverse('api:v2:import_files-data-quality-results', args=[self.identifier])
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        result = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual([r['id'] for r in result['data']], [1, 2, 3])
+        self.assertNotIn('pagination', result)
+
+        result = self.client.get(url, {'page': 2, 'per_page': 2}).json()
+        self.assertEqual([r['id'] for r in result['data']], [3])
+        self.assertEqual(result['pagination'], {
+            'page': 2,
+            'per_page': 2,
+            'has_next': False,
+            'has_previous': True,
+        })
+
+        response = self.client.get(url, {'page': 0})
+        self.assertEqual(response.status_code, 400)
+
+        # the results of another check do not exist
+        url = reverse('api:v2:import_files-data-quality-results', args=[12])
+        result = json.loads(b''.join(self.client.get(url).streaming_content))
+        self.assertIsNone(result['data'])
+
+    def test_csv(self):
+        url = reverse('api:v2:data_quality_checks-csv', args=[self.identifier])
+        response = self.client.get(url, {'organization_id': self.org.id})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('Table,Address Line 1'))
+        self.assertEqual(lines[1], 'PropertyState,1 Main St,,,,Site EUI,Site EUI out of range,error')
+
+        url = reverse('api:v2:data_quality_checks-csv', args=[12])
+        response = self.client.get(url, {'organization_id': self.org.id})
+        self.assertEqual(b''.join(response.streaming_content).splitlines(),
+                         ['Error', 'data quality results not found'])
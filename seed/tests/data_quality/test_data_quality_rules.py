@@ -0,0 +1,78 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from datetime import date
+
+from django.test import TestCase
+from quantityfield import ureg
+
+from seed.models.data_quality import (
+    CompiledRule,
+    Rule,
+    RulePlan,
+    TYPE_DATE,
+    TYPE_EUI,
+    TYPE_NUMBER,
+    TYPE_STRING,
+)
+
+
+class CompiledRuleTests(TestCase):
+    """Tests for the rules compiled for checking chunks of data."""
+
+    def _result_types(self, rule, value, from_extra_data=False, mapped=True):
+        results, violated, halted = CompiledRule(rule).check(value, from_extra_data, mapped, 'F')
+        return [result_type for result_type, _ in results], violated, halted
+
+    def test_check_quantities(self):
+        rule = Rule(field='site_eui', data_type=TYPE_EUI, min=10, max=100,
+                    units='kBtu/ft**2/year')
+        compiled_rule = CompiledRule(rule)
+
+        self.assertEqual(self._result_types(rule, ureg.Quantity(50, 'kBtu/ft**2/year')),
+                         ([], False, False))
+        # 50 kBtu/m**2/year is 4.6 kBtu/ft**2/year
+        self.assertEqual(self._result_types(rule, ureg.Quantity(50, 'kBtu/m**2/year')),
+                         (['min_error'], True, False))
+        self.assertEqual(self._result_types(rule, ureg.Quantity(5000, 'kBtu/m**2/year')),
+                         (['max_error'], True, False))
+
+        # the bounds are converted once to the units of the values
+        compiled_rule.check(ureg.Quantity(50, 'kBtu/m**2/year'), False, True, 'F')
+        compiled_rule.check(ureg.Quantity(60, 'kBtu/m**2/year'), False, True, 'F')
+        bounds = compiled_rule.bounds[ureg.Quantity(1, 'kBtu/m**2/year').units]
+        self.assertAlmostEqual(bounds[0], 107.639, places=3)
+        self.assertAlmostEqual(bounds[1], 1076.391, places=3)
+        self.assertTrue(bounds[2])
+
+    def test_check_extra_data(self):
+        rule = Rule(field='count', data_type=TYPE_NUMBER, min=0, max=10)
+        self.assertEqual(self._result_types(rule, '5', True), ([], False, False))
+        self.assertEqual(self._result_types(rule, '50', True), (['max_error'], True, False))
+        self.assertEqual(self._result_types(rule, 'five', True), (['type_error'], False, True))
+
+        rule = Rule(field='date', data_type=TYPE_DATE, min=20000101, max=20201231)
+        self.assertEqual(self._result_types(rule, '1999-12-31', True), (['min_error'], True, False))
+
+        rule = Rule(field='name', data_type=TYPE_STRING, text_match='^bldg')
+        self.assertEqual(self._result_types(rule, 'Bldg 1'), ([], False, False))
+        self.assertEqual(self._result_types(rule, 'House'), (['string_error'], True, False))
+
+    def test_check_missing(self):
+        rule = Rule(field='year_ending', data_type=TYPE_DATE, required=True)
+        self.assertEqual(self._result_types(rule, None), (['missing_and_none'], True, False))
+        self.assertEqual(self._result_types(rule, date(2010, 1, 1), mapped=False),
+                         (['missing_req'], True, False))
+
+    def test_plan_groups_rules_by_field(self):
+        rules = [
+            Rule(field='site_eui', data_type=TYPE_NUMBER, min=0),
+            Rule(field='site_eui', data_type=TYPE_NUMBER, max=100),
+            Rule(field='year_built', data_type=TYPE_NUMBER, min=1700),
+        ]
+        plan = RulePlan(rules)
+        self.assertEqual(list(plan.fields.keys()), ['site_eui', 'year_built'])
+        self.assertEqual([c.rule for c in plan.fields['site_eui']], rules[:2])
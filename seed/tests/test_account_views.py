@@ -5,8 +5,9 @@
 :author
 """
 import json
-
 from datetime import date
+
+import mock
 from django.core.urlresolvers import reverse_lazy, NoReverseMatch
 from django.test import TestCase
 
@@ -19,6 +20,7 @@ from seed.lib.superperms.orgs.models import (
     OrganizationUser,
     Organization
 )
+from seed.lib.superperms.orgs.permissions import SEEDOrgPermissions
 from seed.models.columns import Column
 from seed.models.cycles import Cycle
 from seed.models.properties import PropertyState
@@ -407,6 +409,25 @@ class AccountsViewTests(TestCase):
             })
         self.assertEquals(ou.role_level, ROLE_MEMBER)
 
+    def test_update_role_clears_cached_role(self):
+        u = User.objects.create(username='b@b.com', email='b@be.com')
+        self.org.add_member(u, role=ROLE_MEMBER)
+        permissions = SEEDOrgPermissions()
+        request = mock.MagicMock(user=u, method='POST')
+        with mock.patch('seed.lib.superperms.orgs.permissions.get_org_id',
+                        return_value=self.org.id):
+            self.assertTrue(permissions.has_perm(request))
+
+            # the demoted user loses the permission right away
+            resp = self.client.put(
+                reverse_lazy("api:v2:users-update-role", args=[u.id]) +
+                '?organization_id=' + str(self.org.id),
+                data=json.dumps({'organization_id': self.org.id, 'role': 'viewer'}),
+                content_type='application/json',
+            )
+            self.assertEqual(json.loads(resp.content), {'status': 'success'})
+            self.assertFalse(permissions.has_perm(request))
+
     def test_allowed_to_update_role_if_not_last_owner(self):
         u = User.objects.create(username='b@b.com', email='b@be.com')
         self.org.add_member(u, role=ROLE_OWNER)
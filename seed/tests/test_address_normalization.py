@@ -4,9 +4,14 @@
 :copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
 :author
 """
+import mock
 from django.test import TestCase
 
-from seed.utils.address import normalize_address_str
+from seed.lib.superperms.orgs.models import Organization
+from seed.models import PropertyState
+from seed.utils import address as address_utils
+from seed.utils.address import normalize_address_str, normalize_address_strs
+from seed.utils.cache import clear_cache
 
 
 def make_method(message, expected):
@@ -78,3 +83,55 @@ class NormalizeStreetAddressTests(TestCase):
         # Straight numbers
         ('straight numbers', 56195600100, '56195600100'),
     ]
+
+
+class NormalizeAddressCacheTests(TestCase):
+
+    def setUp(self):
+        clear_cache()
+        address_utils._normalized_addresses.clear()
+
+    def tearDown(self):
+        address_utils._normalized_addresses.clear()
+
+    def test_normalize_address_strs(self):
+        addresses = ['100 Peach Avenue E.', None, '', '300 - 322 S Green St', '100 Peach Avenue E.']
+        expected = [normalize_address_str(address) for address in addresses]
+        address_utils._normalized_addresses.clear()
+        self.assertEqual(normalize_address_strs(addresses), expected)
+
+        # the addresses normalized by other processes are read from the cache
+        address_utils._normalized_addresses.clear()
+        with mock.patch('seed.utils.address._normalize_address_str',
+                        return_value='1 main st') as mock_normalize:
+            self.assertEqual(normalize_address_strs(addresses), expected)
+            self.assertFalse(mock_normalize.called)
+
+            # and each unique address is normalized once
+            normalize_address_strs(['1 Main St', '1 Main St'], shared_cache=False)
+            mock_normalize.assert_called_once_with('1 Main St')
+
+    def test_least_recently_used(self):
+        with mock.patch.object(address_utils, 'ADDRESS_CACHE_SIZE', 2):
+            normalize_address_str('1 Main St')
+            normalize_address_str('2 Main St')
+            normalize_address_str('1 Main St')
+            normalize_address_str('3 Main St')
+            self.assertEqual(list(address_utils._normalized_addresses), ['1 Main St', '3 Main St'])
+
+    def test_state_save(self):
+        org = Organization.objects.create()
+        state = PropertyState.objects.create(organization=org, address_line_1='100 Peach Avenue E.')
+        self.assertEqual(state.normalized_address, '100 peach ave e')
+
+        # the address is only normalized again when it changes
+        state = PropertyState.objects.get(pk=state.pk)
+        with mock.patch('seed.models.properties.normalize_address_str') as mock_normalize:
+            state.save()
+            self.assertFalse(mock_normalize.called)
+        state.address_line_1 = '300 - 322 S Green St'
+        state.save()
+        self.assertEqual(state.normalized_address, '300-322 s green st')
+        state.address_line_1 = None
+        state.save()
+        self.assertIsNone(state.normalized_address)
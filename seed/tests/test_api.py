@@ -12,8 +12,9 @@ import time
 from unittest import skip
 
 from django.core.urlresolvers import reverse_lazy, reverse
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
 from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
 
 from seed.factory import SEEDFactory
 from seed.landing.models import SEEDUser as User
@@ -170,6 +171,22 @@ class TestApi(TestCase):
         r = json.loads(r.content)
         self.assertNotEqual(r, None)
 
+    def test_api_key_rotation(self):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=self.auth_string)
+        self.assertEqual(User.process_header_request(request), self.user)
+
+        # the user of the key is cached, but a rotated key is not accepted anymore
+        self.user.generate_key()
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=self.auth_string)
+        with self.assertRaises(AuthenticationFailed):
+            User.process_header_request(request)
+
+        auth_string = base64.urlsafe_b64encode(
+            '{}:{}'.format(self.user.username, self.user.api_key)
+        )
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION='Basic {}'.format(auth_string))
+        self.assertEqual(User.process_header_request(request), self.user)
+
     def test_organization(self):
         self.client.login(username='test_user@demo.com', password='test_pass')
         r = self.client.get('/api/v2/organizations/', follow=True, **self.headers)
@@ -7,7 +7,9 @@
 
 import os.path
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from seed import models as seed_models
 from seed.landing.models import SEEDUser as User
@@ -190,6 +192,20 @@ class TestColumns(TestCase):
         self.assertEqual(c.table_name, 'PropertyState')
         self.assertEqual(ps.extra_data['lab'], 'hawkins national laboratory')
 
+    def test_save_extra_data_column_names(self):
+        Column.objects.create(column_name='lab', is_extra_data=True,
+                              organization=self.fake_org, table_name='PropertyState')
+
+        Column.save_extra_data_column_names(
+            self.fake_org, 'PropertyState', ['lab', 'a', 'address_line_1'])
+        Column.save_extra_data_column_names(self.fake_org, 'PropertyState', ['a'])
+
+        columns = Column.objects.filter(organization=self.fake_org, table_name='PropertyState')
+        self.assertEqual(columns.filter(column_name='lab').count(), 1)
+        self.assertEqual(columns.filter(column_name='a').count(), 1)
+        self.assertTrue(columns.get(column_name='a').is_extra_data)
+        self.assertFalse(columns.get(column_name='address_line_1').is_extra_data)
+
     def test_save_column_mapping_by_file_exception(self):
         self.mapping_import_file = os.path.abspath("./no-file.csv")
         with self.assertRaisesRegexp(Exception, "Mapping file does not exist: .*/no-file.csv"):
@@ -376,6 +392,48 @@ class TestColumnsByInventory(TestCase):
         with self.assertRaisesRegexp(Exception, 'Duplicate name'):
             Column.retrieve_all(self.fake_org.pk, 'property', False)
 
+    def test_column_retrieve_all_cached(self):
+        columns = Column.retrieve_all(self.fake_org.pk, 'property', False)
+        with CaptureQueriesContext(connection) as queries:
+            cached_columns = Column.retrieve_all(self.fake_org, 'Property', False)
+        self.assertEqual(len(queries.captured_queries), 0)
+        self.assertEqual(columns, cached_columns)
+
+        # the returned columns can be changed without changing the cache
+        cached_columns[0]['displayName'] = 'Changed'
+        self.assertEqual(Column.retrieve_all(self.fake_org.pk, 'property', False), columns)
+
+        catalog = Column.retrieve_catalog(self.fake_org.pk, 'property', False)
+        self.assertEqual(catalog.get('id_extra')['dbName'], 'id')
+        self.assertEqual(catalog.get_by_table('TaxLotState', 'tax_state')['dbName'], 'state')
+        self.assertIsNone(catalog.get_by_table('PropertyState', 'tax_state'))
+
+    def test_column_retrieve_all_invalidated(self):
+        names = [c['name'] for c in Column.retrieve_all(self.fake_org.pk, 'property', False)]
+        self.assertNotIn('Column B', names)
+
+        column = seed_models.Column.objects.create(
+            column_name=u'Column B',
+            table_name=u'PropertyState',
+            organization=self.fake_org,
+            is_extra_data=True
+        )
+        columns = Column.retrieve_all(self.fake_org.pk, 'property', False)
+        self.assertIn('Column B', [c['name'] for c in columns])
+
+        column.shared_field_type = Column.SHARED_PUBLIC
+        column.save()
+        catalog = Column.retrieve_catalog(self.fake_org.pk, 'property', False)
+        self.assertEqual(catalog.get('Column B')['sharedFieldType'], 'Public')
+
+        column.delete()
+        names = [c['name'] for c in Column.retrieve_all(self.fake_org.pk, 'property', False)]
+        self.assertNotIn('Column B', names)
+
+        Column.save_extra_data_column_names(self.fake_org, 'PropertyState', ['Column C'])
+        names = [c['name'] for c in Column.retrieve_all(self.fake_org.pk, 'property', False)]
+        self.assertIn('Column C', names)
+
     def test_column_retrieve_schema(self):
 
         schema = {
@@ -5,14 +5,15 @@
 :author
 """
 import json
+from threading import Thread
 
 from django.http import HttpResponse
 from django.test import TestCase, RequestFactory
 from rest_framework.test import APIRequestFactory
 
 from seed import decorators
-from seed.utils.cache import make_key, get_cache, get_lock, increment_cache, \
-    clear_cache
+from seed.utils.cache import make_key, get_cache, set_cache, get_lock, increment_cache, \
+    clear_cache, acquire_lock, release_lock
 
 
 class TestException(Exception):
@@ -58,6 +59,42 @@ class TestDecorators(TestCase):
         expected = 100.0
         self.assertEqual(float(get_cache(test_key)['progress']), expected)
 
+    def test_increment_cache_concurrently(self):
+        """Concurrent increments are not lost."""
+        test_key = make_key('increment_concurrent_test')
+        threads = [Thread(target=increment_cache, args=(test_key, 1.5)) for i in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(float(get_cache(test_key)['progress']), 60.0)
+
+    def test_set_cache(self):
+        """The status, progress and extra data are returned as they were set."""
+        test_key = make_key('set_test')
+        set_cache(test_key, 'success', {'progress': 100, 'message': 'done', 'errors': [1, 2]})
+        self.assertEqual(get_cache(test_key),
+                         {'status': 'success', 'progress': 100.0, 'message': 'done',
+                          'errors': [1, 2]})
+
+        # Setting the cache again replaces all the data
+        set_cache(test_key, 'parsing', 10)
+        self.assertEqual(get_cache(test_key), {'status': 'parsing', 'progress': 10.0})
+
+        increment_cache(test_key, 15)
+        self.assertEqual(get_cache(test_key), {'status': 'parsing', 'progress': 25.0})
+
+    def test_acquire_lock(self):
+        """Only one caller can acquire the lock until it is released."""
+        key = decorators._get_lock_key('fake_func', self.pk)
+        self.assertTrue(acquire_lock(key))
+        self.assertFalse(acquire_lock(key))
+
+        release_lock(key)
+        self.assertTrue(acquire_lock(key))
+        release_lock(key)
+
     # Tests for decorators themselves.
 
     def test_locking(self):
@@ -86,6 +123,18 @@ class TestDecorators(TestCase):
         # Even though execution failed part way through a call, we unlock.
         self.assertEqual(int(get_lock(key)), self.unlocked)
 
+    def test_locked(self):
+        """We don't run the function if the task is already locked."""
+        key = decorators._get_lock_key('fake_func', self.pk)
+        acquire_lock(key)
+
+        @decorators.lock_and_track
+        def fake_func(import_file_pk):
+            self.fail('The function should not run while locked')
+
+        self.assertEqual(fake_func(self.pk), {'error': 'locked'})
+        self.assertEqual(int(get_lock(key)), self.locked)
+
     def test_progress(self):
         """When a task finishes, it increments the progress counter properly."""
         increment = expected = 25.0
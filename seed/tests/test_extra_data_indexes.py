@@ -0,0 +1,131 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase
+
+from seed.landing.models import SEEDUser as User
+from seed.models import BuildingSnapshot, ExtraDataIndex, ExtraDataKeyUsage
+from seed.lib.superperms.orgs.models import Organization
+from seed.search import filter_other_params, get_searched_organization_id
+from seed.utils.cache import clear_cache
+from seed.utils.organizations import create_organization
+
+
+class ExtraDataIndexTests(TestCase):
+
+    def setUp(self):
+        clear_cache()
+        self.user = User.objects.create_superuser('test_user@demo.com', 'test_user@demo.com',
+                                                  'test_pass')
+        self.org, _, _ = create_organization(self.user)
+
+    def _index_names(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE indexname LIKE 'seed_extra_data_%%'")
+            return sorted(row[0] for row in cursor.fetchall())
+
+    def test_filter_records_usage(self):
+        BuildingSnapshot.objects.create(super_organization=self.org,
+                                        extra_data={'BBL': '1001', 'Borough': 'Queens'})
+        BuildingSnapshot.objects.create(super_organization=self.org,
+                                        extra_data={'BBL': '2002', 'Borough': 'Brooklyn'})
+
+        qs = filter_other_params(BuildingSnapshot.objects.all(), {'Borough': 'queen'}, [],
+                                 organization_id=self.org.pk)
+        self.assertEqual([b.extra_data['BBL'] for b in qs], ['1001'])
+        qs = filter_other_params(BuildingSnapshot.objects.all(),
+                                 {'Borough': 'brook', 'BBL': '"2002"'}, [],
+                                 organization_id=self.org.pk)
+        self.assertEqual([b.extra_data['BBL'] for b in qs], ['2002'])
+
+        # the uses are counted in the cache until they are saved
+        self.assertFalse(ExtraDataKeyUsage.objects.exists())
+        other_org, _, _ = create_organization(self.user)
+        ExtraDataKeyUsage.record(other_org.pk, 'BuildingSnapshot', sort_keys=['BBL'])
+        other_org.delete()
+        self.assertEqual(ExtraDataKeyUsage.save_recorded(), 2)
+        self.assertEqual(ExtraDataKeyUsage.save_recorded(), 0)
+
+        usages = ExtraDataKeyUsage.objects.filter(organization=self.org).order_by('key')
+        self.assertEqual([(u.table_name, u.key, u.filter_count, u.sort_count) for u in usages],
+                         [('BuildingSnapshot', 'BBL', 1, 0), ('BuildingSnapshot', 'Borough', 2, 0)])
+
+    def test_searched_organization_id(self):
+        orgs = self.user.orgs.all()
+        self.assertEqual(get_searched_organization_id({'organization_id': str(self.org.pk)}, orgs),
+                         self.org.pk)
+        # only the organization being searched is counted, if the user belongs to it
+        other_org = Organization.objects.create()
+        self.assertIsNone(get_searched_organization_id({'organization_id': other_org.pk}, orgs))
+        self.assertIsNone(get_searched_organization_id({'organization_id': 'all'}, orgs))
+        self.assertIsNone(get_searched_organization_id({}, orgs))
+
+    def test_update_indexes(self):
+        ExtraDataKeyUsage.record(self.org.pk, 'PropertyState', filter_keys=['BBL'] * 20)
+        ExtraDataKeyUsage.record(self.org.pk, 'PropertyState', filter_keys=['Borough'] * 15,
+                                 sort_keys=['Borough'] * 12)
+        ExtraDataKeyUsage.record(self.org.pk, 'PropertyState', filter_keys=['Rarely'] * 2)
+
+        call_command('manage_extra_data_indexes', '--dry-run', '--max-keys=1')
+        self.assertEqual(self._index_names(), [])
+
+        # contains filters are only indexed if pg_trgm can be installed
+        filter_types = ['btree', 'trigram'] if ExtraDataIndex.trigram_available() else ['btree']
+
+        created, dropped = ExtraDataIndex.update_indexes(max_keys=1, min_uses=10)
+        self.assertEqual(dropped, [])
+        self.assertEqual(sorted((i.key, i.index_type) for i in created),
+                         [('BBL', t) for t in filter_types] + [('Borough', 'sort')])
+        self.assertEqual(self._index_names(), sorted(i.name for i in created))
+
+        # Borough becomes the most filtered key
+        ExtraDataKeyUsage.record(self.org.pk, 'PropertyState', filter_keys=['Borough'] * 10)
+        created, dropped = ExtraDataIndex.update_indexes(max_keys=1, min_uses=10)
+        self.assertEqual(sorted((i.key, i.index_type) for i in created),
+                         [('Borough', t) for t in filter_types])
+        self.assertEqual(sorted((i.key, i.index_type) for i in dropped),
+                         [('BBL', t) for t in filter_types])
+        self.assertEqual(self._index_names(),
+                         sorted(i.name for i in ExtraDataIndex.objects.all()))
+        self.assertEqual(ExtraDataIndex.objects.count(), len(filter_types) + 1)
+
+    def _create_index(self, key):
+        index = ExtraDataIndex(organization=self.org, table_name='PropertyState', key=key,
+                               index_type=ExtraDataIndex.BTREE,
+                               name=ExtraDataIndex.get_name(self.org.pk, 'PropertyState', key,
+                                                            ExtraDataIndex.BTREE))
+        index.create_index()
+        return index
+
+    def test_deletes_drop_indexes(self):
+        self._create_index('BBL')
+        self._create_index('Borough')
+        self.assertEqual(len(self._index_names()), 2)
+
+        # bulk deletes, like the delete action of the admin, drop the indexes too
+        ExtraDataIndex.objects.filter(key='BBL').delete()
+        self.assertEqual(self._index_names(), [ExtraDataIndex.objects.get().name])
+
+        self.org.delete()
+        self.assertEqual(self._index_names(), [])
+
+    def test_invalid_index_is_built_again(self):
+        index = self._create_index('BBL')
+        try:
+            with transaction.atomic():
+                # what a failed concurrent build leaves behind
+                with connection.cursor() as cursor:
+                    cursor.execute('UPDATE pg_index SET indisvalid = false '
+                                   'WHERE indexrelid = %s::regclass', [index.name])
+        except DatabaseError:
+            self.skipTest('The catalog can only be updated by a superuser')
+
+        with connection.cursor() as cursor:
+            self.assertIs(index._is_valid(cursor), False)
+            index.create_index()
+            self.assertIs(index._is_valid(cursor), True)
@@ -120,6 +120,23 @@ class SEEDOrgPermissionsTests(TestCase):
         self.org.delete()
         self.org_user.delete()
 
+    def test_get_org_user(self):
+        """Test the roles of the users are cached until they change"""
+        org_user = OrganizationUser.get_org_user(self.user, self.org.id)
+        self.assertEqual(org_user.pk, self.org_user.pk)
+        with self.assertNumQueries(0):
+            org_user = OrganizationUser.get_org_user(self.user, str(self.org.id))
+        self.assertEqual(org_user.role_level, self.org_user.role_level)
+
+        self.org_user.role_level = ROLE_VIEWER
+        self.org_user.save()
+        self.assertEqual(OrganizationUser.get_org_user(self.user, self.org.id).role_level,
+                         ROLE_VIEWER)
+
+        self.org_user.delete()
+        self.assertIsNone(OrganizationUser.get_org_user(self.user, self.org.id))
+        self.org_user = OrganizationUser.objects.create(user=self.user, organization=self.org)
+
     @mock.patch('seed.lib.superperms.orgs.permissions.get_org_id')
     def test_has_perm(self, mock_get_org_id):
         """Test has_perm method"""
@@ -0,0 +1,63 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from decimal import Decimal
+
+from django.test import TestCase
+from quantityfield import ureg
+
+from seed.lib.superperms.orgs.models import Organization
+from seed.serializers.pint import (
+    DisplayUnitConverter,
+    apply_display_unit_preferences,
+    collapse_unit,
+)
+
+
+class TestDisplayUnitConverter(TestCase):
+    """Tests for collapsing the Quantity objects to the display units of an organization."""
+
+    def setUp(self):
+        self.org = Organization.objects.create(
+            display_units_eui='kWh/m**2/year',
+            display_units_area='m**2',
+            display_significant_figures=3,
+        )
+
+    def test_same_as_pint(self):
+        converter = DisplayUnitConverter(self.org)
+        magnitudes = [0, 1, 7, 123456789, -42, 0.1, 1234.5678, 1e-7, 98765.4321e3]
+        units = ['ft**2', 'm**2', 'kBtu/ft**2/year', 'kWh/m**2/year', 'GJ/m**2/year']
+        for unit in units:
+            spec = 'm**2' if '/' not in unit else 'kWh/m**2/year'
+            for magnitude in magnitudes:
+                value = ureg.Quantity(magnitude, unit)
+                expected = round(value.to(spec).magnitude, 3)
+                self.assertEqual(converter.collapse(value), expected)
+                self.assertEqual(collapse_unit(self.org, value), expected)
+
+        value = ureg.Quantity(Decimal('10.5'), 'ft**2')
+        self.assertEqual(converter.collapse(value), round(value.to('m**2').magnitude, 3))
+
+    def test_apply(self):
+        row = {
+            'id': 1,
+            'address_line_1': '123 Main St',
+            'gross_floor_area': ureg.Quantity(1000, 'ft**2'),
+            'related': [{'site_eui': ureg.Quantity(100, 'kBtu/ft**2/year'), 'id': 2}],
+        }
+        expected = {
+            'id': 1,
+            'address_line_1': '123 Main St',
+            'gross_floor_area': 92.903,
+            'related': [{'site_eui': 315.459, 'id': 2}],
+        }
+        self.assertEqual(apply_display_unit_preferences(self.org, row), expected)
+        self.assertEqual(DisplayUnitConverter(self.org).apply_all([row, row]), [expected, expected])
+
+        # the default units are used when the organization has none
+        self.org.display_units_area = ''
+        self.assertEqual(DisplayUnitConverter(self.org).collapse(row['gross_floor_area']), 1000)
@@ -0,0 +1,159 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+import json
+
+import mock
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from seed.landing.models import SEEDUser as User
+from seed.lib.superperms.orgs.models import Organization, OrganizationUser
+from seed.test_helpers.fake import (
+    FakeCycleFactory,
+    FakePropertyFactory,
+    FakePropertyViewFactory,
+)
+from seed.utils.cache import clear_cache
+from seed.utils.reports import PropertyReport
+
+
+class TestPropertyReport(TestCase):
+    """Tests for the aggregation of the property reports in the database."""
+
+    def setUp(self):
+        clear_cache()
+        user_details = {
+            'username': 'test_user@demo.com',
+            'password': 'test_pass',
+        }
+        self.user = User.objects.create_superuser(email='test_user@demo.com', **user_details)
+        self.org = Organization.objects.create()
+        OrganizationUser.objects.create(user=self.user, organization=self.org)
+        self.cycle = FakeCycleFactory(organization=self.org, user=self.user).get_cycle()
+        self.yr_e = self.cycle.end.strftime('%Y')
+        self.property_factory = FakePropertyFactory(organization=self.org)
+        self.view_factory = FakePropertyViewFactory(
+            cycle=self.cycle, organization=self.org, user=self.user
+        )
+
+        self.views = [
+            self.view_factory.get_property_view(
+                site_eui=site_eui, year_built=year_built, gross_floor_area=gross_floor_area,
+                use_description=use_description
+            )
+            for site_eui, year_built, gross_floor_area, use_description in [
+                (100, 1991, 50000, 'Office'),
+                (200, 1995, 150000, 'office'),
+                (300, 2003, 2000000, 'Retail'),
+                (None, 2003, 2000000, 'Retail'),
+            ]
+        ]
+        campus = self.property_factory.get_property(campus=True)
+        self.view_factory.get_property_view(prprty=campus, site_eui=1000, year_built=1991,
+                                            gross_floor_area=50000, use_description='Office')
+        self.client.login(**user_details)
+
+    def get_report(self, x_var, y_var, campus_only=False):
+        return PropertyReport(self.org, [self.cycle], x_var, y_var, campus_only)
+
+    def test_data(self):
+        data = self.get_report('site_eui', 'year_built').get_data()
+        self.assertEqual(data['property_counts'], [
+            {'yr_e': self.yr_e, 'num_properties': 4, 'num_properties_w-data': 3}
+        ])
+        self.assertEqual(data['chart_data'], [
+            {'id': view.property_id, 'x': x, 'y': y, 'yr_e': self.yr_e}
+            for view, x, y in zip(self.views, [100, 200, 300], [1991, 1995, 2003])
+        ])
+
+        data = self.get_report('site_eui', 'year_built', campus_only=True).get_data()
+        self.assertEqual(data['property_counts'][0]['num_properties'], 5)
+        self.assertEqual(len(data['chart_data']), 4)
+
+    def test_aggregated_data(self):
+        data = self.get_report('site_eui', 'year_built').get_aggregated_data()
+        self.assertEqual(data['chart_data'], [
+            {'x': 150, 'y': '1990-1999', 'yr_e': self.yr_e},
+            {'x': 300, 'y': '2000-2009', 'yr_e': self.yr_e},
+        ])
+
+        data = self.get_report('site_eui', 'use_description').get_aggregated_data()
+        self.assertEqual(data['chart_data'], [
+            {'x': 150, 'y': 'Office', 'yr_e': self.yr_e},
+            {'x': 300, 'y': 'Retail', 'yr_e': self.yr_e},
+        ])
+
+        data = self.get_report('site_eui', 'gross_floor_area').get_aggregated_data()
+        self.assertEqual(data['chart_data'], [
+            {'x': 100, 'y': '0-99k', 'yr_e': self.yr_e},
+            {'x': 200, 'y': '100-199k', 'yr_e': self.yr_e},
+            {'x': 300, 'y': 'over 1,000k', 'yr_e': self.yr_e},
+        ])
+
+        # the values are converted to the display units before being aggregated
+        self.org.display_units_eui = 'kWh/m**2/year'
+        self.org.display_units_area = 'm**2'
+        self.org.display_significant_figures = 1
+        self.org.save()
+        data = self.get_report('site_eui', 'gross_floor_area').get_aggregated_data()
+        self.assertEqual(data['chart_data'], [
+            {'x': 473.2, 'y': '0-99k', 'yr_e': self.yr_e},
+            {'x': 946.4, 'y': '100-199k', 'yr_e': self.yr_e},
+        ])
+
+    def test_cache(self):
+        report = self.get_report('site_eui', 'year_built')
+        data = report.get_aggregated_data()
+        with self.assertNumQueries(0):
+            self.assertEqual(report.get_aggregated_data(), data)
+
+        # changing a state of the organization invalidates the data
+        state = self.views[0].state
+        state.site_eui = 400
+        state.save()
+        data = report.get_aggregated_data()
+        self.assertEqual(data['chart_data'][0]['x'], 300)
+
+        # as does changing the views of the cycle
+        self.views[1].delete()
+        data = report.get_aggregated_data()
+        self.assertEqual(data['chart_data'][0]['x'], 400)
+
+    def test_invalidated_on_commit(self):
+        report = self.get_report('site_eui', 'year_built')
+        state = self.views[0].state
+        state.site_eui = 400
+        with mock.patch('seed.utils.reports.transaction.on_commit') as on_commit:
+            state.save()
+        # data computed before the change is committed are not used after the commit
+        cache_key = report.cache_key('aggregated_data')
+        self.assertTrue(on_commit.called)
+        for call in on_commit.call_args_list:
+            call[0][0]()
+        self.assertNotEqual(report.cache_key('aggregated_data'), cache_key)
+
+    def test_endpoints(self):
+        params = {
+            'organization_id': self.org.pk,
+            'start': self.cycle.pk,
+            'end': self.cycle.pk,
+            'x_var': 'site_eui',
+            'y_var': 'year_built',
+        }
+        response = self.client.get(reverse('api:v2:aggregated_property_report_data'), params)
+        result = json.loads(response.content)
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(len(result['aggregated_data']['chart_data']), 2)
+
+        response = self.client.get(reverse('api:v2:property_report_data'), params)
+        result = json.loads(response.content)
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(len(result['data']['chart_data']), 3)
+
+        params['x_var'] = 'energy_score'
+        response = self.client.get(reverse('api:v2:property_report_data'), params)
+        self.assertEqual(response.status_code, 404)
@@ -5,9 +5,16 @@
 :author
 """
 import json
+import shutil
+import tempfile
+from datetime import timedelta
 
+import xlrd
+from django.core.files.storage import default_storage
 from django.core.urlresolvers import reverse_lazy
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from seed.landing.models import SEEDUser as User
 from seed.lib.superperms.orgs.models import (
@@ -20,11 +27,14 @@ from seed.models import (
     TaxLotProperty,
 )
 from seed.test_helpers.fake import (
+    FakeNoteFactory,
     FakePropertyFactory,
     FakePropertyStateFactory,
     FakePropertyViewFactory,
     FakeStatusLabelFactory
 )
+from seed.utils import export
+from seed.utils.cache import get_cache
 
 
 class TestTaxLotProperty(TestCase):
@@ -81,6 +91,35 @@ class TestTaxLotProperty(TestCase):
         self.assertEqual(len(data), 50)
         self.assertEqual(len(data[0]['related']), 0)
 
+    def test_tax_lot_property_get_related_notes_and_labels(self):
+        """Test that the notes counts and labels are returned without a query per row"""
+        note_factory = FakeNoteFactory(organization=self.org, user=self.user)
+        for i in range(20):
+            p = self.property_view_factory.get_property_view()
+            self.properties.append(p.id)
+
+        view = PropertyView.objects.get(pk=self.properties[0])
+        note_factory.get_note(property_view=view, name='first')
+        note_factory.get_note(property_view=view, name='second')
+        view.property.labels.add(self.label_factory.get_statuslabel(name='Zeta'))
+        view.property.labels.add(self.label_factory.get_statuslabel(name='Alpha'))
+
+        columns = ['address_line_1', 'property_labels']
+        qs = PropertyView.objects.select_related('property', 'state', 'cycle').filter(
+            pk__in=self.properties).order_by('id')
+
+        with CaptureQueriesContext(connection) as small_page:
+            TaxLotProperty.get_related(list(qs[:5]), columns)
+        with CaptureQueriesContext(connection) as large_page:
+            data = TaxLotProperty.get_related(list(qs), columns)
+        self.assertEqual(len(small_page.captured_queries), len(large_page.captured_queries))
+
+        self.assertEqual(len(data), 20)
+        self.assertEqual(data[0]['notes_count'], 2)
+        self.assertEqual(data[0]['property_labels'], 'Alpha,Zeta')
+        self.assertEqual(data[1]['notes_count'], 0)
+        self.assertEqual(data[1]['property_labels'], '')
+
     def test_csv_export(self):
         """Test to make sure get_related returns the fields"""
         for i in range(50):
@@ -110,7 +149,7 @@ class TestTaxLotProperty(TestCase):
         )
 
         # parse the content as array
-        data = response.content.split('\n')
+        data = b''.join(response.streaming_content).split('\n')
 
         self.assertTrue('Address Line 1 (Property)' in data[0].split(','))
         self.assertTrue('Property Labels\r' in data[0].split(','))
@@ -119,6 +158,94 @@ class TestTaxLotProperty(TestCase):
         # last row should be blank
         self.assertEqual(data[52], '')
 
+    def test_csv_export_ids_order(self):
+        """Test that the rows are in the order of the ids across batches"""
+        for i in range(7):
+            p = self.property_view_factory.get_property_view()
+            self.properties.append(p.id)
+        property_ids = [v.property_id for v in PropertyView.objects.filter(pk__in=self.properties)]
+        property_ids.reverse()
+
+        url = reverse_lazy('api:v2.1:tax_lot_properties-csv')
+        original_batch_size = export.EXPORT_BATCH_SIZE
+        export.EXPORT_BATCH_SIZE = 3
+        try:
+            response = self.client.post(
+                url + '?organization_id={}&cycle_id={}&inventory_type=properties'.format(
+                    self.org.pk, self.cycle.pk),
+                data=json.dumps({'columns': ['property_view_id', 'id'], 'ids': property_ids}),
+                content_type='application/json'
+            )
+            data = b''.join(response.streaming_content).splitlines()
+        finally:
+            export.EXPORT_BATCH_SIZE = original_batch_size
+
+        self.assertEqual(data[0], 'property_view_id,id,Property Labels')
+        self.assertEqual([int(line.split(',')[1]) for line in data[1:]], property_ids)
+
+    def test_background_export(self):
+        """Test that the background export writes the file and reports its url"""
+        for i in range(7):
+            p = self.property_view_factory.get_property_view()
+            self.properties.append(p.id)
+
+        columns = ['address_line_1', 'property_name', 'site_eui']
+        url = reverse_lazy('api:v2.1:tax_lot_properties-export')
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(
+                url + '?organization_id={}&cycle_id={}&inventory_type=properties'.format(
+                    self.org.pk, self.cycle.pk),
+                data=json.dumps({'columns': columns, 'export_type': 'xls'}),
+                content_type='application/json'
+            )
+            result = json.loads(response.content)
+            self.assertEqual(result['status'], 'success')
+
+            progress = get_cache(result['progress_key'])
+            self.assertEqual(progress['progress'], 100)
+            self.assertEqual(progress['filename'], 'ExportedData.xls')
+            response = self.client.get(progress['url'])
+            self.assertEqual(response['Content-Disposition'],
+                             'attachment; filename="ExportedData.xls"')
+            workbook = xlrd.open_workbook(file_contents=b''.join(response.streaming_content))
+
+            # the file is only served to the members of the organization
+            other_user = User.objects.create_user(username='other@demo.com',
+                                                  email='other@demo.com', password='test_pass')
+            other_org = Organization.objects.create()
+            OrganizationUser.objects.create(user=other_user, organization=other_org)
+            self.client.login(username='other@demo.com', password='test_pass')
+            response = self.client.get(progress['url'])
+            self.assertEqual(json.loads(response.content)['status'], 'error')
+            response = self.client.get(progress['url'].replace(
+                'organization_id={}'.format(self.org.pk),
+                'organization_id={}'.format(other_org.pk)))
+            self.assertEqual(response.status_code, 404)
+
+            # the old files are deleted
+            self.assertEqual(export.delete_old_exports(), 0)
+            self.assertEqual(export.delete_old_exports(timedelta(0)), 1)
+            self.assertEqual(default_storage.listdir(export.EXPORTS_DIR + '/' + str(self.org.pk)),
+                             ([], []))
+            self.client.login(username='test_user@demo.com', password='test_pass')
+            self.assertEqual(self.client.get(progress['url']).status_code, 404)
+
+        sheet = workbook.sheet_by_index(0)
+        self.assertEqual(sheet.nrows, 9)
+        self.assertEqual(sheet.row_values(0)[0], 'Address Line 1 (Property)')
+        self.assertEqual(sheet.row_values(0)[-1], 'Property Labels')
+
+        # invalid export types are rejected
+        response = self.client.post(
+            url + '?organization_id={}&cycle_id={}&inventory_type=properties'.format(
+                self.org.pk, self.cycle.pk),
+            data=json.dumps({'columns': columns, 'export_type': 'pdf'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
     def tearDown(self):
         for x in self.properties:
             PropertyView.objects.get(pk=x).delete()
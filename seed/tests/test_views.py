@@ -32,7 +32,7 @@ from seed.test_helpers.fake import (
     FakePropertyFactory, FakePropertyStateFactory,
     FakeTaxLotStateFactory
 )
-from seed.utils.cache import set_cache
+from seed.utils.cache import clear_cache, set_cache
 
 DEFAULT_CUSTOM_COLUMNS = [
     'project_id',
@@ -889,6 +889,50 @@ class InventoryViewTests(DeleteModelsTestCase):
         self.assertEquals(pagination['has_previous'], False)
         self.assertEquals(pagination['total'], 0)
 
+    def test_get_properties_cursor(self):
+        clear_cache()
+        view_ids = []
+        for _ in range(5):
+            view_ids.append(PropertyView.objects.create(
+                property=self.property_factory.get_property(), cycle=self.cycle,
+                state=self.property_state_factory.get_property_state()
+            ).id)
+        params = {
+            'organization_id': self.org.pk,
+            'cycle': self.cycle.pk,
+            'per_page': 2,
+            'cursor': '',
+            'count': 'true',
+        }
+
+        # page forward through all the properties
+        pages = []
+        while True:
+            result = json.loads(self.client.get('/api/v2/properties/', params).content)
+            pages.append([r['property_view_id'] for r in result['results']])
+            pagination = result['pagination']
+            self.assertEqual(pagination['total'], 5)
+            self.assertEqual(pagination['has_previous'], len(pages) > 1)
+            if not pagination['has_next']:
+                self.assertIsNone(pagination['next'])
+                break
+            params['cursor'] = pagination['next']
+        self.assertEqual(pages, [view_ids[0:2], view_ids[2:4], view_ids[4:]])
+
+        # and back to the first page
+        params['cursor'] = pagination['previous']
+        result = json.loads(self.client.get('/api/v2/properties/', params).content)
+        self.assertEqual([r['property_view_id'] for r in result['results']], view_ids[2:4])
+        params['cursor'] = result['pagination']['previous']
+        result = json.loads(self.client.get('/api/v2/properties/', params).content)
+        self.assertEqual([r['property_view_id'] for r in result['results']], view_ids[0:2])
+        self.assertFalse(result['pagination']['has_previous'])
+        self.assertIsNone(result['pagination']['previous'])
+
+        params['cursor'] = 'not a cursor'
+        response = self.client.get('/api/v2/properties/', params)
+        self.assertEqual(response.status_code, 400)
+
     def test_get_property(self):
         property_state = self.property_state_factory.get_property_state()
         property_property = self.property_factory.get_property()
@@ -1317,6 +1361,37 @@ class InventoryViewTests(DeleteModelsTestCase):
         self.assertEquals(pagination['has_previous'], False)
         self.assertEquals(pagination['total'], 1)
 
+    def test_get_taxlots_cursor(self):
+        view_ids = [
+            TaxLotView.objects.create(
+                taxlot=TaxLot.objects.create(organization=self.org), cycle=self.cycle,
+                state=self.taxlot_state_factory.get_taxlot_state()
+            ).id for _ in range(3)
+        ]
+        response = self.client.post('/api/v2/taxlots/filter/?{}={}&{}={}&{}={}&{}='.format(
+            'organization_id', self.org.pk,
+            'cycle', self.cycle.pk,
+            'per_page', 2,
+            'cursor'
+        ), data={'columns': COLUMNS_TO_SEND})
+        result = json.loads(response.content)
+        self.assertEqual([r['taxlot_view_id'] for r in result['results']], view_ids[:2])
+        pagination = result['pagination']
+        self.assertTrue(pagination['has_next'])
+        self.assertFalse(pagination['has_previous'])
+        self.assertIsNone(pagination['total'])
+
+        response = self.client.post('/api/v2/taxlots/filter/?{}={}&{}={}&{}={}&{}={}'.format(
+            'organization_id', self.org.pk,
+            'cycle', self.cycle.pk,
+            'per_page', 2,
+            'cursor', pagination['next']
+        ), data={'columns': COLUMNS_TO_SEND})
+        result = json.loads(response.content)
+        self.assertEqual([r['taxlot_view_id'] for r in result['results']], view_ids[2:])
+        self.assertFalse(result['pagination']['has_next'])
+        self.assertTrue(result['pagination']['has_previous'])
+
     def test_get_taxlots_missing_jurisdiction_tax_lot_id(self):
         property_state = self.property_state_factory.get_property_state(extra_data={'extra_data_field': 'edfval'})
         property_property = self.property_factory.get_property(self.org)
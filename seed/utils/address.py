@@ -5,11 +5,28 @@
 :author
 """
 
+import hashlib
 import re
+import threading
+from collections import OrderedDict
 
 import usaddress
 from streetaddress import StreetAddressFormatter
 
+from seed.utils.cache import get_cache_raw_many, set_cache_raw_many
+
+# Number of normalized addresses that each process remembers, and seconds that the normalized
+# addresses are shared with the other processes in the cache. Change the version of the cache
+# when the normalization changes.
+ADDRESS_CACHE_SIZE = 50000
+ADDRESS_CACHE_TIMEOUT = 86400
+ADDRESS_CACHE_VERSION = 1
+
+# Least recently used addresses first
+_normalized_addresses = OrderedDict()
+_normalized_addresses_lock = threading.Lock()
+_MISSING = object()
+
 
 def _normalize_address_direction(direction):
     direction = direction.lower().replace('.', '')
@@ -74,6 +91,27 @@ def _normalize_address_number(address_number):
     return address_number.lstrip("0")
 
 
+def _get_normalized(address_val):
+    with _normalized_addresses_lock:
+        normalized = _normalized_addresses.pop(address_val, _MISSING)
+        if normalized is not _MISSING:
+            _normalized_addresses[address_val] = normalized
+    return normalized
+
+
+def _set_normalized(address_val, normalized):
+    with _normalized_addresses_lock:
+        _normalized_addresses.pop(address_val, None)
+        _normalized_addresses[address_val] = normalized
+        while len(_normalized_addresses) > ADDRESS_CACHE_SIZE:
+            _normalized_addresses.popitem(last=False)
+
+
+def _shared_cache_key(address_val):
+    digest = hashlib.sha1(unicode(address_val).encode('utf-8')).hexdigest()
+    return 'normalized_address__{}__{}'.format(ADDRESS_CACHE_VERSION, digest)
+
+
 def normalize_address_str(address_val):
     """
     Normalize the address to conform to short abbreviations.
@@ -88,6 +126,53 @@ def normalize_address_str(address_val):
     if not address_val:
         return None
 
+    normalized = _get_normalized(address_val)
+    if normalized is _MISSING:
+        normalized = _normalize_address_str(address_val)
+        _set_normalized(address_val, normalized)
+    return normalized
+
+
+def normalize_address_strs(address_vals, shared_cache=True):
+    """
+    Normalize a batch of addresses, eg. the states of a chunk of an import. Each unique address
+    is only normalized once, and with shared_cache the addresses that were normalized by the
+    other processes are read from the cache at once.
+
+    :param address_vals: list of str
+    :param shared_cache: bool, if True then share the normalized addresses with the cache
+    :return: list, the normalized addresses (or None) in the order of address_vals
+    """
+    results = {}
+    missing = set()
+    for address_val in set(val for val in address_vals if val):
+        normalized = _get_normalized(address_val)
+        if normalized is _MISSING:
+            missing.add(address_val)
+        else:
+            results[address_val] = normalized
+
+    if missing and shared_cache:
+        keys = {_shared_cache_key(address_val): address_val for address_val in missing}
+        for key, normalized in get_cache_raw_many(list(keys)).items():
+            address_val = keys[key]
+            results[address_val] = normalized
+            _set_normalized(address_val, normalized)
+            missing.discard(address_val)
+
+    computed = {}
+    for address_val in missing:
+        normalized = results[address_val] = _normalize_address_str(address_val)
+        _set_normalized(address_val, normalized)
+        computed[_shared_cache_key(address_val)] = normalized
+    if computed and shared_cache:
+        set_cache_raw_many(computed, ADDRESS_CACHE_TIMEOUT)
+
+    return [results[val] if val else None for val in address_vals]
+
+
+def _normalize_address_str(address_val):
+    """See normalize_address_str, without the memoization"""
     address_val = unicode(address_val).encode('utf-8')
 
     # Do some string replacements to remove odd characters that we come across
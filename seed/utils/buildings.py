@@ -62,7 +62,8 @@ def get_search_query(user, params):
     )
 
     buildings_queryset = search.filter_other_params(
-        buildings_queryset, other_search_params, mappable_types
+        buildings_queryset, other_search_params, mappable_types,
+        organization_id=search.get_searched_organization_id(params, user.orgs.all())
     )
 
     return buildings_queryset
@@ -20,10 +20,32 @@ def get_cache_raw(key, default=None):
     return django_cache.get(key, default)
 
 
+def set_cache_raw_many(data, timeout=DEFAULT_TIMEOUT):
+    django_cache.set_many(data, timeout)
+
+
+def get_cache_raw_many(keys):
+    return django_cache.get_many(keys)
+
+
+def _get_client(key):
+    """
+    Return the redis client that holds the key along with the key as it is stored in redis. The
+    progress and lock helpers use redis commands directly so that concurrent tasks can update
+    them atomically.
+    """
+    return django_cache.get_client(key, write=True), unicode(django_cache.make_key(key))
+
+
+def _get_timeout(timeout=DEFAULT_TIMEOUT):
+    return django_cache.get_timeout(timeout)
+
+
 def set_cache(progress_key, status, data):
     """
-    Sets the cache key to a pickled dictionary containing at least status and progress.
-    If data is not a dict, it is assumed to be a progress percentage.
+    Sets the progress of the cache key. The progress is stored in a redis hash with the status,
+    the progress percentage (so that it can be incremented atomically) and a pickled dictionary of
+    any other data. If data is not a dict, it is assumed to be a progress percentage.
     """
     if not isinstance(status, str):
         raise ValueError('Invalid value for status; must be a string')
@@ -34,23 +56,47 @@ def set_cache(progress_key, status, data):
     else:
         result = data
     result['status'] = status
-    set_cache_raw(progress_key, result, DEFAULT_TIMEOUT)
+
+    fields = {'status': status}
+    extra_data = dict(result)
+    del extra_data['status']
+    if isinstance(extra_data.get('progress'), (int, long, float)):
+        fields['progress'] = extra_data.pop('progress')
+    if extra_data:
+        fields['data'] = django_cache.prep_value(extra_data)
+
+    client, key = _get_client(progress_key)
+    pipe = client.pipeline()
+    pipe.delete(key)
+    pipe.hmset(key, fields)
+    pipe.expire(key, _get_timeout())
+    pipe.execute()
 
     return result
 
 
 def get_cache(progress_key, default=None):
-    """Unpickles the cache key to a dictionary and resets the timeout"""
+    """Returns the progress of the cache key as a dictionary and resets the timeout"""
     if default is not None:
         if not isinstance(default, dict):
             default = {'status': 'Unknown', 'progress': default}
-    data = get_cache_raw(progress_key, default)
-    if data is None:
+
+    client, key = _get_client(progress_key)
+    pipe = client.pipeline()
+    pipe.hgetall(key)
+    pipe.expire(key, _get_timeout())
+    fields, _ = pipe.execute()
+
+    if not fields:
+        if default is not None:
+            return default
         # Cache accessed before it was created
-        data = {'status': 'parsing', 'progress': 0.0}
-    else:
-        # Set cache to same value to reset timeout
-        set_cache(progress_key, data['status'], data)
+        return {'status': 'parsing', 'progress': 0.0}
+
+    data = django_cache.get_value(fields['data']) if 'data' in fields else {}
+    data['status'] = fields.get('status', 'parsing')
+    if 'progress' in fields:
+        data['progress'] = min(float(fields['progress']), 100.0)
     return data
 
 
@@ -79,14 +125,20 @@ def delete_cache(progress_key):
     django_cache.delete(progress_key)
 
 
-def lock_cache(progress_key, timeout=60):
-    """Set the lock with a default timeout of 1 minute"""
-    set_cache_raw(progress_key, 1, timeout)
+def acquire_lock(lock_key, timeout=60):
+    """
+    Set the lock with a default timeout of 1 minute, unless it is already set. The check and the
+    set are a single redis command, so only one caller can acquire the lock.
+
+    :return: bool, True if the lock was acquired
+    """
+    client, key = _get_client(lock_key)
+    return bool(client.set(key, 1, ex=timeout, nx=True))
 
 
-def unlock_cache(progress_key, timeout=DEFAULT_TIMEOUT):
+def release_lock(lock_key):
     """Unset the lock"""
-    set_cache_raw(progress_key, 0, timeout)
+    delete_cache(lock_key)
 
 
 def get_lock(lock_key, default=0):
@@ -95,18 +147,107 @@ def get_lock(lock_key, default=0):
 
 
 def increment_cache(key, increment):
-    """Increment cache by value increment, never exceed 100."""
+    """
+    Increment the progress of the cache key by value increment, never exceed 100. The increment
+    is atomic, so concurrent tasks can report their progress without losing updates.
+    """
     increment = round(increment, 2)
-    value = get_cache(key)
-    value = float(value['progress'])
-    if value + increment >= 100.0:
-        value = 100.0
-    else:
-        value += increment
 
-    set_cache(key, 'parsing', value)
+    client, redis_key = _get_client(key)
+    pipe = client.pipeline()
+    pipe.hincrbyfloat(redis_key, 'progress', increment)
+    pipe.hset(redis_key, 'status', 'parsing')
+    pipe.expire(redis_key, _get_timeout())
+    value = min(float(pipe.execute()[0]), 100.0)
+
     return {'status': 'parsing', 'progress': value}
 
 
+def append_cache_list(key, value, timeout=DEFAULT_TIMEOUT):
+    """
+    Append a value to the list stored at the cache key and reset the timeout. Appending is a
+    single redis command, so concurrent tasks can add to the same list without losing values.
+    """
+    client, redis_key = _get_client(key)
+    pipe = client.pipeline()
+    pipe.rpush(redis_key, django_cache.prep_value(value))
+    pipe.expire(redis_key, _get_timeout(timeout))
+    pipe.execute()
+
+
+def get_cache_list(key):
+    """Return the values of the list stored at the cache key, or None if it does not exist"""
+    client, redis_key = _get_client(key)
+    values = client.lrange(redis_key, 0, -1)
+    if not values:
+        return None
+    return [django_cache.get_value(value) for value in values]
+
+
+def set_cache_hash_values(key, values, timeout=DEFAULT_TIMEOUT):
+    """
+    Set fields of the hash stored at the cache key and reset the timeout.
+
+    :param key: str, cache key
+    :param values: dict, values by field name
+    """
+    client, redis_key = _get_client(key)
+    pipe = client.pipeline()
+    pipe.hmset(redis_key, {
+        field: django_cache.prep_value(value) for field, value in values.items()
+    })
+    pipe.expire(redis_key, _get_timeout(timeout))
+    pipe.execute()
+
+
+def get_cache_hash_values(key, fields):
+    """
+    Return the values of the fields of the hash stored at the cache key.
+
+    :param key: str, cache key
+    :param fields: list, field names
+    :return: dict, values by field name for the fields that exist
+    """
+    fields = list(fields)
+    if not fields:
+        return {}
+    client, redis_key = _get_client(key)
+    return {
+        field: django_cache.get_value(value)
+        for field, value in zip(fields, client.hmget(redis_key, fields)) if value is not None
+    }
+
+
+def increment_cache_hash(key, increments):
+    """
+    Increment integer fields of the hash stored at the cache key. The increments are atomic and the
+    hash does not expire, so that the counts are kept until they are read with pop_cache_hash.
+
+    :param key: str, cache key
+    :param increments: dict, increment by field name
+    """
+    client, redis_key = _get_client(key)
+    pipe = client.pipeline()
+    for field, increment in increments.items():
+        pipe.hincrby(redis_key, field, increment)
+    pipe.execute()
+
+
+def pop_cache_hash(key):
+    """
+    Return the fields of the hash stored at the cache key and delete it, in a single transaction so
+    that no increment is lost.
+
+    :param key: str, cache key
+    :return: dict, values by field name, both as unicode
+    """
+    client, redis_key = _get_client(key)
+    pipe = client.pipeline()
+    pipe.hgetall(redis_key)
+    pipe.delete(redis_key)
+    values = pipe.execute()[0]
+    return {field.decode('utf-8'): value.decode('utf-8') for field, value in values.items()}
+
+
 def clear_cache():
     django_cache.clear()
@@ -16,6 +16,7 @@ EXCLUDE_FIELDS = [
     'data_state',
     'duplicate',
     'extra_data',
+    'hash_object',
     'id',
     # 'import_file',  # NEED import_file to copy over when we are merging records, leave it in for now.
     'last_modified_by',
@@ -0,0 +1,333 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+import csv
+import os
+import re
+from datetime import timedelta
+
+import xlwt
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from seed.lib.mcm.utils import batch
+from seed.models import (
+    Column,
+    PropertyView,
+    TaxLotProperty,
+    TaxLotView,
+)
+
+INVENTORY_MODELS = {'properties': PropertyView, 'taxlots': TaxLotView}
+
+# Number of views whose related data are fetched and written at once
+EXPORT_BATCH_SIZE = 500
+
+DEFAULT_EXPORT_COLUMNS = [
+    'pm_property_id', 'pm_parent_property_id', 'tax_jurisdiction_tax_lot_id', 'ubid',
+    'custom_id_1', 'tax_custom_id_1', 'city', 'state', 'postal_code',
+    'tax_primary', 'property_name', 'campus', 'gross_floor_area',
+    'use_description', 'energy_score', 'site_eui', 'property_notes',
+    'property_type', 'year_ending', 'owner', 'owner_email', 'owner_telephone',
+    'building_count', 'year_built', 'recent_sale_date', 'conditioned_floor_area',
+    'occupied_floor_area', 'owner_address', 'owner_city_state', 'owner_postal_code',
+    'home_energy_score_id', 'generation_date', 'release_date',
+    'source_eui_weather_normalized', 'site_eui_weather_normalized', 'source_eui',
+    'energy_alerts', 'space_alerts', 'building_certification', 'number_properties',
+    'block_number', 'district', 'BLDGS', 'property_state_id', 'taxlot_state_id',
+    'property_view_id', 'taxlot_view_id'
+]
+
+# Directory of the files of the background exports in the default storage, the files are in
+# <organization id>/<export id>/ so that they are only served to the organization's members
+EXPORTS_DIR = 'exports'
+
+# Time that the files of the background exports are kept
+EXPORT_MAX_AGE = timedelta(days=1)
+
+EXPORT_ID_REGEX = re.compile(r'^[0-9a-f]{32}$')
+
+# Limits of the xls format
+XLS_MAX_ROWS = 65536
+XLS_MAX_CELL_LENGTH = 32767
+
+
+class Echo(object):
+    """
+    Object with the write method of a file that returns the written value instead of buffering it,
+    so that a csv writer can be used to generate the lines of a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _xls_value(value):
+    """Return a value that xlwt can write in a cell"""
+    if value is None or isinstance(value, (bool, int, long, float)):
+        return value
+    return unicode(value)[:XLS_MAX_CELL_LENGTH]
+
+
+def get_export_path(organization_id, export_id, filename=''):
+    """Return the path of the directory, or of the file, of an export in the default storage"""
+    return os.path.join(EXPORTS_DIR, str(organization_id), export_id, os.path.basename(filename))
+
+
+def find_export(organization_id, export_id):
+    """
+    Return the path of the file of an export of the organization in the default storage, or None
+    if there is no such file, e.g. because it was deleted by delete_old_exports.
+    """
+    if not EXPORT_ID_REGEX.match(export_id or ''):
+        return None
+    directory = get_export_path(organization_id, export_id)
+    try:
+        files = default_storage.listdir(directory)[1]
+    except OSError:
+        return None
+    return os.path.join(directory, files[0]) if files else None
+
+
+def delete_old_exports(max_age=EXPORT_MAX_AGE):
+    """
+    Delete the files of the background exports that are older than max_age.
+
+    :param max_age: timedelta
+    :return: int, number of deleted files
+    """
+    oldest = timezone.now() - max_age
+    count = 0
+    try:
+        organization_dirs = default_storage.listdir(EXPORTS_DIR)[0]
+    except OSError:
+        return count
+    for organization_dir in organization_dirs:
+        organization_dir = os.path.join(EXPORTS_DIR, organization_dir)
+        for export_dir in default_storage.listdir(organization_dir)[0]:
+            export_dir = os.path.join(organization_dir, export_dir)
+            for filename in default_storage.listdir(export_dir)[1]:
+                path = os.path.join(export_dir, filename)
+                if default_storage.get_modified_time(path) < oldest:
+                    default_storage.delete(path)
+                    count += 1
+            _remove_empty_dir(export_dir)
+    return count
+
+
+def _remove_empty_dir(path):
+    """Remove an empty directory of a storage that has directories, e.g. FileSystemStorage"""
+    try:
+        os.rmdir(default_storage.path(path))
+    except (NotImplementedError, OSError):
+        pass
+
+
+class InventoryExport(object):
+    """
+    Rows of an export of properties or tax lots with their related tax lots or properties. The
+    rows are generated in batches of views, so the memory used does not depend on the number of
+    exported views.
+    """
+
+    def __init__(self, organization_id, inventory_type, columns=None, ids=None):
+        """
+        :param organization_id: int, id of the organization
+        :param inventory_type: str, properties or taxlots (as defined by the inventory list page)
+        :param columns: list, columns to export (as defined by the frontend)
+        :param ids: list, ids of the properties or taxlots (not views) to export, in order
+        """
+        self.organization_id = organization_id
+        self.view_klass = INVENTORY_MODELS[inventory_type]
+        self.ids = ids or []
+        self.columns = list(columns if columns is not None else DEFAULT_EXPORT_COLUMNS)
+
+        # Grab all the columns and create a column name lookup
+        col_inventory_type = 'property' if inventory_type == 'properties' else 'taxlot'
+        catalog = Column.retrieve_catalog(organization_id, col_inventory_type, False)
+        # make the csv header
+        self.header = []
+        for c in self.columns:
+            column = catalog.get(c)
+            if column:
+                self.header.append(column['displayName'])
+            else:
+                self.header.append(c)
+
+        select_related = ['state', 'cycle']
+        if hasattr(self.view_klass, 'property'):
+            select_related.append('property')
+            self.id_field = 'property__id'
+            filter_str = {'property__organization_id': organization_id}
+            # always export the labels
+            self.columns += ['property_labels']
+            self.header.append('Property Labels')
+
+        elif hasattr(self.view_klass, 'taxlot'):
+            select_related.append('taxlot')
+            self.id_field = 'taxlot__id'
+            filter_str = {'taxlot__organization_id': organization_id}
+            # always export the labels
+            self.columns += ['taxlot_labels']
+            self.header.append('Tax Lot Labels')
+
+        self.model_views = self.view_klass.objects.select_related(*select_related).filter(
+            **filter_str).order_by('id')
+
+    def count(self):
+        """Return the number of exported views"""
+        if self.ids:
+            return self.model_views.filter(**{self.id_field + '__in': self.ids}).count()
+        return self.model_views.count()
+
+    def _view_batches(self):
+        """Generate the views in batches, in the order of the ids if there are any"""
+        if self.ids:
+            # force the data into the same order as the IDs
+            for ids in batch(self.ids, EXPORT_BATCH_SIZE):
+                views = list(self.model_views.filter(**{self.id_field + '__in': ids}))
+                if views:
+                    yield views
+        else:
+            # seek by id instead of offsetting
+            last_id = None
+            while True:
+                views = self.model_views
+                if last_id is not None:
+                    views = views.filter(id__gt=last_id)
+                views = list(views[:EXPORT_BATCH_SIZE])
+                if not views:
+                    break
+                yield views
+                last_id = views[-1].id
+
+    def batches(self):
+        """
+        Generate the rows of the export in batches.
+
+        :return: generator of lists of rows, in the order of the columns
+        """
+        order_dict = {obj_id: index for index, obj_id in enumerate(self.ids)}
+        for views in self._view_batches():
+            # get the data in a dict which includes the related data
+            data = TaxLotProperty.get_related(views, self.columns)
+
+            if self.ids:
+                data.sort(key=lambda x: order_dict[x['id']])  # x is the property/taxlot object
+
+            yield [self.get_row(datum) for datum in data]
+
+    def iter_csv(self):
+        """
+        Generate the lines of the export as csv, for a StreamingHttpResponse.
+
+        :return: generator of str
+        """
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.header)
+        for rows in self.batches():
+            # join the lines of a batch to send fewer, larger chunks
+            yield ''.join(writer.writerow(row) for row in rows)
+
+    def write_csv(self, f, progress=None):
+        """
+        Write the export as csv.
+
+        :param f: file object opened for writing
+        :param progress: callable, called with the number of rows written after each batch
+        :return: int, number of rows written
+        """
+        writer = csv.writer(f)
+        writer.writerow(self.header)
+        count = 0
+        for rows in self.batches():
+            writer.writerows(rows)
+            count += len(rows)
+            if progress:
+                progress(len(rows))
+        return count
+
+    def write_xls(self, f, progress=None):
+        """
+        Write the export as an xls workbook. The rows are split in several sheets, each with the
+        header, when they do not fit in one.
+
+        :param f: file object opened for writing
+        :param progress: callable, called with the number of rows written after each batch
+        :return: int, number of rows written
+        """
+        workbook = xlwt.Workbook(encoding='utf-8')
+        sheets = []
+        sheet_row = XLS_MAX_ROWS
+        count = 0
+        for rows in self.batches():
+            for row in rows:
+                if sheet_row >= XLS_MAX_ROWS:
+                    if sheets:
+                        sheets[-1].flush_row_data()
+                    sheets.append(self._add_xls_sheet(workbook, len(sheets) + 1))
+                    sheet_row = 1
+                for column, value in enumerate(row):
+                    sheets[-1].write(sheet_row, column, _xls_value(value))
+                sheet_row += 1
+            # serialize the rows of the batch to free their cells
+            sheets[-1].flush_row_data()
+            count += len(rows)
+            if progress:
+                progress(len(rows))
+
+        if not sheets:
+            self._add_xls_sheet(workbook, 1)
+        workbook.save(f)
+        return count
+
+    def _add_xls_sheet(self, workbook, number):
+        sheet = workbook.add_sheet('Sheet {}'.format(number))
+        for column, value in enumerate(self.header):
+            sheet.write(0, column, _xls_value(value))
+        return sheet
+
+    def get_row(self, datum):
+        """
+        Return the values of the columns of one result of TaxLotProperty.get_related.
+
+        The front end returns columns with prepended tax_ and property_ columns for the
+        related fields. This is an expensive operation and can cause issues with stripping
+        off property_ from items such as property_name, property_notes, and property_type
+        which are explicitly excluded below. Note that the labels are in the property_labels
+        column and are returned by the TaxLotProperty.get_related method.
+
+        :param datum: dict
+        :return: list
+        """
+        row = []
+        for column in self.columns:
+            if column in ['property_name', 'property_notes', 'property_type', 'property_labels']:
+                row.append(datum.get(column, None))
+            elif column.startswith('tax_'):
+                # There are times when there are duplicate column names in tax/property
+                if datum.get('related') and len(datum['related']) > 0:
+                    # Looks like related returns a list. Is this as expected?
+                    row.append(datum['related'][0].get(re.sub(r'^tax_', '', column), None))
+                else:
+                    row.append(None)
+            elif column.startswith('property_'):
+                # There are times when there are duplicate column names in tax/property
+                if datum.get('related') and len(datum['related']) > 0:
+                    # Looks like related returns a list. Is this as expected?
+                    row.append(datum['related'][0].get(re.sub(r'^property_', '', column), None))
+                else:
+                    row.append(None)
+            else:
+                # check if the data is in the normal section of the result, if not, then try to grab it from
+                # the related section. There shouldn't be any duplicates here because the former two
+                # if methods will grab those instances.
+                result = datum.get(column, None)
+                if not result:
+                    if datum.get('related'):
+                        result = datum['related'][0].get(column, None)
+                row.append(result)
+        return row
@@ -0,0 +1,108 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+
+import datetime
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models
+from django.utils import timezone
+
+_comparison_fields = []
+
+
+def get_comparison_fields():
+    """
+    Return the sorted names of the fields that are compared when hashing a state. The list is
+    built on first use because the mapping data is derived from the models, which in turn hash
+    their states when they are saved.
+
+    :return: list of field names
+    """
+    if not _comparison_fields:
+        from seed.lib.mappings.mapping_data import MappingData
+
+        fields = set(field['name'] for field in MappingData().data)
+        # Make sure that the import_file isn't part of the hash, as the import_file filename always
+        # has random characters appended to it in the uploads directory
+        fields.discard('import_file')
+        _comparison_fields.extend(sorted(fields))
+
+    return _comparison_fields
+
+
+def get_stored_value(obj, field):
+    """
+    Return the value of the field as it will be read back from the database, so that the hash of
+    a state is the same before and after it is saved (e.g. a datetime in a date field, a float in
+    an integer field or a quantity in other units than the field's).
+
+    :param obj: model instance
+    :param field: str, name of the field
+    :return: value
+    """
+    value = getattr(obj, field)
+    if value is None or not hasattr(obj, '_meta'):
+        return value
+
+    try:
+        model_field = obj._meta.get_field(field)
+        value = model_field.get_prep_value(value)
+        if isinstance(model_field, models.FloatField) and value is not None:
+            # quantities are stored as floats in the field's units
+            value = float(value)
+        value = model_field.to_python(value)
+    except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+        return value
+
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        value = value.astimezone(timezone.utc)
+
+    return value
+
+
+def _to_bytes(value):
+    """
+    Return the value as a byte string for the hash. The unicode values are encoded to utf-8, str()
+    only encodes ascii, and the ascii values hash the same either way.
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def hash_state_object(obj, include_extra_data=True):
+    def _get_field_from_obj(field_obj, field):
+        if not hasattr(field_obj, field):
+            return "FOO"  # Return a random value so we can distinguish between this and None.
+        else:
+            return get_stored_value(field_obj, field)
+
+    m = hashlib.md5()
+
+    for f in get_comparison_fields():
+        obj_val = _get_field_from_obj(obj, f)
+        m.update(_to_bytes(f))
+        m.update(_to_bytes(obj_val))
+        # print "{}: {} -> {}".format(field, obj_val, m.hexdigest())
+
+    if include_extra_data:
+        add_dictionary_repr_to_hash(m, obj.extra_data)
+
+    return m.hexdigest()
+
+
+def add_dictionary_repr_to_hash(hash_obj, dict_obj):
+    assert isinstance(dict_obj, dict)
+
+    for (key, value) in sorted(dict_obj.items(), key=lambda x_y: x_y[0]):
+        if isinstance(value, dict):
+            add_dictionary_repr_to_hash(hash_obj, value)
+        else:
+            hash_obj.update(_to_bytes(key))
+            hash_obj.update(_to_bytes(value))
+    return hash_obj
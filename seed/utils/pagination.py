@@ -9,10 +9,19 @@ required approvals from the U.S. Department of Energy) and contributors.
 All rights reserved.  # NOQA
 :author
 """
+import base64
+import json
 from collections import OrderedDict
+
+from django.db.models import Q
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
+from seed.utils.cache import get_cache_raw, set_cache_raw
+
+# Cache the total count of the cursor paginated lists for 5 minutes
+CURSOR_COUNT_TIMEOUT = 300
+
 
 class ResultsListPagination(PageNumberPagination):
     page_size_query_param = 'per_page'
@@ -30,3 +39,131 @@ class ResultsListPagination(PageNumberPagination):
             ('total', self.page.paginator.count),
             ('results', data)
         ]))
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage(object):
+    """Page of a CursorPaginator"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(object):
+    """
+    Paginate a queryset by seeking to the position (order field, id) of the last returned object
+    instead of using an offset, so that every page costs the same and no count is needed. The
+    position is returned as opaque next and previous cursors.
+
+    The order field must not be null.
+    """
+
+    def __init__(self, object_list, per_page, order_field='id'):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        if self.per_page < 1:
+            raise ValueError('per_page must be a positive integer')
+        self.order_field = order_field
+
+    def _get_position_fields(self):
+        if self.order_field == 'id':
+            return ['id']
+        return [self.order_field, 'id']
+
+    def _get_position(self, obj):
+        return [getattr(obj, field) for field in self._get_position_fields()]
+
+    def encode_cursor(self, obj, reverse):
+        return base64.urlsafe_b64encode(
+            json.dumps({'position': self._get_position(obj), 'reverse': reverse})
+        )
+
+    def decode_cursor(self, cursor):
+        """
+        :param cursor: str, cursor returned with a previous page
+        :return: tuple, (position, reverse)
+        """
+        try:
+            data = json.loads(base64.urlsafe_b64decode(str(cursor)))
+            position, reverse = data['position'], bool(data['reverse'])
+            if len(position) != len(self._get_position_fields()):
+                raise ValueError('Invalid position')
+        except (TypeError, ValueError, KeyError):
+            raise InvalidCursor('Invalid cursor')
+        return position, reverse
+
+    def _seek(self, position, reverse):
+        lookup = 'lt' if reverse else 'gt'
+        if self.order_field == 'id':
+            return Q(**{'id__' + lookup: position[0]})
+        value, pk = position
+        return Q(**{self.order_field + '__' + lookup: value}) | Q(**{
+            self.order_field: value, 'id__' + lookup: pk
+        })
+
+    def page(self, cursor=None):
+        """
+        Return the page after the cursor, or before it if it is a previous cursor, or the first
+        page if there is no cursor.
+
+        :param cursor: str, next or previous cursor of another page
+        :return: CursorPage
+        """
+        position, reverse = None, False
+        if cursor:
+            position, reverse = self.decode_cursor(cursor)
+
+        ordering = self._get_position_fields()
+        if reverse:
+            ordering = ['-' + field for field in ordering]
+        queryset = self.object_list.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek(position, reverse))
+
+        # fetch an extra object to know if there is another page in the same direction
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if reverse:
+            objects.reverse()
+
+        # Going forward, there are previous objects if the page started at a cursor. Going
+        # backward, there are next objects.
+        if reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        next_cursor = previous_cursor = None
+        if objects and has_next:
+            next_cursor = self.encode_cursor(objects[-1], False)
+        if objects and has_previous:
+            previous_cursor = self.encode_cursor(objects[0], True)
+        return CursorPage(objects, next_cursor, previous_cursor)
+
+
+def get_cached_count(queryset, cache_key):
+    """
+    Return the number of objects in the queryset, cached for a few minutes so that paging through
+    a large list does not count it for every page.
+
+    :param queryset: QuerySet
+    :param cache_key: str, key identifying the list (e.g. the organization, cycle and filters)
+    :return: int
+    """
+    count = get_cache_raw(cache_key)
+    if count is None:
+        count = queryset.count()
+        set_cache_raw(cache_key, count, CURSOR_COUNT_TIMEOUT)
+    return count
@@ -0,0 +1,281 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2018, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+import hashlib
+from uuid import uuid4
+
+from django.db import transaction
+from django.db.models import (
+    Aggregate,
+    Case,
+    Count,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    Func,
+    IntegerField,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Greatest, Least, Lower
+from quantityfield.fields import QuantityField
+
+from seed.models import PropertyState, PropertyView
+from seed.serializers.pint import DisplayUnitConverter
+from seed.utils.cache import get_cache_raw, set_cache_raw
+
+# Seconds that the report data are cached, they are also invalidated when the inventory changes
+REPORT_CACHE_TIMEOUT = 86400
+
+# Version of the format of the cached report data, change it when the data change
+REPORT_CACHE_VERSION = 1
+
+FLOOR_AREA_BIN_SIZE = 100000
+FLOOR_AREA_BINS = {
+    0: '0-99k',
+    100000: '100-199k',
+    200000: '200k-299k',
+    300000: '300k-399k',
+    400000: '400-499k',
+    500000: '500-599k',
+    600000: '600-699k',
+    700000: '700-799k',
+    800000: '800-899k',
+    900000: '900-999k',
+    1000000: 'over 1,000k',
+}
+
+
+class Median(Aggregate):
+    """Median of the values, computed by the database with percentile_cont"""
+    function = 'percentile_cont'
+    name = 'Median'
+    template = '%(function)s(0.5) WITHIN GROUP (ORDER BY %(expressions)s)'
+
+    def __init__(self, expression, **extra):
+        super(Median, self).__init__(expression, output_field=FloatField(), **extra)
+
+
+def _version_key(name, pk):
+    return 'property_report_version__{}__{}'.format(name, pk)
+
+
+def _get_version(name, pk):
+    version = get_cache_raw(_version_key(name, pk))
+    if version is None:
+        version = _set_version(name, pk)
+    return version
+
+
+def _set_version(name, pk):
+    version = uuid4().hex
+    set_cache_raw(_version_key(name, pk), version, REPORT_CACHE_TIMEOUT)
+    return version
+
+
+def _invalidate_on_commit(name, pk):
+    """
+    Change the version now and once the transaction is committed, so that report data computed
+    from the inventory before the commit are not kept.
+    """
+    if pk is None:
+        return
+    _set_version(name, pk)
+    transaction.on_commit(lambda: _set_version(name, pk))
+
+
+def invalidate_cycle_reports(cycle_id):
+    """Compute the report data of the cycle again, eg. when the views of the cycle change"""
+    _invalidate_on_commit('cycle', cycle_id)
+
+
+def invalidate_organization_reports(organization_id):
+    """Compute the report data of all the cycles of the organization again"""
+    _invalidate_on_commit('organization', organization_id)
+
+
+class PropertyReport(object):
+    """
+    Data of the property reports of an organization for a set of cycles. The counts, the points
+    and the medians are computed by the database, and the results are cached until the views of
+    one of the cycles, or the properties and states of the organization, change.
+    """
+
+    def __init__(self, organization, cycles, x_var, y_var, campus_only):
+        """
+        :param organization: Organization
+        :param cycles: list, Cycles ordered by start
+        :param x_var: str, field of the PropertyState on the x axis
+        :param y_var: str, field of the PropertyState on the y axis
+        :param campus_only: bool, if True then include the campuses with the other properties
+        """
+        self.organization = organization
+        self.cycles = list(cycles)
+        self.x_var = x_var
+        self.y_var = y_var
+        self.campus_only = bool(campus_only)
+        self.converter = DisplayUnitConverter(organization)
+
+    def cache_key(self, name):
+        """Return the cache key of the data for the current version of the inventory"""
+        parts = [
+            REPORT_CACHE_VERSION, name, self.x_var, self.y_var, self.campus_only,
+            sorted(self.converter.pint_specs.items()), self.converter.significant_figures,
+            _get_version('organization', self.organization.pk),
+        ]
+        parts.extend((cycle.pk, _get_version('cycle', cycle.pk)) for cycle in self.cycles)
+        digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+        return 'property_report__{}__{}'.format(self.organization.pk, digest)
+
+    def _cached(self, name, compute):
+        key = self.cache_key(name)
+        data = get_cache_raw(key)
+        if data is None:
+            data = compute()
+            set_cache_raw(key, data, REPORT_CACHE_TIMEOUT)
+        return data
+
+    def get_views(self):
+        views = PropertyView.objects.filter(
+            property__organization_id=self.organization.pk,
+            cycle_id__in=[cycle.pk for cycle in self.cycles],
+        )
+        if not self.campus_only:
+            views = views.filter(property__campus=False)
+        return views
+
+    @staticmethod
+    def _has_value(var):
+        """Return the condition for a field of the state to have a (truthy) value"""
+        field = PropertyState._meta.get_field(var)
+        empty = '' if field.get_internal_type() in ('CharField', 'TextField') else 0
+        return Q(**{'state__{}__isnull'.format(var): False}) & ~Q(**{'state__{}'.format(var): empty})
+
+    def _has_data(self):
+        return self._has_value(self.x_var) & self._has_value(self.y_var)
+
+    def _display_value(self, var):
+        """Return the expression of a field of the state, in the display units for quantities"""
+        field = PropertyState._meta.get_field(var)
+        if isinstance(field, QuantityField):
+            return ExpressionWrapper(
+                F('state__{}'.format(var)) * Value(self.converter.get_field_factor(field.units)),
+                output_field=FloatField()
+            )
+        return F('state__{}'.format(var))
+
+    def _round(self, value):
+        field = PropertyState._meta.get_field(self.x_var)
+        if value is not None and isinstance(field, QuantityField):
+            return round(value, self.converter.significant_figures)
+        return value
+
+    def get_property_counts(self):
+        """
+        Return the number of properties and of properties with data of each cycle.
+
+        :return: list of dict, in the order of the cycles
+        """
+        counts = {
+            c['cycle_id']: c
+            for c in self.get_views().values('cycle_id').annotate(
+                num_properties=Count('id'),
+                num_properties_with_data=Count(Case(When(self._has_data(), then=Value(1)))),
+            ).order_by()
+        }
+        property_counts = []
+        for cycle in self.cycles:
+            count = counts.get(cycle.pk, {})
+            property_counts.append({
+                'yr_e': cycle.end.strftime('%Y'),
+                'num_properties': count.get('num_properties', 0),
+                'num_properties_w-data': count.get('num_properties_with_data', 0),
+            })
+        return property_counts
+
+    def _compute_chart_data(self):
+        years = {cycle.pk: cycle.end.strftime('%Y') for cycle in self.cycles}
+        cycle_order = {cycle.pk: index for index, cycle in enumerate(self.cycles)}
+        x_field = 'state__{}'.format(self.x_var)
+        y_field = 'state__{}'.format(self.y_var)
+        points = self.get_views().filter(self._has_data()).values_list(
+            'cycle_id', 'property_id', x_field, y_field
+        ).order_by('id')
+
+        chart_data = []
+        for cycle_id, property_id, x, y in sorted(points, key=lambda p: cycle_order[p[0]]):
+            chart_data.append(self.converter.apply({
+                'id': property_id,
+                'x': x,
+                'y': y,
+                'yr_e': years[cycle_id],
+            }))
+        return chart_data
+
+    def get_data(self):
+        """
+        Return the points of the report.
+
+        :return: dict, property_counts and chart_data
+        """
+        return self._cached('data', lambda: {
+            'property_counts': self.get_property_counts(),
+            'chart_data': self._compute_chart_data(),
+        })
+
+    def _bucket(self):
+        """Return the expression of the group of the y variable, and the function of its label"""
+        if self.y_var == 'use_description':
+            return Lower('state__use_description'), lambda use: use.capitalize()
+        elif self.y_var == 'year_built':
+            # decades, eg. 1990-1999
+            return (
+                ExpressionWrapper(F('state__year_built') / Value(10) * Value(10),
+                                  output_field=IntegerField()),
+                lambda decade: '%s-%s9' % (decade, str(decade)[:-1]),
+            )
+        elif self.y_var == 'gross_floor_area':
+            # bins of floor area, anything greater than the biggest bin is in the biggest bin
+            floor = Func(self._display_value('gross_floor_area') / Value(FLOOR_AREA_BIN_SIZE),
+                         function='FLOOR', output_field=FloatField())
+            return (
+                Cast(Least(Value(max(FLOOR_AREA_BINS)),
+                           Greatest(Value(0), floor * Value(FLOOR_AREA_BIN_SIZE))),
+                     IntegerField()),
+                lambda range_floor: FLOOR_AREA_BINS[range_floor],
+            )
+        raise ValueError('Cannot aggregate by {}'.format(self.y_var))
+
+    def _compute_aggregated_chart_data(self):
+        years = {cycle.pk: cycle.end.strftime('%Y') for cycle in self.cycles}
+        cycle_order = {cycle.pk: index for index, cycle in enumerate(self.cycles)}
+        bucket, label = self._bucket()
+        groups = self.get_views().filter(self._has_data()).annotate(
+            report_bucket=bucket
+        ).values('cycle_id', 'report_bucket').annotate(
+            median=Median(self._display_value(self.x_var))
+        ).order_by('report_bucket')
+
+        chart_data = []
+        for group in sorted(groups, key=lambda g: cycle_order[g['cycle_id']]):
+            chart_data.append({
+                'x': self._round(group['median']),
+                'y': label(group['report_bucket']),
+                'yr_e': years[group['cycle_id']],
+            })
+        return chart_data
+
+    def get_aggregated_data(self):
+        """
+        Return the median of the x variable for each cycle and group of the y variable.
+
+        :return: dict, property_counts and chart_data
+        """
+        return self._cached('aggregated_data', lambda: {
+            'property_counts': self.get_property_counts(),
+            'chart_data': self._compute_aggregated_chart_data(),
+        })
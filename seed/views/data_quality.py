@@ -7,7 +7,7 @@
 
 import csv
 from celery.utils.log import get_task_logger
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework import viewsets, serializers, status
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import list_route, detail_route
@@ -25,11 +25,45 @@ from seed.models.data_quality import (
     DataQualityCheck,
 )
 from seed.utils.api import api_endpoint_class
-from seed.utils.cache import get_cache_raw
+from seed.utils.export import Echo
 
 logger = get_task_logger(__name__)
 
 
+def _iter_results_csv(data_quality_results):
+    """
+    Generate the lines of the csv of the data quality results, for a StreamingHttpResponse.
+
+    :param data_quality_results: iterator of dicts, or None
+    :return: generator of str
+    """
+    writer = csv.writer(Echo())
+    if data_quality_results is None:
+        yield writer.writerow(['Error'])
+        yield writer.writerow(['data quality results not found'])
+        return
+
+    yield writer.writerow(
+        ['Table', 'Address Line 1', 'PM Property ID', 'Tax Lot ID', 'Custom ID', 'Field',
+         'Error Message', 'Severity'])
+
+    for row in data_quality_results:
+        # the lines of a row are sent together
+        yield ''.join(
+            writer.writerow([
+                row['data_quality_results'][0]['table_name'],
+                row['address_line_1'],
+                row['pm_property_id'] if 'pm_property_id' in row else None,
+                row['jurisdiction_tax_lot_id'] if 'jurisdiction_tax_lot_id' in row else None,
+                row['custom_id_1'],
+                result['formatted_field'],
+                result['detailed_message'],
+                result['severity']
+            ])
+            for result in row['data_quality_results']
+        )
+
+
 class RulesSubSerializer(serializers.Serializer):
     field = serializers.CharField(max_length=100)
     severity = serializers.CharField(max_length=100)
@@ -155,33 +189,10 @@ class DataQualityViews(viewsets.ViewSet):
               required: true
               paramType: path
         """
-        data_quality_results = get_cache_raw(DataQualityCheck.cache_key(pk))
-        response = HttpResponse(content_type='text/csv')
+        # the lines are written as the response is sent
+        response = StreamingHttpResponse(
+            _iter_results_csv(DataQualityCheck.retrieve_results(pk)), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="Data Quality Check Results.csv"'
-
-        writer = csv.writer(response)
-        if data_quality_results is None:
-            writer.writerow(['Error'])
-            writer.writerow(['data quality results not found'])
-            return response
-
-        writer.writerow(
-            ['Table', 'Address Line 1', 'PM Property ID', 'Tax Lot ID', 'Custom ID', 'Field',
-             'Error Message', 'Severity'])
-
-        for row in data_quality_results:
-            for result in row['data_quality_results']:
-                writer.writerow([
-                    row['data_quality_results'][0]['table_name'],
-                    row['address_line_1'],
-                    row['pm_property_id'] if 'pm_property_id' in row else None,
-                    row['jurisdiction_tax_lot_id'] if 'jurisdiction_tax_lot_id' in row else None,
-                    row['custom_id_1'],
-                    result['formatted_field'],
-                    result['detailed_message'],
-                    result['severity']
-                ])
-
         return response
 
     @api_endpoint_class
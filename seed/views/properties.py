@@ -48,7 +48,7 @@ from seed.models import (
 from seed.models import Property as PropertyModel
 from seed.serializers.pint import PintJSONEncoder
 from seed.serializers.pint import (
-    apply_display_unit_preferences,
+    DisplayUnitConverter,
     add_pint_unit_suffix
 )
 from seed.serializers.properties import (
@@ -61,6 +61,7 @@ from seed.serializers.taxlots import (
     TaxLotViewSerializer,
 )
 from seed.utils.api import api_endpoint_class
+from seed.utils.pagination import CursorPaginator, InvalidCursor, get_cached_count
 from seed.utils.properties import (
     get_changed_fields,
     pair_unpair_property_taxlot,
@@ -232,36 +233,59 @@ class PropertyViewSet(GenericViewSet):
             .filter(property__organization_id=org_id, cycle=cycle) \
             .order_by('id')
 
-        paginator = Paginator(property_views_list, per_page)
-
-        try:
-            property_views = paginator.page(page)
-            page = int(page)
-        except PageNotAnInteger:
-            property_views = paginator.page(1)
-            page = 1
-        except EmptyPage:
-            property_views = paginator.page(paginator.num_pages)
-            page = paginator.num_pages
+        if 'cursor' in request.query_params:
+            # seek by id instead of counting and offsetting, see CursorPaginator
+            try:
+                paginator = CursorPaginator(property_views_list, per_page)
+                property_views_page = paginator.page(request.query_params['cursor'])
+            except (ValueError, InvalidCursor) as e:
+                return JsonResponse({'status': 'error', 'message': str(e)},
+                                    status=status.HTTP_400_BAD_REQUEST)
+            property_views = property_views_page.object_list
+            pagination = {
+                'per_page': paginator.per_page,
+                'next': property_views_page.next_cursor,
+                'previous': property_views_page.previous_cursor,
+                'has_next': property_views_page.has_next(),
+                'has_previous': property_views_page.has_previous(),
+                'total': None
+            }
+            if request.query_params.get('count') == 'true':
+                pagination['total'] = get_cached_count(
+                    property_views_list, 'inventory_count__PropertyView__{}__{}'.format(org_id, cycle.id)
+                )
+        else:
+            paginator = Paginator(property_views_list, per_page)
+
+            try:
+                property_views = paginator.page(page)
+                page = int(page)
+            except PageNotAnInteger:
+                property_views = paginator.page(1)
+                page = 1
+            except EmptyPage:
+                property_views = paginator.page(paginator.num_pages)
+                page = paginator.num_pages
+
+            pagination = {
+                'page': page,
+                'start': property_views.start_index(),
+                'end': property_views.end_index(),
+                'num_pages': paginator.num_pages,
+                'has_next': property_views.has_next(),
+                'has_previous': property_views.has_previous(),
+                'total': paginator.count
+            }
 
         related_results = TaxLotProperty.get_related(property_views, columns)
 
         # collapse units here so we're only doing the last page; we're already a
         # realized list by now and not a lazy queryset
         org = Organization.objects.get(pk=org_id)
-        unit_collapsed_results = \
-            [apply_display_unit_preferences(org, x) for x in related_results]
+        unit_collapsed_results = DisplayUnitConverter(org).apply_all(related_results)
 
         response = {
-            'pagination': {
-                'page': page,
-                'start': paginator.page(page).start_index(),
-                'end': paginator.page(page).end_index(),
-                'num_pages': paginator.num_pages,
-                'has_next': paginator.page(page).has_next(),
-                'has_previous': paginator.page(page).has_previous(),
-                'total': paginator.count
-            },
+            'pagination': pagination,
             'cycle_id': cycle.id,
             'results': unit_collapsed_results
         }
@@ -321,6 +345,15 @@ class PropertyViewSet(GenericViewSet):
               description: The number of items per page to return
               required: false
               paramType: query
+            - name: cursor
+              description: Page through the properties with cursors instead of page numbers. Empty
+                           for the first page, then the next or previous cursor of a page
+              required: false
+              paramType: query
+            - name: count
+              description: Include the total number of properties when paging with cursors (true/false)
+              required: false
+              paramType: query
         """
         return self._get_filtered_results(request, columns=[])
 
@@ -349,6 +382,15 @@ class PropertyViewSet(GenericViewSet):
               description: The number of items per page to return
               required: false
               paramType: query
+            - name: cursor
+              description: Page through the properties with cursors instead of page numbers. Empty
+                           for the first page, then the next or previous cursor of a page
+              required: false
+              paramType: query
+            - name: count
+              description: Include the total number of properties when paging with cursors (true/false)
+              required: false
+              paramType: query
             - name: column filter data
               description: Object containing columns to filter on, should be a JSON object with a single key "columns"
                            whose value is a list of strings, each representing a column name
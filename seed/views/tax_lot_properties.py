@@ -8,34 +8,31 @@ All rights reserved.  # NOQA
 :author
 """
 
-import csv
-import re
+import mimetypes
+import os
+from uuid import uuid4
 
-from django.http import JsonResponse, HttpResponse
+from django.core.files.storage import default_storage
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from rest_framework import status
 from rest_framework.decorators import list_route
 from rest_framework.renderers import JSONRenderer
 from rest_framework.viewsets import GenericViewSet
 
-from seed.decorators import ajax_request_class
+from seed.decorators import ajax_request_class, get_prog_key
 from seed.lib.superperms.orgs.decorators import has_perm_class
-from seed.models import (
-    Column,
-    PropertyView,
-    TaxLotProperty,
-    TaxLotView,
-)
 from seed.serializers.tax_lot_properties import (
     TaxLotPropertySerializer
 )
+from seed.tasks import EXPORT_TYPES, export_inventory
 from seed.utils.api import api_endpoint_class
-
-INVENTORY_MODELS = {'properties': PropertyView, 'taxlots': TaxLotView}
+from seed.utils.export import INVENTORY_MODELS, InventoryExport, find_export
 
 
 class TaxLotPropertyViewSet(GenericViewSet):
     """
     The TaxLotProperty field is used to return the properties and tax lots from the join table.
-    This method presently only works with the CSV, but should eventually be extended to be the
+    This method presently only works with the exports, but should eventually be extended to be the
     viewset for any tax lot / property join API call.
     """
     renderer_classes = (JSONRenderer,)
@@ -86,117 +83,136 @@ class TaxLotPropertyViewSet(GenericViewSet):
         if not cycle_pk:
             return JsonResponse(
                 {'status': 'error', 'message': 'Must pass in cycle_id as query parameter'})
-        columns = request.data.get('columns', None)
-        if columns is None:
-            # default the columns for now if no columns are passed
-            columns = [
-                'pm_property_id', 'pm_parent_property_id', 'tax_jurisdiction_tax_lot_id', 'ubid',
-                'custom_id_1', 'tax_custom_id_1', 'city', 'state', 'postal_code',
-                'tax_primary', 'property_name', 'campus', 'gross_floor_area',
-                'use_description', 'energy_score', 'site_eui', 'property_notes',
-                'property_type', 'year_ending', 'owner', 'owner_email', 'owner_telephone',
-                'building_count', 'year_built', 'recent_sale_date', 'conditioned_floor_area',
-                'occupied_floor_area', 'owner_address', 'owner_city_state', 'owner_postal_code',
-                'home_energy_score_id', 'generation_date', 'release_date',
-                'source_eui_weather_normalized', 'site_eui_weather_normalized', 'source_eui',
-                'energy_alerts', 'space_alerts', 'building_certification', 'number_properties',
-                'block_number', 'district', 'BLDGS', 'property_state_id', 'taxlot_state_id',
-                'property_view_id', 'taxlot_view_id'
-            ]
-
-        # get the class to operate on and the relationships
-        view_klass_str = request.query_params.get('inventory_type', 'properties')
-        view_klass = INVENTORY_MODELS[view_klass_str]
-
-        # Grab all the columns and create a column name lookup
-        col_inventory_type = 'property' if view_klass_str == 'properties' else 'taxlot'
-        columns_db = Column.retrieve_all(request.query_params['organization_id'], col_inventory_type, False)
-        column_lookup = {}
-        for c in columns_db:
-            column_lookup[c['name']] = c['displayName']
-        # make the csv header
-        header = []
-        for c in columns:
-            if c in column_lookup:
-                header.append(column_lookup[c])
-            else:
-                header.append(c)
-
-        select_related = ['state', 'cycle']
-        ids = request.data.get('ids', [])
-        filter_str = {'cycle': cycle_pk}
-        if hasattr(view_klass, 'property'):
-            select_related.append('property')
-            filter_str = {'property__organization_id': request.query_params['organization_id']}
-            if ids:
-                filter_str['property__id__in'] = ids
-            # always export the labels
-            columns += ['property_labels']
-            header.append('Property Labels')
-
-        elif hasattr(view_klass, 'taxlot'):
-            select_related.append('taxlot')
-            filter_str = {'taxlot__organization_id': request.query_params['organization_id']}
-            if ids:
-                filter_str['taxlot__id__in'] = ids
-            # always export the labels
-            columns += ['taxlot_labels']
-            header.append('Tax Lot Labels')
-
-        model_views = view_klass.objects.select_related(*select_related).filter(**filter_str).order_by('id')
 
+        export = InventoryExport(
+            request.query_params['organization_id'],
+            request.query_params.get('inventory_type', 'properties'),
+            columns=request.data.get('columns', None),
+            ids=request.data.get('ids', []),
+        )
+
+        # the rows are written in batches as the response is sent
         filename = request.data.get('filename', "ExportedData.csv")
-        response = HttpResponse(content_type='text/csv')
+        response = StreamingHttpResponse(export.iter_csv(), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
-        writer = csv.writer(response)
-
-        # get the data in a dict which includes the related data
-        data = TaxLotProperty.get_related(model_views, columns)
-
-        # force the data into the same order as the IDs
-        if ids:
-            order_dict = {obj_id: index for index, obj_id in enumerate(ids)}
-            data.sort(key=lambda x: order_dict[x['id']])  # x is the property/taxlot object
-
-        # note that the labels are in the property_labels column and are returned by the
-        # TaxLotProperty.get_related method.
-
-        # header
-        writer.writerow(header)
-
-        # iterate over the results to preserve column order and write row.
-        # The front end returns columns with prepended tax_ and property_ columns for the
-        # related fields. This is an expensive operation and can cause issues with stripping
-        # off property_ from items such as property_name, property_notes, and property_type
-        # which are explicitly excluded below
-        for datum in data:
-            row = []
-            for column in columns:
-                if column in ['property_name', 'property_notes', 'property_type', 'property_labels']:
-                    row.append(datum.get(column, None))
-                elif column.startswith('tax_'):
-                    # There are times when there are duplicate column names in tax/property
-                    if datum.get('related') and len(datum['related']) > 0:
-                        # Looks like related returns a list. Is this as expected?
-                        row.append(datum['related'][0].get(re.sub(r'^tax_', '', column), None))
-                    else:
-                        row.append(None)
-                elif column.startswith('property_'):
-                    # There are times when there are duplicate column names in tax/property
-                    if datum.get('related') and len(datum['related']) > 0:
-                        # Looks like related returns a list. Is this as expected?
-                        row.append(datum['related'][0].get(re.sub(r'^property_', '', column), None))
-                    else:
-                        row.append(None)
-                else:
-                    # check if the data is in the normal section of the result, if not, then try to grab it from
-                    # the related section. There shouldn't be any duplicates here because the former two
-                    # if methods will grab those instances.
-                    result = datum.get(column, None)
-                    if not result:
-                        if datum.get('related'):
-                            result = datum['related'][0].get(column, None)
-                    row.append(result)
-            writer.writerow(row)
+        return response
+
+    @api_endpoint_class
+    @ajax_request_class
+    @has_perm_class('requires_member')
+    @list_route(methods=['POST'])
+    def export(self, request):
+        """
+        Start a background task to export the TaxLot and Properties to a csv or xls file. When the
+        task is done, the result of the progress key has the url of the file.
+
+        .. code-block::
+
+            {
+                    "ids": [1,2,3],
+                    "columns": ["tax_jurisdiction_tax_lot_id", "address_line_1", "property_view_id"],
+                    "export_type": "xls",
+                    "filename": "ExportedData.xls"
+            }
+
+        Returns::
+
+            {
+                'status': 'success',
+                'progress': 0,
+                'progress_key': ID of the background task, for retrieving its progress
+            }
+
+        ---
+        parameter_strategy: replace
+        parameters:
+            - name: cycle
+              description: cycle
+              required: true
+              paramType: query
+            - name: inventory_type
+              description: properties or taxlots (as defined by the inventory list page)
+              required: true
+              paramType: query
+            - name: ids
+              description: list of property ids to export (not property views)
+              required: true
+              paramType: body
+            - name: columns
+              description: list of columns to export
+              required: true
+              paramType: body
+            - name: export_type
+              description: csv (default) or xls
+              required: false
+              paramType: body
+            - name: filename
+              description: name of the file to create
+              required: false
+              paramType: body
+        """
+        cycle_pk = request.query_params.get('cycle_id', None)
+        if not cycle_pk:
+            return JsonResponse(
+                {'status': 'error', 'message': 'Must pass in cycle_id as query parameter'},
+                status=status.HTTP_400_BAD_REQUEST)
+        inventory_type = request.query_params.get('inventory_type', 'properties')
+        if inventory_type not in INVENTORY_MODELS:
+            return JsonResponse(
+                {'status': 'error', 'message': 'Invalid inventory_type: {}'.format(inventory_type)},
+                status=status.HTTP_400_BAD_REQUEST)
+        export_type = request.data.get('export_type', 'csv')
+        if export_type not in EXPORT_TYPES:
+            return JsonResponse(
+                {'status': 'error', 'message': 'Invalid export_type: {}'.format(export_type)},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        filename = request.data.get('filename', 'ExportedData.{}'.format(export_type))
+        prog_key = get_prog_key('export_inventory', uuid4().hex)
+        export_inventory.delay(
+            prog_key,
+            int(request.query_params['organization_id']),
+            inventory_type,
+            request.data.get('columns', None),
+            request.data.get('ids', []),
+            export_type,
+            filename,
+        )
+        return JsonResponse({
+            'status': 'success',
+            'progress': 0,
+            'progress_key': prog_key
+        })
+
+    @api_endpoint_class
+    @ajax_request_class
+    @has_perm_class('requires_member')
+    @list_route(methods=['GET'])
+    def download(self, request):
+        """
+        Download the file of a background export of the organization, see export. The files are
+        deleted after a day.
+        ---
+        parameter_strategy: replace
+        parameters:
+            - name: organization_id
+              description: organization of the export
+              required: true
+              paramType: query
+            - name: export_id
+              description: ID of the export, from the url in the result of the export
+              required: true
+              paramType: query
+        """
+        path = find_export(request.query_params['organization_id'],
+                           request.query_params.get('export_id'))
+        if path is None:
+            return JsonResponse(
+                {'status': 'error', 'message': 'Export not found'},
+                status=status.HTTP_404_NOT_FOUND)
 
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = FileResponse(default_storage.open(path), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+            os.path.basename(path))
         return response
@@ -42,7 +42,7 @@ from seed.lib.superperms.orgs.models import (
     Organization
 )
 from seed.serializers.pint import (
-    apply_display_unit_preferences,
+    DisplayUnitConverter,
     add_pint_unit_suffix
 )
 from seed.serializers.properties import (
@@ -54,6 +54,7 @@ from seed.serializers.taxlots import (
     TaxLotViewSerializer
 )
 from seed.utils.api import api_endpoint_class
+from seed.utils.pagination import CursorPaginator, InvalidCursor, get_cached_count
 from seed.utils.properties import (
     get_changed_fields,
     pair_unpair_property_taxlot,
@@ -101,36 +102,59 @@ class TaxLotViewSet(GenericViewSet):
             .filter(taxlot__organization_id=org_id, cycle=cycle) \
             .order_by('id')
 
-        paginator = Paginator(taxlot_views_list, per_page)
-
-        try:
-            taxlot_views = paginator.page(page)
-            page = int(page)
-        except PageNotAnInteger:
-            taxlot_views = paginator.page(1)
-            page = 1
-        except EmptyPage:
-            taxlot_views = paginator.page(paginator.num_pages)
-            page = paginator.num_pages
+        if 'cursor' in request.query_params:
+            # seek by id instead of counting and offsetting, see CursorPaginator
+            try:
+                paginator = CursorPaginator(taxlot_views_list, per_page)
+                taxlot_views_page = paginator.page(request.query_params['cursor'])
+            except (ValueError, InvalidCursor) as e:
+                return JsonResponse({'status': 'error', 'message': str(e)},
+                                    status=status.HTTP_400_BAD_REQUEST)
+            taxlot_views = taxlot_views_page.object_list
+            pagination = {
+                'per_page': paginator.per_page,
+                'next': taxlot_views_page.next_cursor,
+                'previous': taxlot_views_page.previous_cursor,
+                'has_next': taxlot_views_page.has_next(),
+                'has_previous': taxlot_views_page.has_previous(),
+                'total': None
+            }
+            if request.query_params.get('count') == 'true':
+                pagination['total'] = get_cached_count(
+                    taxlot_views_list, 'inventory_count__TaxLotView__{}__{}'.format(org_id, cycle.id)
+                )
+        else:
+            paginator = Paginator(taxlot_views_list, per_page)
+
+            try:
+                taxlot_views = paginator.page(page)
+                page = int(page)
+            except PageNotAnInteger:
+                taxlot_views = paginator.page(1)
+                page = 1
+            except EmptyPage:
+                taxlot_views = paginator.page(paginator.num_pages)
+                page = paginator.num_pages
+
+            pagination = {
+                'page': page,
+                'start': taxlot_views.start_index(),
+                'end': taxlot_views.end_index(),
+                'num_pages': paginator.num_pages,
+                'has_next': taxlot_views.has_next(),
+                'has_previous': taxlot_views.has_previous(),
+                'total': paginator.count
+            }
 
         related_results = TaxLotProperty.get_related(taxlot_views, columns)
 
         # collapse units here so we're only doing the last page; we're already a
         # realized list by now and not a lazy queryset
         org = Organization.objects.get(pk=org_id)
-        unit_collapsed_results = \
-            [apply_display_unit_preferences(org, x) for x in related_results]
+        unit_collapsed_results = DisplayUnitConverter(org).apply_all(related_results)
 
         response = {
-            'pagination': {
-                'page': page,
-                'start': paginator.page(page).start_index(),
-                'end': paginator.page(page).end_index(),
-                'num_pages': paginator.num_pages,
-                'has_next': paginator.page(page).has_next(),
-                'has_previous': paginator.page(page).has_previous(),
-                'total': paginator.count
-            },
+            'pagination': pagination,
             'cycle_id': cycle.id,
             'results': unit_collapsed_results
         }
@@ -163,6 +187,15 @@ class TaxLotViewSet(GenericViewSet):
               description: The number of items per page to return
               required: false
               paramType: query
+            - name: cursor
+              description: Page through the taxlots with cursors instead of page numbers. Empty
+                           for the first page, then the next or previous cursor of a page
+              required: false
+              paramType: query
+            - name: count
+              description: Include the total number of taxlots when paging with cursors (true/false)
+              required: false
+              paramType: query
         """
         return self._get_filtered_results(request, columns=[])
 
@@ -193,6 +226,15 @@ class TaxLotViewSet(GenericViewSet):
               description: The number of items per page to return
               required: false
               paramType: query
+            - name: cursor
+              description: Page through the taxlots with cursors instead of page numbers. Empty
+                           for the first page, then the next or previous cursor of a page
+              required: false
+              paramType: query
+            - name: count
+              description: Include the total number of taxlots when paging with cursors (true/false)
+              required: false
+              paramType: query
             - name: column filter data
               description: Object containing columns to filter on, should be a JSON object with a single key "columns"
                            whose value is a list of strings, each representing a column name